@@ -7,6 +7,7 @@ from dask import compute, delayed
 # wrappers for parsing streamdocs
 from ...interfaces.StreamDoc import select, pack, unpack, todict,\
         add_attributes, psdm, psda
+from ...interfaces.StreamDoc import squash as _squash
 
 
 
@@ -75,49 +76,5 @@ def fitsqsphere(q, sqdata, Ncutoff=None):
 
 
 
-# TODO :  need to fix this
-@delayed
-def squash(sdocs):
-    newsdoc = StreamDoc()
-    for sdoc in sdocs:
-        newsdoc.add(attributes = sdoc['attributes'])
-    N = len(sdocs)
-    cnt = 0
-    newargs = []
-    newkwargs = dict()
-    for sdoc in sdocs:
-        args, kwargs = sdoc['args'], sdoc['kwargs']
-        for i, arg in enumerate(args):
-            if cnt == 0:
-                if isinstance(arg, np.ndarray):
-                    newshape = []
-                    newshape.append(N)
-                    newshape.extend(arg.shape)
-                    newargs.append(np.zeros(newshape))
-                else:
-                    newargs.append([])
-            if isinstance(arg, np.ndarray):
-                newargs[i][cnt] = arg
-            else:
-                newargs[i].append[arg]
-
-        for key, val in kwargs.items():
-            if cnt == 0:
-                if isinstance(val, np.ndarray):
-                    newshape = []
-                    newshape.append(N)
-                    newshape.extend(val.shape)
-                    newkwargs[key] = np.zeros(newshape)
-                else:
-                    newkwargs[key] = []
-            if isinstance(val, np.ndarray):
-                newkwargs[key][cnt] = val
-            else:
-                newkwargs[key].append[val]
-
-        cnt = cnt + 1
-
-    newsdoc.add(args=newargs, kwargs=newkwargs)
-
-    return newsdoc
+squash = delayed(_squash)
 
@@ -4,10 +4,7 @@
 
 from copy import copy
 
-from ...globals import cache, client
-cache.register()  # noqa
-
-from ... import globals as streams_globals
+from ...globals import client
 
 
 from dask import compute
@@ -31,6 +28,7 @@ from ...interfaces.StreamDoc import select, pack, unpack, todict,\
         add_attributes, psdm, psda
 
 from ...interfaces.dask import scatter
+from ...interfaces.artifacts import publish
 
 
 '''
@@ -149,11 +147,9 @@ def CalibrationStream(keymap_name=None, detector=None):
                           calib_defaults=defaults)
     # calib_obj.apply(compute).apply(print)
 
-    from SciStreams.globals import client
-    calib_obj = calib_obj.map(lambda x : client.submit(psdm(_generate_qxyz_maps), x))
-    calib_obj.map(streams_globals.futures_cache.append)
-    calib_obj = calib_obj.map(lambda x : client.gather(x))
-    #calib_obj = calib_obj.map(lambda x: compute(x)[0])
+    # the q maps are built once per calibration in each worker (or sent to
+    # them once), the stream only carries a reference to them
+    calib_obj = calib_obj.map(psdm(_publish_qxyz_maps))
 
     sout = calib_obj
     # return sin and the endpoints
@@ -338,6 +334,16 @@ def load_from_calib_dict(calib_dict, detector=None, calib_defaults=None):
     return calib_object
 
 
+def _build_qxyz_maps(calib_obj):
+    # don't add the maps to the published (small) calibration object
+    calib_obj = copy(calib_obj)
+    return _generate_qxyz_maps(calib_obj)
+
+
+def _publish_qxyz_maps(calib_obj):
+    return publish(_build_qxyz_maps, calib_obj, client=client)
+
+
 def _generate_qxyz_maps(calib_obj):
     # print("_generate_qxyz_maps calib_obj : {}".format(calib_obj))
     calib_obj.generate_maps()
@@ -23,9 +23,63 @@ _DEFAULTS = {
     'filestoreroot': os.path.expanduser("~/sqlite/filestore"),
     'delayed': True,
     'client': None,
+    # when client is None, tasks run on a local pool (see
+    # SciStreams.interfaces.local_client). kind : 'thread' or 'process', or
+    # None to run them inline, one at a time
+    'local_client': {'kind': 'thread',
+                     'nworkers': 4,
+                     'max_pending': 100},
     'databases': default_databases,
     'TFLAGS': {'out_dir': '/GPFS/pipeline/ml-tmp',
-               'num_batches': 16}
+               'num_batches': 16},
+    # bounded ingest queue for live runs
+    # (see SciStreams.interfaces.backpressure)
+    'ingest': {'maxsize': 100,
+               'max_inflight': 1,
+               'high_water': .5,
+               'overflow': 'block'},
+    # worker pool for low priority branches (plots, file writes etc)
+    # (see SciStreams.interfaces.scheduler)
+    'scheduler': {'nworkers': 4,
+                  'backlog': 100,
+                  'max_queued': 20},
+    # where to save the state of stateful stream nodes (stitching etc) so a
+    # restarted pipeline resumes where it left off. None to disable
+    'checkpointdir': None,
+    'checkpoint_interval': 60,
+    # if not None, arrays larger than this (bytes) are only hashed from
+    # samples when tokenizing (see SciStreams.interfaces.fingerprint)
+    'fingerprint_sample_size': None,
+    # capture of the inputs of StreamDoc functions, off unless enabled
+    # (see SciStreams.interfaces.debug). dumpdir : where to save the inputs
+    # of failing calls, None to not save them
+    'debug': {'maxlen': 100,
+              'dumpdir': None},
+    # failures of StreamDoc functions (see SciStreams.interfaces.errors).
+    # log_interval : minimum time (s) between reports of the same failure
+    # skip_failed : drop the output of failed calls instead of emitting it
+    # (NOTE : the other side of a zip then pairs with the next frame)
+    'errors': {'log_interval': 60.,
+               'skip_failed': False},
+    # artifacts shared with the workers (see SciStreams.interfaces.artifacts)
+    # broadcast : send them to all workers of a distributed client once
+    # maxsize : the number of artifacts each process keeps
+    'artifacts': {'broadcast': True,
+                  'maxsize': 32},
+    # cache of delayed results (see SciStreams.interfaces.cache) : budget
+    # (bytes), ttl (s) and pinning per category, categories chosen by the
+    # name of the function computing the result (the q maps and masks are
+    # built as published artifacts). Other results go to cache_default
+    # (None to not cache them)
+    'cache': {'geometry': {'budget': 4e8,
+                           'pin': True,
+                           'functions': ['_build_qxyz_maps']},
+              'masks': {'budget': 1e8,
+                        'pin': True,
+                        'functions': ['generate_mask']},
+              'frame': {'budget': 5e8,
+                        'ttl': 300.}},
+    'cache_default': 'frame',
 }
 
 
@@ -33,6 +87,11 @@ delayed = config.get('delayed', _DEFAULTS['delayed'])
 storagedir = config.get('storagedir', _DEFAULTS['storagedir'])
 maskdir = config.get('maskdir', _DEFAULTS['maskdir'])
 resultsroot = config.get('resultsroot', _DEFAULTS['resultsroot'])
+checkpointdir = config.get('checkpointdir', _DEFAULTS['checkpointdir'])
+checkpoint_interval = config.get('checkpoint_interval',
+                                 _DEFAULTS['checkpoint_interval'])
+fingerprint_sample_size = config.get('fingerprint_sample_size',
+                                     _DEFAULTS['fingerprint_sample_size'])
 
 TFLAGS_tmp = dict()
 TFLAGS_tmpin = config.get("TFLAGS", _DEFAULTS['TFLAGS'])
@@ -47,6 +106,20 @@ class TFLAGS:
 for key, val in TFLAGS_tmp.items():
     setattr(TFLAGS, key, val)
 
+ingest = dict(_DEFAULTS['ingest'])
+ingest.update(config.get('ingest', dict()))
+scheduler = dict(_DEFAULTS['scheduler'])
+scheduler.update(config.get('scheduler', dict()))
+debug = dict(_DEFAULTS['debug'])
+debug.update(config.get('debug', dict()))
+errors = dict(_DEFAULTS['errors'])
+errors.update(config.get('errors', dict()))
+artifacts = dict(_DEFAULTS['artifacts'])
+artifacts.update(config.get('artifacts', dict()))
+cache = dict(_DEFAULTS['cache'])
+cache.update(config.get('cache', dict()))
+cache_default = config.get('cache_default', _DEFAULTS['cache_default'])
+
 if isinstance(resultsroot, list):
     resultsrootmap = resultsroot
     resultsroot = None
@@ -55,6 +128,8 @@ else:
 
 
 client = config.get('client', _DEFAULTS['client'])
+local_client = dict(_DEFAULTS['local_client'])
+local_client.update(config.get('local_client', dict()))
 databases = config.get('databases', _DEFAULTS['databases'])
 
 
@@ -1,19 +1,20 @@
 from dask import set_options
 
-from collections import deque
-
-MAX_FUTURE_NUM = 1000
-
 # client information
 # TODO : remove this client information
 from . import config
 
-debugcache = deque(maxlen=1)
 if config.client is not None:
     print("Adding a client: {}".format(config.client))
     from distributed import Client
     client = Client(config.client)
-# no client, compute should compute and return nothing
+# no client, run the tasks on a local pool
+elif config.local_client['kind'] is not None:
+    from .interfaces.local_client import LocalClient
+    print("No client supported, running on a local {} pool"
+          .format(config.local_client['kind']))
+    client = LocalClient(**config.local_client)
+# no pool, compute should compute and return nothing
 else:
     print("No client supported, running locally")
     import dask
@@ -22,21 +23,22 @@ else:
         # make unbound method
         def submit(self, f, *args, **kwargs):
             return f(*args, **kwargs)
+        def compute(self, collection):
+            return dask.compute(collection)[0]
         def gather(self, future):
             # it's not a future, just a regular result
             return future
 
     client = Client()
 
-futures_cache = deque(maxlen=MAX_FUTURE_NUM)
+# holds the futures of submitted work until it is done
+from .interfaces.futures import FuturesManager
+futures_manager = FuturesManager()
 
 # assume all functions are pure globally
-try:
-    from dask.cache import Cache
-    cache = Cache(1e9)
-    cache.register()
-except ImportError:
-    print("Error cachey not available. Will not be caching")
-    pass
+# cache the results, with a budget per category (geometry, masks, per frame)
+from .interfaces.cache import TypedCache
+cache = TypedCache(config.cache, default=config.cache_default)
+cache.register()
 
 set_options(delayed_pure=True)
@@ -4,10 +4,14 @@
     found in corresponding interface folders.
 '''
 from functools import wraps, singledispatch
+from numbers import Number
+import pickle
 import time
-import sys
 from uuid import uuid4
-from ..globals import debugcache
+from .lazy import LazyArray, materialize
+from .fingerprint import fingerprint_token
+from . import debug
+from . import errors
 
 # convenience routine to return a hash of the streamdoc
 # from dask.delayed import tokenize, delayed, Delayed
@@ -44,7 +48,125 @@ def parse_args_Arguments(res):
 
 # routines that add on to stream doc functionality
 def select(sdoc, *mapping):
-    return sdoc.select(*mapping)
+    return compile_select(*mapping)(sdoc)
+
+
+def _compile_mapelem(mapelem):
+    ''' Parse one element of a select mapping into
+        (from_args, oldkey, newkey), newkey None meaning the next arg.'''
+    if isinstance(mapelem, str):
+        mapelem = mapelem, mapelem
+    elif isinstance(mapelem, int):
+        mapelem = mapelem, None
+
+    # length 1 for strings, repeat, for int give None
+    if len(mapelem) == 1 and isinstance(mapelem[0], str):
+        mapelem = mapelem[0], mapelem[0]
+    elif len(mapelem) == 1 and isinstance(mapelem[0], int):
+        mapelem = mapelem[0], None
+
+    oldkey = mapelem[0]
+    newkey = mapelem[1]
+
+    if isinstance(oldkey, int):
+        from_args = True
+    elif isinstance(oldkey, str):
+        from_args = False
+    else:
+        raise ValueError("old key not understood : {}".format(oldkey))
+
+    if isinstance(newkey, int):
+        errorstr = "Integer tuple pairs not accepted."
+        errorstr += " This usually comes from trying a (1,1)"
+        errorstr += " or ('foo',1) mapping."
+        errorstr += "Please try (1,None) or ('foo', None) instead"
+        raise ValueError(errorstr)
+    elif newkey is not None and not isinstance(newkey, str):
+        raise ValueError("new key not understood : {}".format(newkey))
+
+    return from_args, oldkey, newkey
+
+
+class Selector:
+    ''' A compiled ``select`` mapping (see ``StreamDoc.select``).
+
+        The mapping is parsed (and checked) once, calling the selector on a
+        StreamDoc only moves references around.
+    '''
+    __slots__ = ('mapping', 'ops')
+
+    def __init__(self, *mapping):
+        self.mapping = mapping
+        self.ops = tuple(_compile_mapelem(mapelem) for mapelem in mapping)
+
+    def __call__(self, sdoc):
+        if not _is_streamdoc(sdoc):
+            # for ex. dask delayed StreamDocs
+            return sdoc.select(*self.mapping)
+        args = sdoc.args
+        kwargs = sdoc.kwargs
+        newargs = list()
+        newkwargs = dict()
+        for from_args, oldkey, newkey in self.ops:
+            try:
+                if from_args:
+                    val = args[oldkey]
+                else:
+                    val = kwargs[oldkey]
+            except (KeyError, IndexError):
+                raise KeyError(self._errorstr(from_args, oldkey, newkey))
+            if newkey is None:
+                newargs.append(val)
+            else:
+                newkwargs[newkey] = val
+
+        streamdoc = sdoc._derive()
+        streamdoc.args = newargs
+        streamdoc.kwargs = newkwargs
+        return streamdoc
+
+    def _errorstr(self, from_args, oldkey, newkey):
+        oldparentkey = 'args' if from_args else 'kwargs'
+        newparentkey = 'args' if newkey is None else 'kwargs'
+        errorstr = "streamdoc.select() : Error {} not ".format(oldkey)
+        errorstr += "in the {} of ".format(oldparentkey)
+        errorstr += "the current streamdoc.\n"
+
+        errorstr += "Details : Tried to map key {}".format(oldkey)
+        errorstr += " from {} ".format(oldparentkey)
+        errorstr += " to {}\n.".format(newparentkey)
+        errorstr += "This usually occurs from selecting "
+        errorstr += "a streamdoc with missing information\n"
+        errorstr += "(But could also come from missing data)\n"
+        return errorstr
+
+    def __repr__(self):
+        return "Selector{}".format(self.mapping)
+
+
+_selector_cache = dict()
+
+
+def compile_select(*mapping):
+    ''' Return a Selector for mapping, reusing previously compiled ones.
+
+        Raises ValueError if the mapping is not understood.
+    '''
+    try:
+        return _selector_cache[mapping]
+    except KeyError:
+        selector = Selector(*mapping)
+        if len(_selector_cache) < 1000:
+            _selector_cache[mapping] = selector
+        return selector
+    except TypeError:
+        # unhashable mapping (lists)
+        return Selector(*mapping)
+
+
+# Stream.map calls this when the graph is built, so the mapping is compiled
+# (and checked) once
+select.precompile = compile_select
 
 
 def pack(*args, **kwargs):
@@ -85,94 +207,185 @@ def merge(sdocs):
     return sdocs[0].merge(*(sdocs[1:]))
 
 
-# TODO :  need to fix this
-def squash(sdocs):
+def squash(sdocs, out=None):
     ''' Squash results together.
 
 
         For ex, a list of sdocs with a 2D np array
             will lead to one sdoc with a 3D np array
         etc.
+
+        Each arg (by position) and kwarg (by name) found in all the sdocs is
+        combined : arrays of the same shape are stacked along a new first
+        axis in one ``np.stack`` (dtype promoted as numpy does), numbers give
+        a 1D array and anything else (lists, strings, arrays of differing
+        shapes) gives a list. The attributes are merged, later sdocs
+        overriding earlier ones.
+
+        Parameters
+        ----------
+        sdocs : list of StreamDoc
+        out : dict, optional
+            preallocated buffers (for ex. memory maps from
+            ``np.lib.format.open_memmap``) to stack arrays into, by arg
+            position or kwarg name. Each must have shape ``(len(sdocs),) +
+            shape`` of the arrays.
     '''
+    if out is None:
+        out = dict()
     newsdoc = StreamDoc()
+    if not sdocs:
+        return newsdoc
+    attributes = dict()
     for sdoc in sdocs:
-        newsdoc.add(attributes=sdoc['attributes'])
-    N = len(sdocs)
-    cnt = 0
-    newargs = []
-    newkwargs = dict()
-    for sdoc in sdocs:
-        args, kwargs = sdoc['args'], sdoc['kwargs']
-        for i, arg in enumerate(args):
-            if cnt == 0:
-                if isinstance(arg, np.ndarray):
-                    newshape = []
-                    newshape.append(N)
-                    newshape.extend(arg.shape)
-                    newargs.append(np.zeros(newshape))
-                else:
-                    newargs.append([])
-            if isinstance(arg, np.ndarray):
-                newargs[i][cnt] = arg
-            else:
-                newargs[i].append[arg]
-
-        for key, val in kwargs.items():
-            if cnt == 0:
-                if isinstance(val, np.ndarray):
-                    newshape = []
-                    newshape.append(N)
-                    newshape.extend(val.shape)
-                    newkwargs[key] = np.zeros(newshape)
-                else:
-                    newkwargs[key] = []
-            if isinstance(val, np.ndarray):
-                newkwargs[key][cnt] = val
-            else:
-                newkwargs[key].append[val]
+        attributes.update(sdoc['attributes'])
+    newsdoc.attributes = attributes
 
-        cnt = cnt + 1
+    nargs = min(len(sdoc['args']) for sdoc in sdocs)
+    newargs = [_squash_values([materialize(sdoc['args'][i])
+                               for sdoc in sdocs], out.get(i, None))
+               for i in range(nargs)]
+    newkwargs = dict()
+    for key in sdocs[0]['kwargs']:
+        if all(key in sdoc['kwargs'] for sdoc in sdocs):
+            newkwargs[key] = _squash_values(
+                [materialize(sdoc['kwargs'][key]) for sdoc in sdocs],
+                out.get(key, None))
 
     newsdoc.add(args=newargs, kwargs=newkwargs)
 
     return newsdoc
 
 
-class StreamDoc(dict):
-    def __init__(self, streamdoc=None, args=(), kwargs={}, attributes={},
-                 wrapper=None):
-        ''' A generalized document meant to be parsed by Streams.
-
-            Components:
-                attributes :None the metadata
-                outputs : a dictionary of outputs from stream
-                args : a list of args
-                kwargs : a list of kwargs
-                statistics : some statistics of the stream that generated this
-                    It can be anything, like run_start, run_stop etc
-        '''
-        self._wrapper = wrapper
-        # initialize the dictionary class
-        super(StreamDoc, self).__init__(self)
+def _squash_values(values, out=None):
+    first = values[0]
+    if isinstance(first, np.ndarray):
+        shape = first.shape
+        if all(isinstance(val, np.ndarray) and val.shape == shape
+               for val in values):
+            if out is not None:
+                return np.stack(values, out=out)
+            return np.stack(values)
+    elif all(isinstance(val, (Number, np.bool_)) for val in values):
+        return np.array(values)
+    return list(values)
+
+
+class StreamDoc(object):
+    ''' A generalized document meant to be parsed by Streams.
+
+        Components:
+            attributes : the metadata
+            args : a list of args
+            kwargs : a dict of kwargs
+            statistics : some statistics of the stream that generated this
+                It can be anything, like run_start, run_stop etc
+            uid : a unique id, generated when first accessed
+
+        The components can also be accessed like a dictionary
+        (``sdoc['args']`` etc), as StreamDocs used to be dicts.
+    '''
+    # NOTE : slots keep these small and fast to create, since a new one is
+    # made for every function call in the graph
+    __slots__ = ('args', 'kwargs', 'attributes', 'statistics', '_uid',
+                 '_wrapper', '__weakref__')
 
-        # initialize the metadata and kwargs
-        self['attributes'] = dict()
-        self['kwargs'] = dict()
-        self['args'] = list()
+    # needed to distinguish that it is a StreamDoc by stream methods
+    _StreamDoc = 'StreamDoc v1.0'
 
-        # these two pieces are specific to the run
-        self['statistics'] = dict()
-        self['uid'] = str(uuid4())
+    _KEYS = ('attributes', 'kwargs', 'args', 'statistics', 'uid',
+             '_StreamDoc')
 
-        # needed to distinguish that it is a StreamDoc by stream methods
-        self['_StreamDoc'] = 'StreamDoc v1.0'
+    def __init__(self, streamdoc=None, args=(), kwargs={}, attributes={},
+                 wrapper=None):
+        self._wrapper = wrapper
+        self._uid = None
 
-        # update
         if streamdoc is not None:
-            self.updatedoc(streamdoc)
+            self.args = list(streamdoc['args'])
+            self.kwargs = dict(streamdoc['kwargs'])
+            self.attributes = dict(streamdoc['attributes'])
+            self.statistics = dict(streamdoc['statistics'])
+            self._wrapper = streamdoc._wrapper
+        else:
+            self.args = list()
+            self.kwargs = dict()
+            self.attributes = dict()
+            self.statistics = dict()
+
+        # override with args (skipped when there is nothing to add, as
+        # StreamDocs are created at every step of the graph)
+        if kwargs or attributes or not isinstance(args, tuple) or args:
+            self.add(args=args, kwargs=kwargs, attributes=attributes)
+
+    def _derive(self):
+        ''' A new StreamDoc with a copy of this one's attributes and
+            statistics, but no args or kwargs.'''
+        streamdoc = StreamDoc(wrapper=self._wrapper)
+        streamdoc.attributes = dict(self.attributes)
+        streamdoc.statistics = dict(self.statistics)
+        return streamdoc
 
-        # override with args
-        self.add(args=args, kwargs=kwargs, attributes=attributes)
+    @property
+    def uid(self):
+        if self._uid is None:
+            self._uid = str(uuid4())
+        return self._uid
+
+    # dict like access, for backwards compatibility
+    def __getitem__(self, key):
+        if key in self._KEYS:
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def __setitem__(self, key, val):
+        if key == 'uid':
+            self._uid = val
+        elif key in self._KEYS and key != '_StreamDoc':
+            setattr(self, key, val)
+        else:
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        return key in self._KEYS
+
+    def __iter__(self):
+        return iter(self._KEYS)
+
+    def __len__(self):
+        return len(self._KEYS)
+
+    def keys(self):
+        return list(self._KEYS)
+
+    def get(self, key, default=None):
+        if key in self._KEYS:
+            return getattr(self, key)
+        return default
+
+    def __repr__(self):
+        return "StreamDoc(args={}, kwargs={}, attributes={})"\
+            .format(self.args, self.kwargs, self.attributes)
+
+    def __getstate__(self):
+        return (self.args, self.kwargs, self.attributes, self.statistics,
+                self._uid, self._wrapper)
+
+    def __setstate__(self, state):
+        self.args, self.kwargs, self.attributes, self.statistics, \
+            self._uid, self._wrapper = state
+
+    def __reduce_ex__(self, protocol):
+        if protocol < 5:
+            return object.__reduce_ex__(self, protocol)
+        # the state is a flat tuple (no field names) and the arrays in the
+        # args and kwargs are prepared so numpy hands them to pickle as
+        # out-of-band buffers (see dumps_streamdoc)
+        args = [_oob_ready(arg) for arg in self.args]
+        kwargs = {key: _oob_ready(val) for key, val in self.kwargs.items()}
+        return (_rebuild_streamdoc, ((args, kwargs, self.attributes,
+                                      self.statistics, self._uid,
+                                      self._wrapper),))
 
     def updatedoc(self, streamdoc):
         # print("in StreamDoc : {}".format(streamdoc))
@@ -186,30 +399,14 @@ class StreamDoc(dict):
         if not isinstance(args, list) and not isinstance(args, tuple):
             args = (args, )
 
-        self['args'].extend(args)
+        self.args.extend(args)
         # Note : will overwrite previous kwarg data without checking
-        self['kwargs'].update(kwargs)
-        self['attributes'].update(attributes)
-        self['statistics'].update(statistics)
+        self.kwargs.update(kwargs)
+        self.attributes.update(attributes)
+        self.statistics.update(statistics)
 
         return self
 
-    @property
-    def args(self):
-        return self['args']
-
-    @property
-    def kwargs(self):
-        return self['kwargs']
-
-    @property
-    def attributes(self):
-        return self['attributes']
-
-    @property
-    def statistics(self):
-        return self['statistics']
-
     def get_return(self, elem=None):
         ''' get what the function would have normally returned.
 
@@ -286,83 +483,94 @@ class StreamDoc(dict):
             -----
             These *must* be tuples, and the list a list kwarg elems must be
                 strs and arg elems must be ints to accomplish this instead
+            The mapping is compiled once and reused (see ``compile_select``)
         '''
-        # print("IN STREAMDOC -> SELECT")
-        # TODO : take args instead
-        # if not isinstance(mapping, list):
-        # mapping = [mapping]
-        streamdoc = StreamDoc(self)
-        streamdoc._wrapper = self._wrapper
-        newargs = list()
-        newkwargs = dict()
-        totargs = dict(args=newargs, kwargs=newkwargs)
-
-        for mapelem in mapping:
-            if isinstance(mapelem, str):
-                mapelem = mapelem, mapelem
-            elif isinstance(mapelem, int):
-                mapelem = mapelem, None
-
-            # length 1 for strings, repeat, for int give None
-            if len(mapelem) == 1 and isinstance(mapelem[0], str):
-                mapelem = mapelem[0], mapelem[0]
-            elif len(mapelem) == 1 and isinstance(mapelem[0], int):
-                mapelem = mapelem[0], None
-
-            oldkey = mapelem[0]
-            newkey = mapelem[1]
-
-            if isinstance(oldkey, int):
-                oldparentkey = 'args'
-            elif isinstance(oldkey, str):
-                oldparentkey = 'kwargs'
-            else:
-                raise ValueError("old key not understood : {}".format(oldkey))
+        return compile_select(*mapping)(self)
 
-            if newkey is None:
-                newparentkey = 'args'
-            elif isinstance(newkey, str):
-                newparentkey = 'kwargs'
-            elif isinstance(newkey, int):
-                errorstr = "Integer tuple pairs not accepted."
-                errorstr += " This usually comes from trying a (1,1)"
-                errorstr += " or ('foo',1) mapping."
-                errorstr += "Please try (1,None) or ('foo', None) instead"
-                raise ValueError(errorstr)
-
-            if oldparentkey == 'kwargs' and \
-               oldkey not in streamdoc[oldparentkey] \
-               or oldparentkey == 'args' and \
-               len(streamdoc[oldparentkey]) < oldkey:
-                errorstr = "streamdoc.select() : Error {} not ".format(oldkey)
-                errorstr += "in the {} of ".format(oldparentkey)
-                errorstr += "the current streamdoc.\n"
-
-                errorstr += "Details : Tried to map key {}".format(oldkey)
-                errorstr += " from {} ".format(oldparentkey)
-                errorstr += " to {}\n.".format(newparentkey)
-                errorstr += "This usually occurs from selecting "
-                errorstr += "a streamdoc with missing information\n"
-                errorstr += "(But could also come from missing data)\n"
-                raise KeyError(errorstr)
-
-            if newparentkey == 'args':
-                totargs[newparentkey].append(streamdoc[oldparentkey][oldkey])
-            else:
-                totargs[newparentkey][newkey] = streamdoc[oldparentkey][oldkey]
 
-        streamdoc['args'] = totargs['args']
-        streamdoc['kwargs'] = totargs['kwargs']
+# arrays smaller than this (bytes) are pickled along with the metadata
+OOB_MIN_SIZE = 2**16
 
-        return streamdoc
 
+def _oob_ready(val):
+    ''' Prepare an array so that pickle (protocol 5) can send it out of
+        band.
 
-def _is_streamdoc(doc):
-    if isinstance(doc, dict) and '_StreamDoc' in doc:
-        return True
-    else:
+        numpy only gives out of band buffers for contiguous, plain ndarrays :
+        memory maps (checkpoints, lazily read files) are viewed as ndarrays
+        (no copy) and large non contiguous arrays are made contiguous (which
+        pickle would copy anyway, in band).
+    '''
+    # (subclasses such as ArtifactRef are sent as references)
+    if type(val) is LazyArray:
+        val = val.load()
+    if not isinstance(val, np.ndarray) or val.dtype.hasobject:
+        return val
+    if type(val) is np.memmap:
+        val = val.view(np.ndarray)
+    if not (val.flags.c_contiguous or val.flags.f_contiguous) and \
+            val.nbytes >= OOB_MIN_SIZE:
+        val = np.ascontiguousarray(val)
+    return val
+
+
+def _rebuild_streamdoc(state):
+    sdoc = StreamDoc.__new__(StreamDoc)
+    sdoc.__setstate__(state)
+    return sdoc
+
+
+def dumps_streamdoc(sdoc, min_size=None):
+    ''' Serialize a StreamDoc into frames, without copying its arrays.
+
+        Returns
+        -------
+        frames : list
+            the pickled metadata (attributes, statistics, small arrays etc.)
+            followed by one memoryview per array of at least min_size bytes
+            (defaults to OOB_MIN_SIZE). The memoryviews point to the arrays'
+            own memory.
+    '''
+    if min_size is None:
+        min_size = OOB_MIN_SIZE
+    buffers = []
+
+    def buffer_callback(buf):
+        view = buf.raw()
+        if view.nbytes < min_size:
+            # keep in band
+            return True
+        buffers.append(view)
         return False
 
+    header = pickle.dumps(sdoc, protocol=5, buffer_callback=buffer_callback)
+    return [header] + buffers
+
+
+def loads_streamdoc(frames):
+    ''' Inverse of dumps_streamdoc. The arrays are rebuilt on top of the
+        frames, without copies.'''
+    return pickle.loads(frames[0], buffers=frames[1:])
+
+
+# send StreamDocs to dask workers as frames, when distributed is available
+try:
+    from distributed.protocol import dask_serialize, dask_deserialize
+except ImportError:
+    pass
+else:
+    @dask_serialize.register(StreamDoc)
+    def _dask_serialize_sdoc(sdoc):
+        return {}, dumps_streamdoc(sdoc)
+
+    @dask_deserialize.register(StreamDoc)
+    def _dask_deserialize_sdoc(header, frames):
+        return loads_streamdoc(frames)
+
+
+def _is_streamdoc(doc):
+    return isinstance(doc, StreamDoc)
+
 
 def parse_streamdoc(name):
     ''' Decorator to parse StreamDocs from functions
@@ -387,12 +595,24 @@ def parse_streamdoc(name):
         @wraps(f)
         def f_new(x, x2=None, **kwargs_additional):
             # print("Running in {}".format(f.__name__))
+            if errors.skip_failed:
+                # pass failed docs through (an accumulation drops failed
+                # new elements, and restarts from the next one if its state
+                # failed)
+                if x2 is None:
+                    if errors.is_failed(x):
+                        return x
+                elif errors.is_failed(x2):
+                    return x
+                elif errors.is_failed(x):
+                    return x2
             if x2 is None:
                 if _is_streamdoc(x):
                     # extract the args and kwargs
                     args = x.args
                     kwargs = x.kwargs
-                    attributes = x.attributes
+                    # copy, the input's attributes must not change
+                    attributes = dict(x.attributes)
                 else:
                     args = (x,)
                     kwargs = dict()
@@ -401,16 +621,23 @@ def parse_streamdoc(name):
                 if _is_streamdoc(x) and _is_streamdoc(x2):
                     args = x.get_return(), x2.get_return()
                     kwargs = dict()
-                    attributes = x.attributes
+                    attributes = dict(x.attributes)
                     # attributes of x2 overrides x
                     attributes.update(x2.attributes)
                 else:
                     raise ValueError("Two normal arguments not accepted")
 
-            kwargs.update(kwargs_additional)
+            if kwargs_additional:
+                kwargs = dict(kwargs)
+                kwargs.update(kwargs_additional)
+            # the function needs the data now, load lazy arrays
+            if any(isinstance(arg, LazyArray) for arg in args):
+                args = [materialize(arg) for arg in args]
+            if any(isinstance(val, LazyArray) for val in kwargs.values()):
+                kwargs = {key: materialize(val) for key, val in kwargs.items()}
             # print("args : {}, kwargs : {}".format(args, kwargs))
-            debugcache.append(dict(args=args, kwargs=kwargs,
-                                   attributes=attributes, funcname=f.__name__))
+            if debug.enabled:
+                debug.capture(f.__name__, args, kwargs, attributes)
 
             statistics = dict()
             t1 = time.time()
@@ -420,26 +647,18 @@ def parse_streamdoc(name):
                 # print("args : {}".format(args))
                 # print("kwargs : {}".format(kwargs))
                 statistics['status'] = "Success"
-            except TypeError:
-                print("Error, inputs do not match function type")
-                import inspect
-                sig = inspect.signature(f)
-                ba = sig.bind_partial(*args, **kwargs)
-                print("(StreamDoc) Error : Input mismatch on function")
-                print("This means there is an issue with "
-                      "The stream architecture")
-                print("Got {} arguments".format(len(ba.args)))
-                print("Got kwargs : {}".format(list(ba.kwargs.keys())))
-                print("But expected : {}".format(sig))
-                print("Returning empty result, see error report below")
+            except TypeError as err:
                 result = {}
-                _cleanexit(f, statistics)
-            except Exception:
+                _record_failure(f, err, statistics, attributes,
+                                _mismatch_message(f, err, args, kwargs))
+                debug.failed(f.__name__, args, kwargs, attributes)
+            except Exception as err:
                 result = {}
-                _cleanexit(f, statistics)
+                _record_failure(f, err, statistics, attributes)
+                debug.failed(f.__name__, args, kwargs, attributes)
 
             t2 = time.time()
-            statistics['runtime'] = t1 - t2
+            statistics['runtime'] = t2 - t1
             statistics['runstart'] = t1
 
             if 'function_list' not in attributes:
@@ -452,7 +671,10 @@ def parse_streamdoc(name):
             attributes['function_list'].append(f.__name__)
             # print("Running function {}".format(f.__name__))
             # instantiate new stream doc
-            streamdoc = StreamDoc(attributes=attributes)
+            streamdoc = StreamDoc()
+            # attributes is already a copy, no need to copy again
+            streamdoc.attributes = attributes
+            streamdoc.statistics = statistics
             # load in attributes
             # Save outputs to StreamDoc
             arguments_obj = parse_args(result)
@@ -472,32 +694,26 @@ parse_streamdoc_acc = parse_streamdoc("acc")
 psda = parse_streamdoc_acc
 
 
-def _cleanexit(f, statistics):
-    ''' convenience routine
-        to log errors from exception for
-        function f into statistics dict
-
-        print an error and return the string as well
-    '''
+def _record_failure(f, err, statistics, attributes, message=None):
+    ''' Mark the statistics of a call of f as failed with exception err,
+        and count the failure (see ``errors``).'''
     statistics['status'] = "Failure"
-    type, value, tb = sys.exc_info()
-    err_frame = tb.tb_frame
-    err_lineno = tb.tb_lineno
-    err_filename = err_frame.f_code.co_filename
-    statistics['error_message'] = value
-    errorstr = "####################"
-    errorstr += "StreamDoc Error Report"
-    errorstr += "##################\n"
-    errorstr += "time : {}\n".format(time.ctime(time.time()))
-    errorstr += "caught exception {}\n".format(value)
-    errorstr += "func name : {}\n".format(f.__name__)
-    errorstr += "line number {}\n".format(err_lineno)
-    errorstr += "in file {}\n".format(err_filename)
-    errorstr += "####################"
-    errorstr += "####################"
-    errorstr += "####################\n"
-    print(errorstr)
-    return errorstr
+    statistics['error_type'] = type(err).__name__
+    statistics['error_message'] = str(err) if message is None else message
+    errors.record(f.__name__, err, attributes.get('data_uid', None),
+                  message)
+
+
+def _mismatch_message(f, err, args, kwargs):
+    ''' Describe a TypeError, which usually means the stream architecture
+        gave the wrong inputs to f.'''
+    import inspect
+    try:
+        sig = inspect.signature(f)
+    except (TypeError, ValueError):
+        sig = "(unknown)"
+    return "{} : inputs may not match the function, got {} args and " \
+        "kwargs {}, expected {}".format(err, len(args), list(kwargs), sig)
 
 
 # for delayed objects, to ensure caching
@@ -505,7 +721,18 @@ def _cleanexit(f, statistics):
 # for the StreamDoc object
 @normalize_token.register(StreamDoc)
 def tokenize_sdoc(sdoc):
-    return normalize_token((sdoc['args'], sdoc['kwargs']))
+    # arrays are fingerprinted once, not hashed at every call
+    args = [fingerprint_token(arg) for arg in sdoc.args]
+    kwargs = {key: fingerprint_token(val) for key, val in sdoc.kwargs.items()}
+    return normalize_token((args, kwargs))
+
+
+@normalize_token.register(LazyArray)
+def tokenize_lazyarray(lazy):
+    # identify by the source when possible, to avoid loading
+    if lazy.key is not None:
+        return ('LazyArray', normalize_token(lazy.key))
+    return normalize_token(lazy.load())
 
 
 def delayed_wrapper(name):
@@ -0,0 +1,159 @@
+''' Worker resident artifacts (calibration maps, masks, etc).
+
+    Some inputs are large but change rarely, for ex. a calibration object
+    holds several q maps the size of the detector. Passed as arguments,
+    they are sent along with every task (and hashed every time they are
+    tokenized).
+
+    Instead, ``publish`` puts such an artifact in a keyed store local to each
+    process and returns an ``ArtifactRef``, a small handle holding the key
+    (a token) and optionally a recipe to rebuild the artifact. The handle is
+    what goes through the graph and to the workers. It is loaded like a
+    ``LazyArray`` when a ``parse_streamdoc`` wrapped function is called :
+    from the local store, or by running the recipe if the artifact is not
+    there yet (a new worker, a process pool etc) and storing the result.
+
+    With ``broadcast=True`` and a distributed client, the artifact is built
+    once and sent to the stores of all the workers (once per token).
+
+    Artifacts are built as a one task dask computation named after the
+    builder, so the result cache (see ``cache``) files them in the category
+    listing the builder (for ex. 'geometry' for the q maps).
+
+    Example
+    -------
+    >>> ref = publish(_build_maps, calib, client=client)
+    >>> sdoc = StreamDoc(args=[image, ref])
+    >>> psdm(circavg)(sdoc)  # the maps are read from the worker's store
+'''
+from collections import OrderedDict
+import threading
+
+from dask.base import tokenize
+from dask.delayed import delayed
+from dask.utils import funcname
+
+from .. import config
+from .lazy import LazyArray
+
+
+# the number of artifacts kept in the store of each process
+maxsize = config.artifacts['maxsize']
+
+_lock = threading.Lock()
+# token -> artifact, least recently used first
+_store = OrderedDict()
+# the tokens already sent to the workers
+_broadcasted = set()
+
+stats = dict(hits=0, builds=0, broadcasts=0)
+
+
+def store_artifact(token, artifact):
+    ''' Put an artifact in the store of this process.'''
+    with _lock:
+        _store[token] = artifact
+        _store.move_to_end(token)
+        while len(_store) > maxsize:
+            _store.popitem(last=False)
+
+
+def get_artifact(token):
+    ''' The artifact for token in the store of this process, or None.'''
+    with _lock:
+        artifact = _store.get(token, None)
+        if artifact is not None:
+            _store.move_to_end(token)
+        return artifact
+
+
+def clear():
+    with _lock:
+        _store.clear()
+        _broadcasted.clear()
+
+
+def _build(builder, args, token):
+    # the key is named after the builder, for the result cache
+    key = (funcname(builder), token)
+    return delayed(builder, pure=True)(*args, dask_key_name=key)\
+        .compute(scheduler='sync')
+
+
+class ArtifactRef(LazyArray):
+    ''' A reference to an artifact in the store of the process using it.
+
+        Parameters
+        ----------
+        token : str
+            the key of the artifact in the store
+        builder : callable, optional
+            builds the artifact when it is not in the store, from args. It
+            must not modify args.
+        args : tuple, optional
+            the arguments of builder
+    '''
+    __slots__ = ('builder', 'args')
+
+    def __init__(self, token, builder=None, args=()):
+        LazyArray.__init__(self, None, key=token, cache=False)
+        self.builder = builder
+        self.args = args
+
+    def load(self):
+        artifact = get_artifact(self.key)
+        if artifact is not None:
+            stats['hits'] += 1
+            return artifact
+        if self.builder is None:
+            raise KeyError("Artifact {} is not in the store of this process"
+                           " and can't be rebuilt".format(self.key))
+        artifact = _build(self.builder, self.args, self.key)
+        self.nloads += 1
+        stats['builds'] += 1
+        store_artifact(self.key, artifact)
+        return artifact
+
+    def __reduce__(self):
+        # only the reference is sent, not the artifact
+        return (ArtifactRef, (self.key, self.builder, self.args))
+
+    def __repr__(self):
+        return "ArtifactRef(token={})".format(self.key)
+
+
+def publish(builder, *args, client=None, broadcast=None, token=None):
+    ''' Publish the artifact builder(*args), returning an ArtifactRef.
+
+        Parameters
+        ----------
+        builder : callable
+            builds the artifact from args, without modifying them
+        args :
+            the (small) arguments of builder
+        client : Client, optional
+            the client whose workers get the artifact when broadcasting
+        broadcast : bool, optional
+            if True and client is a distributed client, build the artifact
+            here and send it to all the workers. Otherwise, each process
+            builds it when it first needs it. Defaults to the
+            ``artifacts['broadcast']`` config option.
+        token : str, optional
+            the key of the artifact, defaults to a token of builder and args
+    '''
+    if broadcast is None:
+        broadcast = config.artifacts['broadcast']
+    if token is None:
+        token = tokenize(builder, *args)
+    ref = ArtifactRef(token, builder, args)
+    if broadcast and client is not None and hasattr(client, 'run'):
+        with _lock:
+            sent = token in _broadcasted
+        if not sent:
+            artifact = ref.load()
+            client.run(store_artifact, token, artifact)
+            # only once it was sent, so a failure is retried next time
+            with _lock:
+                _broadcasted.add(token)
+            stats['broadcasts'] += 1
+    return ref
@@ -0,0 +1,210 @@
+''' Bounded ingest and load shedding for live pipelines.
+
+    The ``IngestQueue`` sits between the data source (for ex. a loop polling
+    databroker for new uids) and the source Stream of the graph. It bounds
+    the number of waiting and in-flight elements and keeps queue depth
+    metrics.
+
+    The queue also serves as a load monitor for ``Stream.shed`` nodes. These
+    drop or decimate elements on low priority branches (thumbnails, plots
+    etc) while the queue is backlogged, so that the important branches keep
+    up with the data.
+
+    Example
+    -------
+    >>> ingest = IngestQueue(maxsize=100, high_water=.5)
+    >>> sin = Stream()
+    >>> sin.map(reduce).sink(save)  # always runs
+    >>> sin.shed(ingest, policy='decimate', n=10).map(plot)  # 1 in 10
+    >>> # producer thread
+    >>> ingest.put(uid)
+    >>> # consumer
+    >>> ingest.run(sin)
+'''
+import threading
+from collections import deque
+
+
+class IngestQueue:
+    ''' A bounded, thread safe queue feeding a Stream.
+
+        Parameters
+        ----------
+        maxsize : int, optional
+            the maximum number of elements waiting in the queue
+        max_inflight : int, optional
+            the maximum number of elements taken from the queue but not yet
+            marked done (see ``task_done``)
+        high_water : float, optional
+            the fraction of maxsize above which the queue is considered
+            backlogged
+        overflow : str, optional
+            what to do when putting into a full queue:
+                'block' : wait for space
+                'drop_oldest' : drop the oldest waiting element
+                'drop_newest' : drop the new element
+    '''
+    def __init__(self, maxsize=100, max_inflight=1, high_water=.5,
+                 overflow='block'):
+        if overflow not in ('block', 'drop_oldest', 'drop_newest'):
+            raise ValueError("overflow policy not understood : "
+                             "{}".format(overflow))
+        self.maxsize = maxsize
+        self.max_inflight = max_inflight
+        self.high_water = high_water
+        self.overflow = overflow
+        self._queue = deque()
+        self._inflight = 0
+        self._cond = threading.Condition()
+        self._stopped = False
+
+        self.nput = 0
+        self.ndone = 0
+        self.ndropped = 0
+        self.max_depth = 0
+
+    def put(self, x, timeout=None):
+        ''' Put an element in the queue.
+
+            Returns True if the element was queued, False if it (or another
+            element) was dropped instead.
+        '''
+        with self._cond:
+            if len(self._queue) >= self.maxsize:
+                if self.overflow == 'drop_newest':
+                    self.ndropped += 1
+                    return False
+                elif self.overflow == 'drop_oldest':
+                    self._queue.popleft()
+                    self.ndropped += 1
+                else:
+                    res = self._cond.wait_for(
+                        lambda: len(self._queue) < self.maxsize, timeout)
+                    if not res:
+                        self.ndropped += 1
+                        return False
+            self._queue.append(x)
+            self.nput += 1
+            self.max_depth = max(self.max_depth, len(self._queue))
+            self._cond.notify_all()
+        return True
+
+    def get(self, timeout=None):
+        ''' Get the next element, waiting for an element and for an in-flight
+            slot to be available.
+
+            Raises TimeoutError if nothing is available after timeout seconds.
+        '''
+        with self._cond:
+            res = self._cond.wait_for(
+                lambda: self._stopped or (
+                    len(self._queue) > 0 and
+                    self._inflight < self.max_inflight), timeout)
+            if not res or self._stopped:
+                raise TimeoutError("No element available")
+            x = self._queue.popleft()
+            self._inflight += 1
+            self._cond.notify_all()
+        return x
+
+    def task_done(self):
+        ''' Mark an element taken with ``get`` as processed.'''
+        with self._cond:
+            self._inflight -= 1
+            self.ndone += 1
+            self._cond.notify_all()
+
+    def stop(self):
+        ''' Stop the ``run`` loop (and any waiting ``get``).'''
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+
+    @property
+    def depth(self):
+        return len(self._queue)
+
+    @property
+    def inflight(self):
+        return self._inflight
+
+    @property
+    def load(self):
+        ''' The fill fraction of the queue.'''
+        return len(self._queue) / self.maxsize
+
+    def backlogged(self):
+        ''' True if the queue is filled above the high water mark.'''
+        return self.load >= self.high_water
+
+    def metrics(self):
+        ''' Return a dictionary of the queue metrics.'''
+        return dict(depth=self.depth, maxsize=self.maxsize,
+                    inflight=self._inflight, max_depth=self.max_depth,
+                    nput=self.nput, ndone=self.ndone, ndropped=self.ndropped,
+                    load=self.load, backlogged=self.backlogged())
+
+    def run(self, stream, on_error=None, poll_interval=1.):
+        ''' Emit elements of the queue into stream until ``stop`` is called.
+
+            Parameters
+            ----------
+            stream : Stream
+                the stream to emit into
+            on_error : callable, optional
+                called as on_error(x, exception) if the emit raises an
+                Exception. If None, the exception is raised.
+            poll_interval : float, optional
+                how often to check if the queue was stopped when idle
+        '''
+        while not self._stopped:
+            try:
+                x = self.get(timeout=poll_interval)
+            except TimeoutError:
+                continue
+            try:
+                stream.emit(x)
+            except Exception as e:
+                if on_error is None:
+                    raise
+                on_error(x, e)
+            finally:
+                self.task_done()
+
+
+class Poller:
+    ''' Run a polling function in a daemon thread, putting the elements it
+        returns into an IngestQueue.
+
+        Parameters
+        ----------
+        func : callable
+            called as func() and returns an iterable of new elements
+        ingest : IngestQueue
+            the queue to put elements in
+        interval : float, optional
+            the time to wait between polls (when the poll was empty)
+    '''
+    def __init__(self, func, ingest, interval=1.):
+        self.func = func
+        self.ingest = ingest
+        self.interval = interval
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            nnew = 0
+            try:
+                for x in self.func():
+                    self.ingest.put(x)
+                    nnew += 1
+            except Exception as e:
+                print("Poller : error while polling : {}".format(e))
+            if nnew == 0:
+                self._stopped.wait(self.interval)
+
+    def stop(self):
+        self._stopped.set()
+
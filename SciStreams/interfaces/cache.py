@@ -0,0 +1,211 @@
+''' A result cache for dask computations, with a budget per category.
+
+    Delayed functions are pure, so a result computed once can be reused
+    when the same call comes again. A single cache of results shared by
+    everything mixes results computed once per frame (and rarely reused)
+    with long lived ones such as the calibration maps, and the first can
+    push the second out.
+
+    ``TypedCache`` sorts results into categories by the name of the function
+    that computed them. Each category has its own budget (bytes) and can be:
+        - pinned : the entries never expire, they are only evicted (least
+          recently used first) to stay in the category's budget
+        - given a ttl : the entries expire that many seconds after being
+          stored (per frame results)
+    Hits, misses and bytes are counted per category (see ``stats``).
+
+    Like ``dask.cache.Cache``, it is a dask callback : use it as a context
+    manager around ``compute`` calls or ``register`` it globally. It only
+    applies to the local schedulers.
+
+    Example
+    -------
+    >>> cache = TypedCache({'geometry': dict(budget=2e8, pin=True,
+    ...                                      functions=['generate_maps']),
+    ...                     'frame': dict(budget=5e8, ttl=60.)},
+    ...                    default='frame')
+    >>> cache.register()
+    >>> print(format_cache_stats(cache.stats()))
+'''
+from collections import OrderedDict
+import threading
+import time
+
+from dask.callbacks import Callback
+from dask.sizeof import sizeof
+from dask.utils import key_split
+
+
+class CacheCategory:
+    ''' The entries of one category of a TypedCache.
+
+        Parameters
+        ----------
+        name : str
+        budget : float
+            the maximum number of bytes held
+        ttl : float, optional
+            if not None, entries expire this many seconds after being stored
+        pin : bool, optional
+            if True, entries never expire (ttl is ignored)
+    '''
+    def __init__(self, name, budget, ttl=None, pin=False):
+        self.name = name
+        self.budget = budget
+        self.ttl = None if pin else ttl
+        self.pin = pin
+        # key -> (value, nbytes, time stored), least recently used first
+        self.entries = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _expired(self, stored, now):
+        return self.ttl is not None and now - stored > self.ttl
+
+    def get(self, key, now):
+        entry = self.entries.get(key, None)
+        if entry is None:
+            return None
+        if self._expired(entry[2], now):
+            self._remove(key)
+            self.expirations += 1
+            return None
+        self.entries.move_to_end(key)
+        return entry
+
+    def put(self, key, value, nbytes, now):
+        if nbytes > self.budget:
+            return
+        if key in self.entries:
+            self._remove(key)
+        self.expire(now)
+        while self.entries and self.nbytes + nbytes > self.budget:
+            oldkey = next(iter(self.entries))
+            self._remove(oldkey)
+            self.evictions += 1
+        self.entries[key] = (value, nbytes, now)
+        self.nbytes += nbytes
+
+    def expire(self, now):
+        ''' Remove the expired entries.'''
+        if self.ttl is None:
+            return
+        # entries are in order of use, not of storage, so check them all
+        expired = [key for key, entry in self.entries.items()
+                   if self._expired(entry[2], now)]
+        for key in expired:
+            self._remove(key)
+        self.expirations += len(expired)
+
+    def _remove(self, key):
+        value, nbytes, stored = self.entries.pop(key)
+        self.nbytes -= nbytes
+
+    def clear(self):
+        self.entries.clear()
+        self.nbytes = 0
+
+    def stats(self):
+        nlookups = self.hits + self.misses
+        return dict(category=self.name, entries=len(self.entries),
+                    bytes=self.nbytes, budget=self.budget, hits=self.hits,
+                    misses=self.misses,
+                    hit_rate=self.hits/nlookups if nlookups else None,
+                    evictions=self.evictions, expirations=self.expirations)
+
+
+class TypedCache(Callback):
+    ''' Cache dask results with a budget per category.
+
+        Parameters
+        ----------
+        categories : dict
+            category name -> dict(budget=, ttl=, pin=, functions=), where
+            functions lists the names of the functions whose results go in
+            the category
+        default : str, optional
+            the category of the results of other functions. If None, they
+            are not cached.
+    '''
+    def __init__(self, categories, default=None):
+        Callback.__init__(self)
+        self.categories = dict()
+        # function name -> category
+        self.functions = dict()
+        for name, options in categories.items():
+            options = dict(options)
+            functions = options.pop('functions', list())
+            self.categories[name] = CacheCategory(name, **options)
+            for funcname in functions:
+                # keys are matched on their key_split name
+                self.functions[key_split(funcname)] = self.categories[name]
+        if default is not None and default not in self.categories:
+            raise ValueError("Default category {} is not one of {}"
+                             .format(default, list(self.categories)))
+        self.default = None if default is None else self.categories[default]
+        self._lock = threading.Lock()
+
+    def category(self, key):
+        ''' The category of the result of a task, None if not cached.'''
+        return self.functions.get(key_split(key), self.default)
+
+    def _start(self, dsk):
+        now = time.time()
+        with self._lock:
+            for key in dsk:
+                category = self.category(key)
+                if category is None:
+                    continue
+                entry = category.get(key, now)
+                if entry is not None:
+                    category.hits += 1
+                    dsk[key] = entry[0]
+
+    def _posttask(self, key, value, dsk, state, id):
+        category = self.category(key)
+        if category is None:
+            return
+        nbytes = sizeof(value)
+        with self._lock:
+            category.misses += 1
+            category.put(key, value, nbytes, time.time())
+
+    def expire(self):
+        ''' Remove the expired entries of all categories.'''
+        now = time.time()
+        with self._lock:
+            for category in self.categories.values():
+                category.expire(now)
+
+    def clear(self):
+        with self._lock:
+            for category in self.categories.values():
+                category.clear()
+
+    def stats(self):
+        ''' Hits, misses, bytes held etc. by category.'''
+        with self._lock:
+            return [category.stats()
+                    for category in self.categories.values()]
+
+
+def format_cache_stats(stats):
+    ''' Format the output of ``TypedCache.stats()`` into a table string.'''
+    lines = list()
+    header = "{:<12} {:>8} {:>10} {:>10} {:>8} {:>8} {:>9}".format(
+        "category", "entries", "MB", "budget MB", "hits", "misses",
+        "hit rate")
+    lines.append(header)
+    lines.append("-"*len(header))
+    for stat in stats:
+        hit_rate = stat['hit_rate']
+        lines.append("{:<12} {:>8} {:>10.1f} {:>10.1f} {:>8} {:>8} {:>9}"
+                     .format(stat['category'], stat['entries'],
+                             stat['bytes']*1e-6, stat['budget']*1e-6,
+                             stat['hits'], stat['misses'],
+                             "-" if hit_rate is None
+                             else "{:.1%}".format(hit_rate)))
+    return "\n".join(lines)
@@ -0,0 +1,258 @@
+''' Checkpointing of stateful Stream nodes.
+
+    Nodes such as ``scan`` (accumulate), ``sliding_window`` and ``partition``
+    only hold their state in memory. A ``Checkpointer`` periodically
+    snapshots the state of registered nodes to disk, and restores it on
+    startup so a restarted pipeline resumes where it left off.
+
+    Snapshots are taken at frame boundaries (see ``Checkpointer.frame_done``)
+    so that the states of all nodes are consistent with each other. Along
+    with the states, some metadata about the position in the input (for ex.
+    the last uid processed) is saved, to know where to resume from.
+
+    Layout on disk:
+        directory/LATEST : the name of the latest complete snapshot
+        directory/snapshot-N/state.json : the states and metadata
+        directory/snapshot-N/*.npy : arrays (memory mapped on restore)
+        directory/snapshot-N/*.pkl : anything else not JSON serializable
+
+    Example
+    -------
+    >>> checkpointer = Checkpointer("/tmp/checkpoints", interval=60)
+    >>> checkpointer.register_graph("main", sin)
+    >>> metadata = checkpointer.restore()
+    >>> for uid in uids:
+    ...     sin.emit(uid)
+    ...     checkpointer.frame_done(dict(last_uid=uid))
+'''
+import json
+import os
+import pickle
+import shutil
+import time
+
+import numpy as np
+
+from .StreamDoc import StreamDoc
+from .lazy import materialize
+from .streams import no_default
+
+
+_LATEST_FILENAME = "LATEST"
+_STATE_FILENAME = "state.json"
+
+
+class _Encoder:
+    ''' Encode a state into something json serializable, saving arrays and
+        other objects to files in a directory.'''
+    def __init__(self, directory):
+        self.directory = directory
+        self.count = 0
+
+    def _filename(self, ext):
+        self.count += 1
+        return "obj{}.{}".format(self.count, ext)
+
+    def encode(self, val):
+        val = materialize(val)
+        if val is no_default:
+            return {'__no_default__': True}
+        if isinstance(val, np.ndarray) and not val.dtype.hasobject:
+            filename = self._filename("npy")
+            np.save(os.path.join(self.directory, filename), val)
+            return {'__ndarray__': filename}
+        if isinstance(val, np.generic):
+            return val.item()
+        if isinstance(val, StreamDoc):
+            return {'__StreamDoc__': dict(
+                args=self.encode(list(val['args'])),
+                kwargs=self.encode(dict(val['kwargs'])),
+                attributes=self.encode(dict(val['attributes'])),
+                statistics=self.encode(dict(val['statistics'])))}
+        if isinstance(val, tuple):
+            return {'__tuple__': [self.encode(elem) for elem in val]}
+        if isinstance(val, list):
+            return [self.encode(elem) for elem in val]
+        if isinstance(val, dict) and all(isinstance(key, str) for key in val):
+            return {'__dict__': {key: self.encode(elem)
+                                 for key, elem in val.items()}}
+        if val is None or isinstance(val, (str, int, float, bool)):
+            return val
+        filename = self._filename("pkl")
+        with open(os.path.join(self.directory, filename), "wb") as f:
+            pickle.dump(val, f)
+        return {'__pickle__': filename}
+
+
+def _decode(val, directory):
+    if isinstance(val, list):
+        return [_decode(elem, directory) for elem in val]
+    if not isinstance(val, dict):
+        return val
+    if '__no_default__' in val:
+        return no_default
+    if '__ndarray__' in val:
+        # copy on write, so in place modifications don't touch the snapshot
+        return np.load(os.path.join(directory, val['__ndarray__']),
+                       mmap_mode='c')
+    if '__StreamDoc__' in val:
+        val = {key: _decode(elem, directory)
+               for key, elem in val['__StreamDoc__'].items()}
+        sdoc = StreamDoc(args=val['args'], kwargs=val['kwargs'],
+                         attributes=val['attributes'])
+        sdoc.add(statistics=val['statistics'])
+        return sdoc
+    if '__tuple__' in val:
+        return tuple(_decode(elem, directory) for elem in val['__tuple__'])
+    if '__dict__' in val:
+        return {key: _decode(elem, directory)
+                for key, elem in val['__dict__'].items()}
+    if '__pickle__' in val:
+        with open(os.path.join(directory, val['__pickle__']), "rb") as f:
+            return pickle.load(f)
+    raise ValueError("Could not decode checkpoint entry : {}".format(val))
+
+
+class Checkpointer:
+    ''' Save and restore the state of Stream nodes.
+
+        Parameters
+        ----------
+        directory : str
+            the directory to save the snapshots to
+        interval : float, optional
+            the minimum time (s) between two snapshots
+        every : int, optional
+            if not None, take a snapshot every this many frames (whichever
+            of interval and every comes first)
+        keep : int, optional
+            the number of snapshots to keep on disk
+    '''
+    def __init__(self, directory, interval=60., every=None, keep=2):
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.directory = directory
+        self.interval = interval
+        self.every = every
+        self.keep = keep
+        self.nodes = dict()
+        # the sources of the graphs registered
+        self._graphs = set()
+        self.nframes = 0
+        self.last_save = time.time()
+        self._seq = self._latest_seq()
+
+    def register(self, name, node):
+        ''' Register a node to checkpoint under a unique name.
+
+            The node must have ``get_state`` and ``set_state`` methods.
+        '''
+        if not getattr(node, 'stateful', False):
+            raise ValueError("Node {} does not support checkpointing"
+                             .format(node))
+        if name in self.nodes and self.nodes[name] is not node:
+            raise ValueError("Name {} already registered".format(name))
+        self.nodes[name] = node
+
+    def register_graph(self, prefix, source):
+        ''' Register all stateful nodes downstream of source.
+
+            Nodes are named prefix/index/class where index is the position of
+            the node in the graph. This is stable as long as the graph is
+            built the same way.
+
+            The graphs emitted into from this one (``s.map(sin.emit)``) are
+            registered too, under prefix/index where index is the position
+            of the connector. Nodes already registered are skipped.
+        '''
+        self._graphs.add(id(source))
+        registered = {id(node) for node in self.nodes.values()}
+        for i, node in enumerate(source.downstream()):
+            if getattr(node, 'stateful', False) and \
+                    id(node) not in registered:
+                name = "{}/{}/{}".format(prefix, i, node.__class__.__name__)
+                self.register(name, node)
+            target = node._connector_target()
+            if target is not None and id(target) not in self._graphs:
+                self.register_graph("{}/{}".format(prefix, i), target)
+
+    def _latest_seq(self):
+        latest = self._latest()
+        if latest is None:
+            return 0
+        return int(latest.split("-")[-1])
+
+    def _latest(self):
+        filename = os.path.join(self.directory, _LATEST_FILENAME)
+        if not os.path.exists(filename):
+            return None
+        with open(filename) as f:
+            return f.read().strip()
+
+    def save(self, metadata=None):
+        ''' Save a snapshot of all registered nodes now.'''
+        self._seq += 1
+        name = "snapshot-{}".format(self._seq)
+        snapdir = os.path.join(self.directory, name)
+        if os.path.exists(snapdir):
+            shutil.rmtree(snapdir)
+        os.makedirs(snapdir)
+        encoder = _Encoder(snapdir)
+        states = {nodename: encoder.encode(node.get_state())
+                  for nodename, node in self.nodes.items()}
+        with open(os.path.join(snapdir, _STATE_FILENAME), "w") as f:
+            json.dump(dict(time=time.time(), states=states,
+                           metadata=encoder.encode(metadata)), f)
+        # atomically point to the new snapshot
+        tmpname = os.path.join(self.directory, _LATEST_FILENAME + ".tmp")
+        with open(tmpname, "w") as f:
+            f.write(name)
+        os.replace(tmpname, os.path.join(self.directory, _LATEST_FILENAME))
+        self._cleanup()
+        self.last_save = time.time()
+
+    def _cleanup(self):
+        for entry in os.listdir(self.directory):
+            if entry.startswith("snapshot-"):
+                seq = int(entry.split("-")[-1])
+                if seq <= self._seq - self.keep:
+                    shutil.rmtree(os.path.join(self.directory, entry))
+
+    def frame_done(self, metadata=None):
+        ''' Call once a frame went through the whole graph. Saves a snapshot
+            if one is due.
+
+            Returns True if a snapshot was taken.
+        '''
+        self.nframes += 1
+        due = time.time() - self.last_save >= self.interval
+        if self.every is not None and self.nframes % self.every == 0:
+            due = True
+        if due:
+            self.save(metadata)
+        return due
+
+    def restore(self):
+        ''' Restore the state of the registered nodes from the latest
+            snapshot.
+
+            Nodes not found in the snapshot are left untouched.
+
+            Returns
+            -------
+            metadata : the metadata saved with the snapshot, None if there
+                was no snapshot
+        '''
+        latest = self._latest()
+        if latest is None:
+            return None
+        snapdir = os.path.join(self.directory, latest)
+        with open(os.path.join(snapdir, _STATE_FILENAME)) as f:
+            res = json.load(f)
+        for nodename, state in res['states'].items():
+            if nodename in self.nodes:
+                self.nodes[nodename].set_state(_decode(state, snapdir))
+            else:
+                print("Checkpointer : no node named {}, ignoring"
+                      .format(nodename))
+        return _decode(res['metadata'], snapdir)
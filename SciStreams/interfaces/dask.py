@@ -29,28 +29,49 @@
 #
 from __future__ import absolute_import, division, print_function
 
+import asyncio
+import builtins
+from collections import deque
+import threading
 from operator import getitem
 
 from tornado import gen
+from tornado.concurrent import Future as TornadoFuture, is_future
+from tornado.ioloop import IOLoop
 
 import dask.distributed
 from distributed.utils import set_thread_state
-from distributed.client import default_client
+from distributed.client import default_client, as_completed
 
 from . import streams
 
 
+# marks the result of a failed future in the reorder buffer
+_skipped = object()
+
+
 class DaskStream(streams.Stream):
     def map(self, func, *args, **kwargs):
         """ Apply a function to every element in the stream """
         return map(func, self, args=args, **kwargs)
 
-    def gather(self):
-        return gather(self)
+    def gather(self, ordered=False, max_inflight=100):
+        """ Gather the results back locally, as they complete
 
-    def accumulate(self, func, start=streams.no_default, returns_state=False):
-        """ Accumulate results with previous state """
-        return scan(func, self, start=start, returns_state=returns_state)
+        With ordered=True, results are emitted in the order of the futures.
+        At most max_inflight elements are waited for (see ``gather``).
+        """
+        return gather(self, ordered=ordered, max_inflight=max_inflight)
+
+    def accumulate(self, func, start=streams.no_default, returns_state=False,
+                   pin=True, worker=None, emit_state=True):
+        """ Accumulate results with previous state
+
+        With pin=True, the accumulation runs on a single worker so the state
+        never moves (see ``scan``).
+        """
+        return scan(func, self, start=start, returns_state=returns_state,
+                    pin=pin, worker=worker, emit_state=emit_state)
 
     scan = accumulate
 
@@ -83,28 +104,73 @@ class map(DaskStream):
 
 
 class scan(DaskStream):
+    """ Accumulate on the cluster.
+
+    Parameters
+    ----------
+    pin : bool, optional
+        if True, run every accumulation step on the same worker (``worker``,
+        or the least loaded one when the first element arrives). The state
+        then stays resident on that worker and only the new elements are
+        transferred to it, instead of the state following the tasks from
+        worker to worker. If the worker leaves, another one is picked.
+    worker : str, optional
+        the address of the worker to pin to
+    emit_state : bool, optional
+        if False, the state is not emitted after each element (only the
+        results are, if returns_state is True). Call ``snapshot`` to emit
+        it on demand.
+    """
     def __init__(self, func, child, start=streams.no_default,
-                 returns_state=False):
+                 returns_state=False, pin=True, worker=None,
+                 emit_state=True):
         self.func = func
         self.state = start
         self.returns_state = returns_state
+        self.pin = pin
+        self.worker = worker
+        self.emit_state = emit_state
         DaskStream.__init__(self, child)
 
+    def _workers(self, client):
+        if not self.pin:
+            return None
+        workers = client.scheduler_info().get('workers', dict())
+        if self.worker not in workers:
+            if not workers:
+                return None
+            self.worker = min(
+                workers,
+                key=lambda w: workers[w].get('metrics', {}).get('memory', 0))
+        return [self.worker]
+
     def update(self, x, who=None):
         if self.state is streams.no_default:
             self.state = x
+            if not self.emit_state:
+                return []
             return self.emit(self.state)
         else:
             client = default_client()
-            result = client.submit(self.func, self.state, x)
+            workers = self._workers(client)
+            result = client.submit(self.func, self.state, x,
+                                   workers=workers)
             if self.returns_state:
-                state = client.submit(getitem, result, 0)
+                state = client.submit(getitem, result, 0, workers=workers)
                 result = client.submit(getitem, result, 1)
             else:
                 state = result
             self.state = state
+            if not self.returns_state and not self.emit_state:
+                return []
             return self.emit(result)
 
+    def snapshot(self):
+        """ Emit the current state (a future). """
+        if self.state is streams.no_default:
+            return []
+        return self.emit(self.state)
+
 
 class scatter(DaskStream):
     """ Convert local stream to Dask Stream
@@ -123,18 +189,145 @@ class scatter(DaskStream):
 
 
 class gather(streams.Stream):
-    """ Convert Dask stream to local Stream """
-    @gen.coroutine
-    def _update(self, x, who=None):
-        client = default_client()
-        result = yield client.gather(x, asynchronous=True)
-        with set_thread_state(asynchronous=True):
-            result = self.emit(result)
-        yield result
+    """ Convert Dask stream to local Stream
+
+    Results are gathered as their futures complete : a slow future does not
+    hold back the ones after it. The futures done at the same time are
+    gathered together, in one round trip to the scheduler.
+
+    Parameters
+    ----------
+    ordered : bool, optional
+        if True, emit the results in the order the futures arrived. Results
+        done early wait in a reorder buffer (by sequence number) until the
+        ones before them are emitted.
+    max_inflight : int, optional
+        the maximum number of elements added from outside the client's event
+        loop and not yet emitted. ``update`` blocks at the limit, slowing
+        the source down to the pace of the cluster. None for no limit.
+
+    Notes
+    -----
+    Failed futures are skipped (and counted in ``nerrors``).
+
+    When called from the client's event loop, ``update`` returns a future
+    done when the element was emitted downstream (so ``yield
+    source.emit(x)`` waits for it, the loop can't be blocked). Else it
+    returns once the element is handed to the loop, blocking while
+    max_inflight elements are in flight.
+    """
+    def __init__(self, child, ordered=False, max_inflight=100, loop=None):
+        self.ordered = ordered
+        self.max_inflight = max_inflight
+        if max_inflight is not None:
+            self._slots = threading.BoundedSemaphore(max_inflight)
+        else:
+            self._slots = None
+        # the sequence numbers holding a slot
+        self._slotted = set()
+        self.nerrors = 0
+        self._as_completed = None
+        self._consuming = False
+        self._seq = 0
+        self._next = 0
+        # future key -> sequence numbers (a key may be added more than once)
+        self._seqs = dict()
+        # sequence number -> result (or _skipped), for ordered emission
+        self._reorder = dict()
+        # sequence number -> tornado future to resolve once emitted
+        self._waiters = dict()
+        streams.Stream.__init__(self, child, loop=loop)
 
     def update(self, x, who=None):
         client = default_client()
-        return client.sync(self._update, x, who)
+        asyncio_loop = client.loop.asyncio_loop
+        try:
+            on_loop = asyncio.get_running_loop() is asyncio_loop
+        except RuntimeError:
+            on_loop = False
+        if on_loop:
+            waiter = TornadoFuture()
+            self._add(x, waiter, False)
+            return [waiter]
+        slotted = self._slots is not None
+        if slotted:
+            self._slots.acquire()
+        client.loop.add_callback(self._add, x, None, slotted)
+        return []
+
+    def _add(self, future, waiter, slotted):
+        # always runs on the client's loop
+        if self._as_completed is None:
+            self._as_completed = as_completed()
+        seq = self._seq
+        self._seq += 1
+        if waiter is not None:
+            self._waiters[seq] = waiter
+        if slotted:
+            self._slotted.add(seq)
+        self._seqs.setdefault(future.key, deque()).append(seq)
+        self._as_completed.add(future)
+        if not self._consuming:
+            self._consuming = True
+            IOLoop.current().add_callback(self._consume)
+
+    async def _consume(self):
+        client = default_client()
+        try:
+            async for future in self._as_completed:
+                batch = [future]
+                batch.extend(self._as_completed.next_batch(block=False))
+                results = await self._gather(client, batch)
+                for future, result in builtins.zip(batch, results):
+                    seq = self._seqs[future.key].popleft()
+                    if not self._seqs[future.key]:
+                        del self._seqs[future.key]
+                    await self._emit_seq(seq, result)
+        finally:
+            self._consuming = False
+
+    async def _gather(self, client, batch):
+        try:
+            return await client.gather(batch, asynchronous=True)
+        except Exception:
+            pass
+        # some failed, gather them one by one
+        results = list()
+        for future in batch:
+            try:
+                result = await client.gather(future, asynchronous=True)
+            except Exception as err:
+                print("gather : future {} failed : {}".format(future.key, err))
+                self.nerrors += 1
+                result = _skipped
+            results.append(result)
+        return results
+
+    async def _emit_seq(self, seq, result):
+        if not self.ordered:
+            await self._emit_one(seq, result)
+            return
+        self._reorder[seq] = result
+        while self._next in self._reorder:
+            seq = self._next
+            self._next += 1
+            await self._emit_one(seq, self._reorder.pop(seq))
+
+    async def _emit_one(self, seq, result):
+        waiter = self._waiters.pop(seq, None)
+        try:
+            if result is not _skipped:
+                with set_thread_state(asynchronous=True):
+                    futures = self.emit(result)
+                futures = [f for f in futures if is_future(f)]
+                if futures:
+                    await gen.multi(futures)
+        finally:
+            if seq in self._slotted:
+                self._slotted.discard(seq)
+                self._slots.release()
+        if waiter is not None and not waiter.done():
+            waiter.set_result(None)
 
 
 class zip(DaskStream, streams.zip):
@@ -3,6 +3,7 @@
 # add to results for filestore to handle
 # see saveschematic.txt for deails
 import time
+from functools import partial
 from uuid import uuid4
 import numpy as np
 import matplotlib
@@ -13,6 +14,8 @@ import json
 from .writers_custom \
         import writers_dict as _writers_dict
 from ..StreamDoc import StreamDoc
+from ..lazy import LazyArray
+from ..fingerprint import set_provenance
 from metadatastore.core import NoEventDescriptors
 
 # TODO : change to the new databroker version but leave for now
@@ -30,11 +33,14 @@ _ANALYSIS_STORE_VERSION = 'beta-v2'
 # others not
 
 
-def Header2StreamDoc(header, dbname="cms:data", fill=True):
+def Header2StreamDoc(header, dbname="cms:data", fill=True, lazy=False):
     ''' Convert a header to a StreamDoc.
 
         Note: This assumes header contains only one event.
             Need to add to function if dealing with multiple events.
+
+        lazy : if True, externally stored data (images) is not read here,
+            but given as LazyArrays read when a function first needs them
     '''
     sdoc = StreamDoc()
     attributes = header['start'].copy()
@@ -47,8 +53,21 @@ def Header2StreamDoc(header, dbname="cms:data", fill=True):
 
     # Assume first event
     try:
-        event = list(db.get_events(header, fill=fill))[0]
+        event = list(db.get_events(header, fill=fill and not lazy))[0]
         eventdata = event['data']
+        if lazy and fill:
+            eventdata = dict(eventdata)
+            for key in _external_keys(header):
+                if key in eventdata:
+                    loader = partial(_load_field, dbname, header, key)
+                    eventdata[key] = LazyArray(loader,
+                                               key=(attributes['uid'], key))
+        elif fill:
+            # the images are identified by where they come from, and never
+            # hashed when tokenized
+            for key in _external_keys(header):
+                if isinstance(eventdata.get(key), np.ndarray):
+                    set_provenance(eventdata[key], (attributes['uid'], key))
     except IndexError:
         # there are no events
         print("Found no events")
@@ -62,6 +81,23 @@ def Header2StreamDoc(header, dbname="cms:data", fill=True):
     return sdoc
 
 
+def _external_keys(header):
+    ''' The keys of the data stored outside of the events.'''
+    keys = list()
+    for descriptor in header['descriptors']:
+        for key, data_key in descriptor['data_keys'].items():
+            if data_key.get('external'):
+                keys.append(key)
+    return keys
+
+
+def _load_field(dbname, header, key):
+    from .databases import databases
+    db = databases[dbname]
+    event = list(db.get_events(header, fill=True, fields=[key]))[0]
+    return event['data'][key]
+
+
 '''
     Useful routines for searching of databroker items.
 '''
@@ -103,7 +139,7 @@ def pullrecent(dbname, protocol_name=None, **kwargs):
     return sdoc
 
 
-def pullfromuid(uid, dbname=None):
+def pullfromuid(uid, dbname=None, lazy=False):
     ''' Pull from a databroker database from a uid
 
         Parameters
@@ -117,6 +153,9 @@ def pullfromuid(uid, dbname=None):
 
         uid : the uid of dataset
 
+        lazy : if True, don't read the images until they are needed (see
+            Header2StreamDoc)
+
         Returns
         -------
         StreamDoc of data
@@ -139,7 +178,7 @@ def pullfromuid(uid, dbname=None):
     # serializable)
     header = dict(db[uid])
 
-    scires = Header2StreamDoc(header, dbname)
+    scires = Header2StreamDoc(header, dbname, lazy=lazy)
 
     return scires
 
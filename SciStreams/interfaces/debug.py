@@ -0,0 +1,143 @@
+''' Opt-in capture of the inputs of StreamDoc functions, for debugging.
+
+    Off by default, in which case it costs a single flag check per call.
+    When enabled (for all functions or some of them by name), each call of a
+    ``parse_streamdoc`` wrapped function (``psdm``/``psda``) records a small
+    summary of its inputs in ``captures`` : the shapes, dtypes and some
+    statistics of the arrays, not the arrays themselves, so no frame is kept
+    alive by the capture.
+
+    Independently, if a dump directory is set, the full inputs of failing
+    calls are pickled there so they can be replayed later (see ``replay``).
+
+    Example
+    -------
+    >>> debug.enable(functions=['circavg'], dumpdir='/tmp/failures')
+    >>> sin.emit(sdoc)
+    >>> debug.captures[-1]
+    {'funcname': 'circavg', 'args': [{'shape': (1000, 1000), ...}], ...}
+    >>> result = debug.replay('/tmp/failures/failure-...-circavg.pkl', circavg)
+'''
+from collections import deque
+import os
+import pickle
+import time
+import traceback
+
+import numpy as np
+
+from .. import config
+
+
+# whether calls are captured at all
+enabled = False
+# if not None, only the functions with these names are captured
+funcnames = None
+# the summaries of the last captured calls
+captures = deque(maxlen=config.debug['maxlen'])
+# if not None, full inputs of failing calls are saved here
+dumpdir = config.debug['dumpdir']
+
+
+def enable(functions=None, maxlen=None, dumpdir=None):
+    ''' Start capturing calls.
+
+        Parameters
+        ----------
+        functions : list of str, optional
+            the names of the functions to capture, all if None
+        maxlen : int, optional
+            the number of captures to keep
+        dumpdir : str, optional
+            if not None, save the inputs of failing calls to this directory
+    '''
+    global enabled, captures, funcnames
+    funcnames = None if functions is None else set(functions)
+    if maxlen is not None:
+        captures = deque(captures, maxlen=maxlen)
+    if dumpdir is not None:
+        set_dumpdir(dumpdir)
+    enabled = True
+
+
+def disable():
+    ''' Stop capturing calls (failures are still dumped if a dump directory
+        is set).'''
+    global enabled
+    enabled = False
+
+
+def set_dumpdir(directory):
+    ''' Save the inputs of failing calls to directory, None to stop.'''
+    global dumpdir
+    if directory is not None and not os.path.isdir(directory):
+        os.makedirs(directory)
+    dumpdir = directory
+
+
+def summarize(val):
+    ''' A small description of val, not referencing it.'''
+    if isinstance(val, np.ndarray):
+        summary = dict(shape=val.shape, dtype=val.dtype.str)
+        if val.size and val.dtype.kind in 'biuf':
+            summary.update(min=float(np.nanmin(val)),
+                           max=float(np.nanmax(val)),
+                           mean=float(np.nanmean(val)))
+        return summary
+    text = repr(val)
+    if len(text) > 100:
+        text = text[:97] + "..."
+    return dict(type=type(val).__name__, repr=text)
+
+
+def capture(funcname, args, kwargs, attributes):
+    ''' Record a summary of a call, if funcname is captured.'''
+    if funcnames is not None and funcname not in funcnames:
+        return
+    captures.append(dict(funcname=funcname, time=time.time(),
+                         data_uid=attributes.get('data_uid', None),
+                         args=[summarize(arg) for arg in args],
+                         kwargs={key: summarize(val)
+                                 for key, val in kwargs.items()}))
+
+
+def failed(funcname, args, kwargs, attributes):
+    ''' Save the inputs of a failing call, if a dump directory is set.
+
+        Must be called from the except clause handling the failure.
+
+        Returns
+        -------
+        filename : the file the inputs were saved to, None if not saved
+    '''
+    if dumpdir is None:
+        return None
+    record = dict(funcname=funcname, args=list(args), kwargs=dict(kwargs),
+                  attributes=attributes, traceback=traceback.format_exc())
+    filename = os.path.join(dumpdir, "failure-{:.6f}-{}.pkl"
+                            .format(time.time(), funcname))
+    try:
+        with open(filename, "wb") as f:
+            pickle.dump(record, f)
+    except Exception as err:
+        print("debug : could not save the failing call of {} : {}"
+              .format(funcname, err))
+        return None
+    print("debug : inputs of the failing call saved to {}".format(filename))
+    return filename
+
+
+def load_failure(filename):
+    ''' Load a failing call saved by ``failed``.
+
+        Returns a dict with funcname, args, kwargs, attributes and traceback.
+    '''
+    with open(filename, "rb") as f:
+        return pickle.load(f)
+
+
+def replay(filename, func):
+    ''' Call func (the unwrapped function) with the inputs of a failing
+        call saved in filename.'''
+    record = load_failure(filename)
+    return func(*record['args'], **record['kwargs'])
@@ -0,0 +1,146 @@
+''' Accounting of the failures of StreamDoc functions.
+
+    When a ``parse_streamdoc`` wrapped function (``psdm``/``psda``) raises,
+    the failure is counted in a table, by function and exception type,
+    along with the last message, where it was raised and the data_uids of
+    the last failing documents. Reports are printed at most once per
+    ``log_interval`` seconds for each kind of failure, so a function failing
+    on every frame does not flood the output.
+
+    The output of a failing call is an empty StreamDoc marked as failed
+    (``is_failed``). If ``skip_failed`` is set, ``map`` and ``scan`` nodes
+    drop it instead of emitting it, so a failure does not cost (or report)
+    again downstream. Wrapped functions called directly on failed
+    StreamDocs pass them through.
+
+    Example
+    -------
+    >>> sin.emit(sdoc)
+    >>> print(format_errors())
+'''
+from collections import deque
+import threading
+import time
+
+from .. import config
+
+
+# minimum time (s) between two reports of the same kind of failure
+log_interval = config.errors['log_interval']
+# if True, functions pass failed StreamDocs through instead of running
+skip_failed = config.errors['skip_failed']
+
+_lock = threading.Lock()
+# (funcname, exception type name) -> ErrorRecord
+table = dict()
+
+
+class ErrorRecord:
+    ''' The failures of one function with one type of exception.'''
+    __slots__ = ('funcname', 'exctype', 'count', 'first_time', 'last_time',
+                 'message', 'location', 'data_uids', 'last_report',
+                 'nunreported')
+
+    def __init__(self, funcname, exctype):
+        self.funcname = funcname
+        self.exctype = exctype
+        self.count = 0
+        self.first_time = None
+        self.last_time = None
+        self.message = None
+        self.location = None
+        self.data_uids = deque(maxlen=5)
+        self.last_report = None
+        self.nunreported = 0
+
+    def todict(self):
+        return dict(funcname=self.funcname, exctype=self.exctype,
+                    count=self.count, first_time=self.first_time,
+                    last_time=self.last_time, message=self.message,
+                    location=self.location, data_uids=list(self.data_uids))
+
+
+def _location(exc):
+    tb = exc.__traceback__
+    if tb is None:
+        return None
+    while tb.tb_next is not None:
+        tb = tb.tb_next
+    return "{}:{}".format(tb.tb_frame.f_code.co_filename, tb.tb_lineno)
+
+
+def record(funcname, exc, data_uid=None, message=None):
+    ''' Count a failure of funcname with exception exc, reporting it if
+        it was not reported in the last ``log_interval`` seconds.
+
+        Returns the ErrorRecord.
+    '''
+    exctype = type(exc).__name__
+    now = time.time()
+    if message is None:
+        message = str(exc)
+    with _lock:
+        rec = table.get((funcname, exctype))
+        if rec is None:
+            rec = ErrorRecord(funcname, exctype)
+            rec.first_time = now
+            table[(funcname, exctype)] = rec
+        rec.count += 1
+        rec.last_time = now
+        rec.message = message
+        rec.location = _location(exc)
+        if data_uid is not None:
+            rec.data_uids.append(data_uid)
+        report = rec.last_report is None or \
+            now - rec.last_report >= log_interval
+        if report:
+            nunreported = rec.nunreported
+            rec.last_report = now
+            rec.nunreported = 0
+        else:
+            rec.nunreported += 1
+    if report:
+        msg = "StreamDoc error : {} raised {} ({}) at {}, data_uid {}"\
+            .format(funcname, exctype, message, rec.location, data_uid)
+        if nunreported:
+            msg += " ({} similar failures not reported)".format(nunreported)
+        print(msg)
+    return rec
+
+
+def errors():
+    ''' The failures recorded so far, the most frequent first.'''
+    with _lock:
+        records = [rec.todict() for rec in table.values()]
+    records.sort(key=lambda rec: rec['count'], reverse=True)
+    return records
+
+
+def reset():
+    with _lock:
+        table.clear()
+
+
+def format_errors(records=None):
+    ''' Format the output of ``errors()`` into a table string.'''
+    if records is None:
+        records = errors()
+    lines = list()
+    header = "{:<30} {:<20} {:>8}  {}".format("function", "exception",
+                                              "count", "last message")
+    lines.append(header)
+    lines.append("-"*len(header))
+    for rec in records:
+        message = rec['message']
+        if len(message) > 60:
+            message = message[:57] + "..."
+        lines.append("{:<30} {:<20} {:>8}  {}".format(
+            rec['funcname'], rec['exctype'], rec['count'], message))
+    return "\n".join(lines)
+
+
+def is_failed(sdoc):
+    ''' True if sdoc is the output of a failed call.'''
+    statistics = getattr(sdoc, 'statistics', None)
+    return statistics is not None and \
+        statistics.get('status', None) == "Failure"
@@ -0,0 +1,107 @@
+''' Content fingerprints for the arrays in StreamDocs.
+
+    Delayed functions are pure, so dask identifies a call by the tokens of
+    its inputs, and tokenizing a StreamDoc hashes all of its arrays. Images
+    go through many functions, so without help the same image is hashed
+    again at every call.
+
+    Here, the fingerprint of an array is computed once and remembered for as
+    long as the array lives, so every StreamDoc holding it (``select``,
+    ``merge`` etc. share the arrays) reuses it. Arrays read from a source
+    can also be given a provenance token (for ex. the data uid and detector
+    key) and are then never hashed at all.
+
+    The hash is dask's fastest available buffer hash (cityhash, xxhash or
+    murmurhash when installed). For very large frames, a sampled mode hashes
+    a few evenly spaced blocks only (see ``set_sample_size``).
+
+    NOTE : fingerprints assume arrays are not modified in place once they
+    have been through a function, as is the case in the Stream graphs.
+'''
+import weakref
+
+import numpy as np
+from dask.hashing import hash_buffer_hex
+
+from .. import config
+
+
+# if not None, arrays larger than this (bytes) are hashed from samples
+sample_size = config.fingerprint_sample_size
+# the number of blocks a sampled array is hashed from
+NSAMPLES = 16
+
+# id(array) -> (weak reference to the array, fingerprint)
+_memo = dict()
+
+stats = dict(hits=0, hashed=0, sampled=0)
+
+
+def set_sample_size(nbytes):
+    ''' Hash arrays larger than nbytes from samples only. None to always
+        hash the whole array.'''
+    global sample_size
+    sample_size = nbytes
+
+
+def _forget(ref, key):
+    entry = _memo.get(key)
+    if entry is not None and entry[0] is ref:
+        del _memo[key]
+
+
+def _remember(array, token):
+    key = id(array)
+    ref = weakref.ref(array, lambda ref, key=key: _forget(ref, key))
+    _memo[key] = (ref, token)
+
+
+def _lookup(array):
+    entry = _memo.get(id(array))
+    if entry is not None and entry[0]() is array:
+        return entry[1]
+    return None
+
+
+def set_provenance(array, token):
+    ''' Identify array by where it comes from, for ex. (data_uid, key).
+
+        The array is then never hashed.
+    '''
+    _remember(array, ('provenance', token))
+
+
+def _hash(array):
+    data = array
+    if not (data.flags.c_contiguous or data.flags.f_contiguous):
+        data = np.ascontiguousarray(data)
+    buf = data.ravel(order='K').view('i1')
+    if sample_size is not None and buf.nbytes > sample_size:
+        stats['sampled'] += 1
+        step = buf.nbytes // NSAMPLES
+        block = max(sample_size // NSAMPLES, 1)
+        sample = np.concatenate([buf[i*step:i*step + block]
+                                 for i in range(NSAMPLES)])
+        digest = 'sampled-' + hash_buffer_hex(sample)
+    else:
+        digest = hash_buffer_hex(buf)
+    return ('ndarray', digest, array.dtype.str, array.shape)
+
+
+def fingerprint(array):
+    ''' The fingerprint of an ndarray, computed once per array.'''
+    token = _lookup(array)
+    if token is not None:
+        stats['hits'] += 1
+        return token
+    stats['hashed'] += 1
+    token = _hash(array)
+    _remember(array, token)
+    return token
+
+
+def fingerprint_token(val):
+    ''' Replace val by its fingerprint if it is a (non object) ndarray.'''
+    if isinstance(val, np.ndarray) and not val.dtype.hasobject:
+        return fingerprint(val)
+    return val
@@ -0,0 +1,119 @@
+''' Tracking of the futures of submitted work.
+
+    A future must be referenced until it is done (a distributed future that
+    is garbage collected cancels its task), but holding it afterwards keeps
+    its result alive on the worker. A ``FuturesManager`` holds the futures
+    of each frame until they are all done, then releases them, so the memory
+    held is bounded by the work in flight. Failed futures are counted in the
+    error table (see ``errors``) instead of going unnoticed.
+
+    Example
+    -------
+    >>> futures_manager = FuturesManager()
+    >>> sout.map(store_results).map(client.compute)\
+    ...     .sink(futures_manager.add)
+    >>> futures_manager.stats()
+    {'frames': 3, 'pending': 5, 'done': 120, 'errors': 0, 'bytes': 0}
+'''
+import threading
+
+from dask.sizeof import sizeof
+
+from . import errors
+
+
+def _is_future(x):
+    return hasattr(x, 'add_done_callback') and hasattr(x, 'done')
+
+
+class FuturesManager:
+    ''' Hold futures until their frame is done.
+
+        Parameters
+        ----------
+        max_pending : int, optional
+            if not None, ``add`` blocks while this many futures are pending
+    '''
+    def __init__(self, max_pending=None):
+        self.max_pending = max_pending
+        self._cond = threading.Condition()
+        # frame -> [set of pending futures, list of done futures]
+        self._frames = dict()
+        self.npending = 0
+        self.ndone = 0
+        self.nerrors = 0
+        # bytes of the (local) results of done futures still held
+        self.nbytes = 0
+
+    def add(self, future, frame=None):
+        ''' Track a future, part of frame (for ex. a data uid).
+
+            Futures without a frame are released as soon as they are done.
+            Values which are not futures are ignored, so this can be used as
+            a sink on any branch.
+        '''
+        if not _is_future(future):
+            return
+        if frame is None:
+            frame = future
+        with self._cond:
+            if self.max_pending is not None:
+                self._cond.wait_for(
+                    lambda: self.npending < self.max_pending)
+            entry = self._frames.get(frame)
+            if entry is None:
+                entry = self._frames[frame] = [set(), list()]
+            entry[0].add(future)
+            self.npending += 1
+        future.add_done_callback(lambda future: self._done(future, frame))
+
+    def _done(self, future, frame):
+        err = future.exception()
+        if err is None:
+            nbytes = _result_nbytes(future)
+        else:
+            nbytes = 0
+            errors.record("future", err, data_uid=_data_uid(frame))
+        with self._cond:
+            entry = self._frames.get(frame)
+            self.npending -= 1
+            self.ndone += 1
+            if err is not None:
+                self.nerrors += 1
+            if entry is not None:
+                entry[0].discard(future)
+                if entry[0]:
+                    # keep it until the rest of the frame is done
+                    entry[1].append((future, nbytes))
+                    self.nbytes += nbytes
+                else:
+                    # the frame is done, release all its futures
+                    del self._frames[frame]
+                    self.nbytes -= sum(nb for fut, nb in entry[1])
+            self._cond.notify_all()
+
+    def wait(self, timeout=None):
+        ''' Wait until no futures are pending. Returns True if so.'''
+        with self._cond:
+            return self._cond.wait_for(lambda: self.npending == 0,
+                                       timeout=timeout)
+
+    def stats(self):
+        with self._cond:
+            return dict(frames=len(self._frames), pending=self.npending,
+                        done=self.ndone, errors=self.nerrors,
+                        bytes=self.nbytes)
+
+
+def _data_uid(frame):
+    if isinstance(frame, str):
+        return frame
+    return None
+
+
+def _result_nbytes(future):
+    # only the results held in this process are counted, a distributed
+    # future's result is on a worker
+    if type(future).__module__.startswith('concurrent.futures'):
+        return sizeof(future.result())
+    return 0
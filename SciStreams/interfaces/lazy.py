@@ -0,0 +1,108 @@
+''' Lazy array handles for StreamDoc payloads.
+
+    A ``LazyArray`` stands in for an array that has not been read yet. It
+    holds a loader (a callable returning the array) and is only loaded when
+    a function actually needs the data : ``parse_streamdoc`` wrapped
+    functions (``psdm``/``psda``) load the lazy args and kwargs they are
+    called with, and ``np.asarray`` works on them. Moving the handle around
+    (``select``, ``merge``, ``zip``, ``add_attributes``) never loads it, so
+    branches that only use the attributes never read the pixel data.
+
+    By default the array is kept once loaded, so all the branches reading
+    the same image share one read. With ``cache=False`` it is read again
+    from the source each time, so it is not held in memory between uses.
+
+    Example
+    -------
+    >>> img = LazyArray(lambda: np.load("image.npy"), key=("uid", "image"))
+    >>> sdoc = StreamDoc(kwargs=dict(image=img))
+    >>> sdoc.select(('image', None))  # not loaded
+    >>> psdm(np.sum)(sdoc.select(('image', None)))  # loaded here
+'''
+import numpy as np
+
+from .fingerprint import set_provenance
+
+
+class LazyArray:
+    ''' A handle to an array loaded on first use.
+
+        Parameters
+        ----------
+        loader : callable
+            called with no arguments, returns the array
+        key : hashable, optional
+            identifies the data at its source (for ex. (uid, field)), used
+            to tokenize the handle without loading it
+        cache : bool, optional
+            keep the array once loaded
+        shape, dtype : optional
+            the expected shape and dtype, if known without loading
+    '''
+    __slots__ = ('loader', 'key', 'cache', 'shape', 'dtype', '_array',
+                 'nloads')
+
+    def __init__(self, loader, key=None, cache=True, shape=None,
+                 dtype=None):
+        self.loader = loader
+        self.key = key
+        self.cache = cache
+        self.shape = shape
+        self.dtype = dtype
+        self._array = None
+        self.nloads = 0
+
+    @classmethod
+    def from_npy(cls, filename, key=None):
+        ''' A handle to a .npy file, memory mapped (read only) when loaded.
+
+            Only the parts of the file a function reads are then read from
+            disk.
+        '''
+        if key is None:
+            key = filename
+        return cls(lambda: np.load(filename, mmap_mode='r'), key=key)
+
+    @property
+    def loaded(self):
+        return self._array is not None
+
+    def load(self):
+        ''' Return the array, reading it if needed.'''
+        array = self._array
+        if array is None:
+            array = self.loader()
+            self.nloads += 1
+            if self.key is not None and isinstance(array, np.ndarray):
+                # tokenized by its source, like the handle
+                set_provenance(array, self.key)
+            if self.cache:
+                self._array = array
+        return array
+
+    def release(self):
+        ''' Forget the loaded array (it will be read again if needed).'''
+        self._array = None
+
+    def __array__(self, dtype=None, copy=None):
+        array = self.load()
+        if dtype is not None:
+            array = array.astype(dtype, copy=False)
+        return array
+
+    def __reduce__(self):
+        # loaders are often closures over database connections, send the
+        # data instead
+        return (np.asarray, (self.load(),))
+
+    def __repr__(self):
+        state = "loaded" if self.loaded else "not loaded"
+        return "LazyArray(key={}, {})".format(self.key, state)
+
+
+def materialize(val):
+    ''' Load val if it is a LazyArray (or an ArtifactRef), else return it
+        untouched.'''
+    if isinstance(val, LazyArray):
+        return val.load()
+    return val
@@ -0,0 +1,174 @@
+''' A local, executor backed stand in for a distributed Client.
+
+    Without a dask scheduler (``config.client`` not set), ``LocalClient``
+    runs the tasks submitted by the graph (``client.submit``,
+    ``client.compute``) on a local thread or process pool and returns
+    ``concurrent.futures.Future`` objects, so a single machine still runs
+    them in parallel.
+
+    Only the parts of ``distributed.Client`` used in SciStreams are
+    supported : ``submit`` (futures given as arguments are waited for, like
+    in distributed), ``compute``, ``gather`` (of one future or a list) and
+    ``close``.
+
+    The number of tasks submitted but not done is bounded by
+    ``max_pending``: ``submit`` blocks once it is reached, which slows down
+    the source of the graph instead of queuing up work without limit.
+
+    Example
+    -------
+    >>> client = LocalClient(nworkers=4, kind='thread')
+    >>> future = client.submit(np.sum, img)
+    >>> client.gather([future, client.compute(delayed_result)])
+'''
+from concurrent.futures import Future, ThreadPoolExecutor, \
+    ProcessPoolExecutor
+import threading
+
+from dask.base import is_dask_collection
+
+
+def _compute(collection):
+    # the pool already runs tasks in parallel, compute each one serially
+    return collection.compute(scheduler='sync')
+
+
+class LocalClient:
+    ''' Run tasks on a local pool, returning futures.
+
+        Parameters
+        ----------
+        nworkers : int, optional
+            the number of threads or processes
+        kind : {'thread', 'process'}, optional
+            the kind of pool. Functions and arguments must be picklable with
+            a process pool.
+        max_pending : int, optional
+            the maximum number of tasks submitted and not done, None for no
+            limit
+    '''
+    def __init__(self, nworkers=4, kind='thread', max_pending=100):
+        if kind == 'thread':
+            self.executor = ThreadPoolExecutor(nworkers)
+        elif kind == 'process':
+            self.executor = ProcessPoolExecutor(nworkers)
+        else:
+            raise ValueError("Pool kind {} not understood, choose 'thread' "
+                             "or 'process'".format(kind))
+        self.nworkers = nworkers
+        self.kind = kind
+        self.max_pending = max_pending
+        if max_pending is not None:
+            self._slots = threading.BoundedSemaphore(max_pending)
+        else:
+            self._slots = None
+        self._lock = threading.Lock()
+        self.npending = 0
+        self.nsubmitted = 0
+        self.nerrors = 0
+
+    def __repr__(self):
+        return "LocalClient(nworkers={}, kind={}, pending={})".format(
+            self.nworkers, self.kind, self.npending)
+
+    def submit(self, func, *args, **kwargs):
+        ''' Run func(*args, **kwargs) on the pool, returns a Future.
+
+            Futures in args and kwargs are replaced by their results (the
+            task starts once they are done).
+        '''
+        # distributed options, meaningless here
+        kwargs.pop('pure', None)
+        kwargs.pop('key', None)
+        if self._slots is not None:
+            self._slots.acquire()
+        with self._lock:
+            self.npending += 1
+            self.nsubmitted += 1
+
+        deps = [arg for arg in args if isinstance(arg, Future)]
+        deps.extend(val for val in kwargs.values() if isinstance(val, Future))
+        if deps:
+            future = Future()
+            self._when_done(deps, self._start, future, func, args, kwargs)
+        else:
+            future = self.executor.submit(func, *args, **kwargs)
+        future.add_done_callback(self._task_done)
+        return future
+
+    def _when_done(self, deps, callback, *cbargs):
+        remaining = len(deps)
+        lock = threading.Lock()
+
+        def dep_done(dep):
+            nonlocal remaining
+            with lock:
+                remaining -= 1
+                last = remaining == 0
+            if last:
+                callback(*cbargs)
+
+        for dep in deps:
+            dep.add_done_callback(dep_done)
+
+    def _start(self, future, func, args, kwargs):
+        try:
+            args = [_result(arg) for arg in args]
+            kwargs = {key: _result(val) for key, val in kwargs.items()}
+            inner = self.executor.submit(func, *args, **kwargs)
+        except BaseException as err:
+            # a dependency failed, or the pool is shut down
+            future.set_exception(err)
+            return
+        inner.add_done_callback(lambda inner: _chain(inner, future))
+
+    def _task_done(self, future):
+        err = future.exception()
+        with self._lock:
+            self.npending -= 1
+            if err is not None:
+                self.nerrors += 1
+        if err is not None:
+            print("LocalClient : task failed with {} : {}"
+                  .format(type(err).__name__, err))
+        if self._slots is not None:
+            self._slots.release()
+
+    def compute(self, collection):
+        ''' Compute a dask collection (or a list of them) on the pool.
+
+            Returns a Future (or a list of Futures). Anything that is not a
+            dask collection is returned as is, as distributed does.
+        '''
+        if isinstance(collection, (list, tuple)):
+            return [self.compute(elem) for elem in collection]
+        if is_dask_collection(collection):
+            return self.submit(_compute, collection)
+        return collection
+
+    def gather(self, futures):
+        ''' The result of a future, or the results of a list of futures.
+
+            Raises the exception of a failed future. Values which are not
+            futures are returned as is.
+        '''
+        if isinstance(futures, (list, tuple)):
+            return [_result(future) for future in futures]
+        return _result(futures)
+
+    def close(self, wait=True):
+        self.executor.shutdown(wait=wait)
+
+
+def _result(val):
+    if isinstance(val, Future):
+        return val.result()
+    return val
+
+
+def _chain(inner, future):
+    err = inner.exception()
+    if err is not None:
+        future.set_exception(err)
+    else:
+        future.set_result(inner.result())
@@ -1,5 +1,7 @@
 import matplotlib
 matplotlib.use("Agg")  # noqa
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 from ... import config
 import os.path
 
@@ -97,8 +99,10 @@ def store_results(results, **plot_opts):
             xlabel
             ylabel
             title
+
+        A new figure is made for each call, without pyplot (whose current
+        figure is shared by all threads), so calls can run concurrently.
     '''
-    import matplotlib.pyplot as plt
     # TODO : move some of the plotting into a general object
 
     plot_kws = plot_opts.pop('plot_kws', {})
@@ -135,10 +139,8 @@ def store_results(results, **plot_opts):
         time.sleep(1)
     '''
 
-    # grab fig from queue. do some cleanup (if a fig
-    # has not been released for some time, release it)
-    fig = plt.figure(0)  # int(np.random.random()*MAXFIGNUM))
-    fig.clf()
+    fig = Figure()
+    FigureCanvasAgg(fig)
     ax = fig.gca()
     for key in images:
         # find some reasonable color scale
@@ -151,12 +153,13 @@ def store_results(results, **plot_opts):
                 vmax = plot_opts['vmax']
             if image.ndim == 2:
                 if isinstance(image, np.ndarray):
-                    plt.imshow(image, vmin=vmin, vmax=vmax, **plot_kws)
-                    plt.colorbar()
+                    im = ax.imshow(image, vmin=vmin, vmax=vmax, **plot_kws)
+                    fig.colorbar(im, ax=ax)
             elif image.ndim == 3:
                 nimgs = image.shape[0]
                 dim = int(np.ceil(np.sqrt(nimgs)))
-                fig, axes = plt.subplots(dim, dim)
+                fig.clf()
+                axes = fig.subplots(dim, dim)
                 axes = np.array(axes).ravel()
                 for j in range(len(image)):
                     if isinstance(image, np.ndarray):
@@ -179,7 +182,7 @@ def store_results(results, **plot_opts):
             else:
                 x, y = None, None
         if x is not None and y is not None:
-            plt.plot(x, y, **plot_kws)
+            ax.plot(x, y, **plot_kws)
             if xlims is None:
                 xlims = [np.min(x), np.max(x)]
             else:
@@ -192,9 +195,9 @@ def store_results(results, **plot_opts):
                 ylims[1] = np.max([np.max(y), ylims[1]])
 
     if xlims is not None:
-        plt.xlim(xlims[0], xlims[1])
+        ax.set_xlim(xlims[0], xlims[1])
     if ylims is not None:
-        plt.ylim(ylims[0], ylims[1])
+        ax.set_ylim(ylims[0], ylims[1])
 
     # plotting the extra options
     if 'labelsize' in plot_opts:
@@ -209,16 +212,15 @@ def store_results(results, **plot_opts):
 
     if 'xlabel' in plot_opts:
         xlabel = plot_opts['xlabel']
-        plt.xlabel(xlabel, size=labelsize)
+        ax.set_xlabel(xlabel, size=labelsize)
 
     if 'ylabel' in plot_opts:
         ylabel = plot_opts['ylabel']
-        plt.xlabel(xlabel, size=labelsize)
-        plt.ylabel(ylabel, size=labelsize)
+        ax.set_ylabel(ylabel, size=labelsize)
 
     if 'title' in plot_opts:
         title = plot_opts['title']
-        plt.title(title)
+        ax.set_title(title)
 
     if 'scale' in plot_opts:
         try:
@@ -246,8 +248,6 @@ def store_results(results, **plot_opts):
         fig.savefig(outfile)
     except Exception:
         print("Error in fig saving, ignoring... file : {}".format(outfile))
-    # make sure no mem leaks, just close
-    plt.close(fig)
 
 
 def correct_ylimits(ax):
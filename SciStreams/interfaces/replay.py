@@ -0,0 +1,201 @@
+''' Record and replay the input of a pipeline.
+
+    The ``Recorder`` captures each StreamDoc entering a pipeline (attributes,
+    args and kwargs) into a session directory. The ``Replayer`` re-emits a
+    recorded session into a stream, at the original pace, N times faster, or
+    as fast as possible, and reports the throughput and latency. This allows
+    benchmarking changes to a graph offline against real beamline sessions.
+
+    A session directory contains:
+        arrays.bin : the raw bytes of all arrays, back to back
+        index.jsonl : one JSON line per document with its emission time,
+            attributes and args/kwargs. Arrays are stored as references
+            (offset, dtype, shape) into arrays.bin
+
+    On replay, arrays.bin is memory mapped (copy on write) so arrays are only
+    read from disk when a function touches them, and functions that modify
+    their inputs in place do not change the recording.
+
+    Example
+    -------
+    >>> recorder = Recorder("/tmp/session1")
+    >>> s_event.sink(recorder.record)
+    >>> # ... run live ...
+    >>> recorder.close()
+
+    >>> replayer = Replayer("/tmp/session1")
+    >>> result = replayer.run(s_event, speed=None)
+    >>> print(result)
+'''
+import json
+import os
+import time
+
+import numpy as np
+
+from .StreamDoc import StreamDoc
+from .lazy import materialize
+from .stats import LatencyHistogram
+
+
+_ARRAYS_FILENAME = "arrays.bin"
+_INDEX_FILENAME = "index.jsonl"
+
+
+def _encode(val, arrayfile):
+    ''' Encode val to something json serializable, writing arrays to
+        arrayfile.'''
+    val = materialize(val)
+    if isinstance(val, np.ndarray):
+        val = np.ascontiguousarray(val)
+        offset = arrayfile.tell()
+        arrayfile.write(val.tobytes())
+        return {'__ndarray__': [offset, val.dtype.str, list(val.shape)]}
+    if isinstance(val, np.generic):
+        return val.item()
+    if isinstance(val, (list, tuple)):
+        return [_encode(elem, arrayfile) for elem in val]
+    if isinstance(val, dict):
+        return {str(key): _encode(elem, arrayfile)
+                for key, elem in val.items()}
+    if val is None or isinstance(val, (str, int, float, bool)):
+        return val
+    # can't do better than the representation here
+    return repr(val)
+
+
+def _decode(val, arrays):
+    if isinstance(val, dict):
+        if '__ndarray__' in val:
+            offset, dtype, shape = val['__ndarray__']
+            dtype = np.dtype(dtype)
+            count = int(np.prod(shape))
+            if count == 0:
+                return np.zeros(shape, dtype=dtype)
+            nbytes = count * dtype.itemsize
+            return arrays[offset:offset + nbytes].view(dtype).reshape(shape)
+        return {key: _decode(elem, arrays) for key, elem in val.items()}
+    if isinstance(val, list):
+        return [_decode(elem, arrays) for elem in val]
+    return val
+
+
+class Recorder:
+    ''' Record StreamDocs to a session directory.
+
+        Parameters
+        ----------
+        directory : str
+            the session directory (created if it doesn't exist)
+    '''
+    def __init__(self, directory):
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.directory = directory
+        self._arrayfile = open(os.path.join(directory, _ARRAYS_FILENAME),
+                               "ab")
+        self._indexfile = open(os.path.join(directory, _INDEX_FILENAME), "a")
+        self.count = 0
+
+    def record(self, sdoc):
+        ''' Record a StreamDoc. Returns the StreamDoc untouched, so this can
+            be used in a map or a sink.'''
+        entry = dict(time=time.time(),
+                     args=_encode(list(sdoc['args']), self._arrayfile),
+                     kwargs=_encode(sdoc['kwargs'], self._arrayfile),
+                     attributes=_encode(sdoc['attributes'], self._arrayfile))
+        self._indexfile.write(json.dumps(entry) + "\n")
+        # make sure arrays are written before the index refers to them
+        self._arrayfile.flush()
+        self._indexfile.flush()
+        self.count += 1
+        return sdoc
+
+    def close(self):
+        self._arrayfile.close()
+        self._indexfile.close()
+
+
+class Replayer:
+    ''' Replay a session recorded with ``Recorder``.
+
+        Parameters
+        ----------
+        directory : str
+            the session directory
+    '''
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, _INDEX_FILENAME)) as f:
+            self.entries = [json.loads(line) for line in f if line.strip()]
+
+    def __len__(self):
+        return len(self.entries)
+
+    def docs(self):
+        ''' Generator of (recorded time, StreamDoc) pairs.'''
+        # a new copy on write mapping per pass, so changes made to the data
+        # during one replay are not seen by the next
+        arrayfilename = os.path.join(self.directory, _ARRAYS_FILENAME)
+        if os.path.getsize(arrayfilename) > 0:
+            arrays = np.memmap(arrayfilename, dtype=np.uint8, mode='c')
+        else:
+            arrays = None
+        for entry in self.entries:
+            sdoc = StreamDoc(args=_decode(entry['args'], arrays),
+                             kwargs=_decode(entry['kwargs'], arrays),
+                             attributes=_decode(entry['attributes'], arrays))
+            yield entry['time'], sdoc
+
+    def run(self, stream, speed=1., verbose=False):
+        ''' Emit the recorded session into stream.
+
+            Parameters
+            ----------
+            stream : Stream
+                the stream to emit into
+            speed : float or None, optional
+                1 replays at the original pace, N at N times the original
+                pace. None emits as fast as possible.
+            verbose : bool, optional
+                print the result at the end
+
+            Returns
+            -------
+            result : dict
+                nframes : the number of frames emitted
+                elapsed : the total time (s)
+                fps : frames per second
+                latency_p50, latency_p95, latency_p99, latency_max :
+                    end-to-end latency (s) of the frames, i.e. the time for
+                    the emit into the graph to return
+        '''
+        latency = LatencyHistogram()
+        tstart = time.time()
+        trecstart = None
+        nframes = 0
+        for trec, sdoc in self.docs():
+            if trecstart is None:
+                trecstart = trec
+            if speed is not None:
+                delay = (trec - trecstart)/speed - (time.time() - tstart)
+                if delay > 0:
+                    time.sleep(delay)
+            t0 = time.time()
+            stream.emit(sdoc)
+            latency.record(time.time() - t0)
+            nframes += 1
+        elapsed = time.time() - tstart
+        result = dict(nframes=nframes, elapsed=elapsed,
+                      fps=nframes/elapsed if elapsed > 0 else None,
+                      latency_p50=latency.percentile(50),
+                      latency_p95=latency.percentile(95),
+                      latency_p99=latency.percentile(99),
+                      latency_max=latency.max)
+        if verbose:
+            print("Replayed {} frames in {:.3g} s ({} frames/s)"
+                  .format(nframes, elapsed, result['fps']))
+            print("latency p50 : {}, p95 : {}, p99 : {}"
+                  .format(result['latency_p50'], result['latency_p95'],
+                          result['latency_p99']))
+        return result
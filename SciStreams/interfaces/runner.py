@@ -0,0 +1,108 @@
+''' Drive a Stream graph from a single asyncio event loop.
+
+    The time based nodes (``timed_window``, ``delay``, ``rate_limit``,
+    ``buffer``, ``batch``) schedule their work on the stream's tornado
+    ``IOLoop``, which runs on top of asyncio. The ``map_async`` and
+    ``sink_async`` nodes run ``async def`` functions, or blocking functions
+    in a thread pool, on that same loop.
+
+    A ``Runner`` runs that loop and feeds the source of the graph from it, so
+    the synchronous nodes, the timers and the asynchronous nodes are all
+    driven by one loop. Emits are awaited, so a saturated ``map_async`` node
+    slows down the source instead of piling up elements.
+
+    Example
+    -------
+    >>> sin = Stream()
+    >>> sin.map(load).sink_async(save_to_file, concurrency=4)
+    >>> runner = Runner()
+    >>> runner.run(runner.poll(sin, get_new_uids, interval=1.))
+'''
+import asyncio
+
+from tornado import gen
+from tornado.concurrent import is_future
+from tornado.ioloop import IOLoop
+
+from .streams import map_async
+
+
+class Runner:
+    ''' Run a Stream graph on an event loop.
+
+        Parameters
+        ----------
+        loop : IOLoop, optional
+            the loop to run. Defaults to ``IOLoop.current()``, which is also
+            the default loop of the Stream nodes.
+    '''
+    def __init__(self, loop=None):
+        if loop is None:
+            loop = IOLoop.current()
+        self.loop = loop
+        self._stopped = False
+        self.nemitted = 0
+
+    def run(self, coro, timeout=None):
+        ''' Run a coroutine (for ex. ``poll`` or ``feed``) on the loop until
+            it is done, and return its result.'''
+        async def main():
+            return await coro
+        return self.loop.run_sync(main, timeout=timeout)
+
+    def stop(self):
+        ''' Stop ``poll`` and ``feed`` after the current element.'''
+        self._stopped = True
+
+    async def emit(self, stream, x):
+        ''' Emit x into stream, waiting until the asynchronous nodes
+            accepted it.'''
+        result = stream.emit(x)
+        self.nemitted += 1
+        futures = [r for r in result if is_future(r)]
+        if futures:
+            await gen.multi(futures)
+
+    async def feed(self, stream, elements, join=True):
+        ''' Emit all the elements of an iterable into stream.
+
+            If join is True, wait for the asynchronous nodes downstream to be
+            done before returning.
+        '''
+        for x in elements:
+            if self._stopped:
+                break
+            await self.emit(stream, x)
+        if join:
+            await self.join(stream)
+
+    async def poll(self, stream, func, interval=1.):
+        ''' Repeatedly call func() and emit the elements it returns into
+            stream, until ``stop`` is called.
+
+            func is a blocking function (for ex. a database query), run in a
+            thread of the loop. When it returns nothing, wait interval
+            seconds before calling it again.
+        '''
+        asyncio_loop = self.loop.asyncio_loop
+        while not self._stopped:
+            elements = await asyncio_loop.run_in_executor(None, func)
+            if not elements:
+                await asyncio.sleep(interval)
+                continue
+            for x in elements:
+                if self._stopped:
+                    break
+                await self.emit(stream, x)
+
+    async def join(self, stream):
+        ''' Wait until the asynchronous nodes downstream of stream are done
+            with the elements they received.'''
+        # NOTE : loop since finishing a node may feed a later node
+        while True:
+            nodes = [node for node in stream.downstream()
+                     if isinstance(node, map_async) and node._tasks]
+            if not nodes:
+                return
+            for node in nodes:
+                await node.join()
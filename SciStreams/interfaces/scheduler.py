@@ -0,0 +1,248 @@
+''' Priority aware scheduling of Stream branches.
+
+    By default a Stream graph runs depth first in the order the branches
+    were defined, so a slow plotting sink delays every branch defined after
+    it. A ``schedule`` node (see ``Stream.schedule``) instead hands the
+    element to a ``Scheduler``, which runs everything downstream of the node
+    on a shared pool of worker threads, highest priority first.
+
+    Low priority work is thus deferred until more important work is done,
+    and can be coalesced : if a newer element arrives on a coalescing branch
+    before the previous one started, only the newest one is run.
+
+    Only one element per schedule node runs at a time, and elements of a
+    node run in order, so stateful nodes downstream (accumulate, zip, etc)
+    are safe.
+
+    The elements waiting on a node which doesn't coalesce are bounded by
+    ``max_queued`` : once reached, the node blocks its source until the
+    workers catch up, instead of queuing elements without limit.
+
+    Example
+    -------
+    >>> scheduler = Scheduler(nworkers=4)
+    >>> sout.schedule(scheduler, 'file').map(save_to_file)
+    >>> sout.schedule(scheduler, 'plot', coalesce=True).map(plot)
+'''
+import heapq
+import itertools
+import threading
+
+
+# lower numbers run first
+PRIORITIES = {
+    'reduction': 0,
+    'file': 10,
+    'plot': 20,
+    'ml': 30,
+}
+
+
+def get_priority(priority):
+    ''' Get the numerical priority from a name or number.'''
+    if isinstance(priority, str):
+        if priority not in PRIORITIES:
+            raise ValueError("Priority {} not understood. Choose a number "
+                             "or one of {}".format(priority,
+                                                   list(PRIORITIES.keys())))
+        priority = PRIORITIES[priority]
+    return priority
+
+
+class Scheduler:
+    ''' Run tasks on a pool of worker threads by priority.
+
+        Parameters
+        ----------
+        nworkers : int, optional
+            the number of worker threads. If 0, no threads are started and
+            tasks only run when ``run_pending`` is called.
+        backlog : int, optional
+            the number of pending tasks above which the scheduler reports
+            being backlogged (so it can also be used with ``Stream.shed``)
+        max_queued : int, optional
+            the maximum number of pending tasks of a group. ``submit`` blocks
+            while the group is full (except when called from a worker
+            thread, or with no workers, as nothing could free the group).
+            None for no limit.
+    '''
+    def __init__(self, nworkers=2, backlog=100, max_queued=None):
+        self.nworkers = nworkers
+        self.backlog = backlog
+        self.max_queued = max_queued
+        self._heap = list()
+        self._counter = itertools.count()
+        # the pending task of each coalescing key
+        self._coalesce = dict()
+        # the number of pending tasks of each group
+        self._queued = dict()
+        # the groups with a task running
+        self._running = set()
+        self._nrunning = 0
+        self._cond = threading.Condition()
+        self._stopped = False
+
+        self.nsubmitted = 0
+        self.ndone = 0
+        self.ncoalesced = 0
+        self.nerrors = 0
+        self.nblocked = 0
+
+        self._threads = list()
+        for i in range(nworkers):
+            thread = threading.Thread(target=self._worker, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, func, x, priority=0, group=None, coalesce=False):
+        ''' Submit func(x) to be run.
+
+            Parameters
+            ----------
+            func : callable
+            x : the argument
+            priority : int or str, optional
+                the priority, lower runs first. See ``PRIORITIES`` for names
+            group : hashable, optional
+                tasks of the same group never run concurrently and run in
+                submission order
+            coalesce : bool, optional
+                if True, replace a pending (not started) task of the same
+                group with this one
+        '''
+        priority = get_priority(priority)
+        with self._cond:
+            if coalesce and group is not None and group in self._coalesce:
+                # replace the argument of the pending task in place
+                self._coalesce[group][3] = (func, x)
+                self.ncoalesced += 1
+                return
+            if self._must_wait(group):
+                self.nblocked += 1
+                self._cond.wait_for(lambda: not self._must_wait(group))
+            task = [priority, next(self._counter), group, (func, x)]
+            if coalesce and group is not None:
+                self._coalesce[group] = task
+            heapq.heappush(self._heap, task)
+            if group is not None:
+                self._queued[group] = self._queued.get(group, 0) + 1
+            self.nsubmitted += 1
+            self._cond.notify_all()
+
+    def _must_wait(self, group):
+        ''' True if a task of group can't be queued now.
+
+            Must be called with the lock held.
+        '''
+        if self.max_queued is None or group is None or self.nworkers == 0 \
+                or self._stopped:
+            return False
+        if threading.current_thread() in self._threads:
+            return False
+        return self._queued.get(group, 0) >= self.max_queued
+
+    def _pop(self):
+        ''' Pop the highest priority task whose group is not running.
+
+            Must be called with the lock held. Returns None if none found.
+        '''
+        skipped = list()
+        task = None
+        while self._heap:
+            candidate = heapq.heappop(self._heap)
+            if candidate[2] is not None and candidate[2] in self._running:
+                skipped.append(candidate)
+            else:
+                task = candidate
+                break
+        for candidate in skipped:
+            heapq.heappush(self._heap, candidate)
+        if task is not None:
+            self._nrunning += 1
+            group = task[2]
+            if self._coalesce.get(group) is task:
+                del self._coalesce[group]
+            if group is not None:
+                self._running.add(group)
+                self._queued[group] -= 1
+                if not self._queued[group]:
+                    del self._queued[group]
+                # wake up the sources waiting on this group
+                self._cond.notify_all()
+        return task
+
+    def _run_task(self, task):
+        group = task[2]
+        func, x = task[3]
+        try:
+            func(x)
+        except Exception as e:
+            self.nerrors += 1
+            print("Scheduler : error in task {} : {}".format(func, e))
+        finally:
+            with self._cond:
+                self._running.discard(group)
+                self._nrunning -= 1
+                self.ndone += 1
+                self._cond.notify_all()
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                task = None
+                while not self._stopped:
+                    task = self._pop()
+                    if task is not None:
+                        break
+                    self._cond.wait()
+                if self._stopped:
+                    return
+            self._run_task(task)
+
+    def run_pending(self):
+        ''' Run all pending tasks in the calling thread.
+
+            Useful when nworkers is 0, for ex. to run low priority work
+            between frames.
+        '''
+        while True:
+            with self._cond:
+                task = self._pop()
+            if task is None:
+                return
+            self._run_task(task)
+
+    def join(self, timeout=None):
+        ''' Wait for all submitted tasks to be done.
+
+            Returns False on timeout.
+        '''
+        if self.nworkers == 0:
+            self.run_pending()
+        with self._cond:
+            return self._cond.wait_for(
+                lambda: not self._heap and self._nrunning == 0, timeout)
+
+    def stop(self):
+        ''' Stop the workers. Pending tasks are not run.'''
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+
+    @property
+    def pending(self):
+        return len(self._heap)
+
+    def backlogged(self):
+        return len(self._heap) >= self.backlog
+
+    def metrics(self):
+        ''' Return a dictionary of the scheduler metrics.'''
+        with self._cond:
+            pending = dict()
+            for task in self._heap:
+                pending[task[0]] = pending.get(task[0], 0) + 1
+        return dict(pending=len(self._heap), pending_by_priority=pending,
+                    running=self._nrunning, nsubmitted=self.nsubmitted,
+                    ndone=self.ndone, ncoalesced=self.ncoalesced,
+                    nblocked=self.nblocked, nerrors=self.nerrors)
@@ -0,0 +1,260 @@
+''' Opt-in instrumentation for Stream graphs.
+
+    Instrumentation is enabled per node (or for a whole graph) with
+    ``Stream.instrument()``. Each instrumented node keeps a ``NodeStats``
+    object which records:
+        - call counts in/out
+        - in/out rates
+        - a latency histogram of the time spent in the node itself
+            (time from receiving an element to emitting it downstream)
+        - bytes of ndarray payload passing in/out of the node
+
+    Example
+    -------
+    >>> sin = Stream()
+    >>> sout = sin.map(f).map(g)
+    >>> sin.instrument()
+    >>> for x in data:
+    ...     sin.emit(x)
+    >>> print(format_stats(sin.stats()))
+'''
+import threading
+import time
+
+import numpy as np
+
+
+class LatencyHistogram:
+    ''' A log-linear (HDR style) histogram of latencies.
+
+        Values are binned into powers of two, each power subdivided into
+        ``2**(sub_bucket_bits-1)`` linear buckets. Memory is constant and
+        the relative error of a percentile is at most
+        ``1/2**(sub_bucket_bits-1)`` (~3% for the default).
+
+        Parameters
+        ----------
+        sub_bucket_bits : int, optional
+            the number of bits of precision kept per power of two
+        max_exponent : int, optional
+            the largest power of two (in ticks) that can be recorded.
+            Larger values are clamped to the top bucket.
+        tick : float, optional
+            the resolution of the histogram in seconds (default 1 us)
+    '''
+    def __init__(self, sub_bucket_bits=6, max_exponent=40, tick=1e-6):
+        self.sub_bucket_bits = sub_bucket_bits
+        self.sub_bucket_count = 1 << sub_bucket_bits
+        self.half_count = self.sub_bucket_count >> 1
+        self.tick = tick
+        nbuckets = (max_exponent - sub_bucket_bits + 2) * self.half_count
+        self.counts = [0] * nbuckets
+        self.reset()
+
+    def reset(self):
+        for i in range(len(self.counts)):
+            self.counts[i] = 0
+        self.total = 0
+        self.sum = 0.
+        self.min = None
+        self.max = None
+
+    def _index(self, ticks):
+        if ticks < self.sub_bucket_count:
+            return ticks
+        exponent = ticks.bit_length() - self.sub_bucket_bits
+        index = exponent * self.half_count + (ticks >> exponent)
+        return min(index, len(self.counts) - 1)
+
+    def _value(self, index):
+        ''' the (lower, upper) range in ticks for the bucket.'''
+        if index < self.sub_bucket_count:
+            return index, index + 1
+        exponent = index // self.half_count - 1
+        mantissa = index - exponent * self.half_count
+        return mantissa << exponent, (mantissa + 1) << exponent
+
+    def record(self, value):
+        ''' record a latency (in seconds).'''
+        if value < 0:
+            value = 0.
+        self.counts[self._index(int(value / self.tick))] += 1
+        self.total += 1
+        self.sum += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def percentile(self, q):
+        ''' Get the q-th percentile (q from 0 to 100) in seconds.
+
+            Returns None if nothing was recorded.
+        '''
+        if self.total == 0:
+            return None
+        target = q / 100. * self.total
+        cumul = 0
+        for index, count in enumerate(self.counts):
+            cumul += count
+            if count and cumul >= target:
+                lower, upper = self._value(index)
+                value = (lower + upper) * .5 * self.tick
+                # midpoint of bucket can fall outside the observed range
+                return min(max(value, self.min), self.max)
+        return self.max
+
+    @property
+    def mean(self):
+        if self.total == 0:
+            return None
+        return self.sum / self.total
+
+
+def payload_nbytes(x, depth=2):
+    ''' Return the number of bytes of ndarray payload in x.
+
+        Understands arrays, StreamDocs (args and kwargs only, attributes are
+        ignored) and tuples/lists/dicts of these (up to ``depth`` levels).
+    '''
+    if isinstance(x, np.ndarray):
+        return x.nbytes
+    if depth <= 0:
+        return 0
+    if _is_streamdoc(x):
+        return payload_nbytes(x['args'], depth) + \
+            payload_nbytes(x['kwargs'], depth)
+    if isinstance(x, (tuple, list)):
+        return sum(payload_nbytes(elem, depth-1) for elem in x)
+    if isinstance(x, dict):
+        return sum(payload_nbytes(elem, depth-1) for elem in x.values())
+    return 0
+
+
+def _is_streamdoc(x):
+    # NOTE : avoid importing StreamDoc here (streams should not depend on it)
+    # look on the type, as some objects (dask Delayed) make up attributes
+    return getattr(type(x), '_StreamDoc', None) is not None
+
+
+class NodeStats:
+    ''' Statistics for one Stream node.
+
+        The Stream calls ``start`` before updating the node, ``emitted``
+        every time the node emits, and ``stop`` once the update returns.
+        Latency is the time from ``start`` to the first emit (or to ``stop``
+        if the node did not emit, for ex. a filter), so it excludes the time
+        spent downstream.
+    '''
+    def __init__(self):
+        self.latency = LatencyHistogram()
+        self._tstart = None
+        self.reset()
+
+    def reset(self):
+        self.latency.reset()
+        self.count_in = 0
+        self.count_out = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.time_first = None
+        self.time_last = None
+        self._tstart = None
+
+    def start(self, x):
+        now = time.time()
+        if self.time_first is None:
+            self.time_first = now
+        self.count_in += 1
+        self.bytes_in += payload_nbytes(x)
+        self._tstart = now
+
+    def emitted(self, x):
+        now = time.time()
+        if self._tstart is not None:
+            self.latency.record(now - self._tstart)
+            self._tstart = None
+        self.count_out += 1
+        self.bytes_out += payload_nbytes(x)
+        self.time_last = now
+
+    def stop(self):
+        now = time.time()
+        if self._tstart is not None:
+            self.latency.record(now - self._tstart)
+            self._tstart = None
+        self.time_last = now
+
+    def summary(self):
+        ''' Return a dictionary summary of the statistics.'''
+        if self.time_first is not None and self.time_last is not None:
+            elapsed = self.time_last - self.time_first
+        else:
+            elapsed = 0.
+        if elapsed > 0:
+            rate_in = self.count_in / elapsed
+            rate_out = self.count_out / elapsed
+        else:
+            rate_in = rate_out = None
+        return dict(count_in=self.count_in, count_out=self.count_out,
+                    rate_in=rate_in, rate_out=rate_out,
+                    bytes_in=self.bytes_in, bytes_out=self.bytes_out,
+                    latency_mean=self.latency.mean,
+                    latency_p50=self.latency.percentile(50),
+                    latency_p95=self.latency.percentile(95),
+                    latency_p99=self.latency.percentile(99),
+                    latency_max=self.latency.max)
+
+
+def _fmt(val, scale=1., fmt="{:.3g}"):
+    if val is None:
+        return "-"
+    return fmt.format(val*scale)
+
+
+def format_stats(stats):
+    ''' Format the output of ``Stream.stats()`` into a table string.'''
+    lines = list()
+    header = "{:<50} {:>8} {:>8} {:>9} {:>9} {:>9} {:>10}".format(
+        "node", "in", "out", "p50(ms)", "p95(ms)", "p99(ms)", "MB out")
+    lines.append(header)
+    lines.append("-"*len(header))
+    for stat in stats:
+        name = stat['node']
+        if len(name) > 50:
+            name = name[:47] + "..."
+        lines.append("{:<50} {:>8} {:>8} {:>9} {:>9} {:>9} {:>10}".format(
+            name, stat['count_in'], stat['count_out'],
+            _fmt(stat['latency_p50'], 1e3), _fmt(stat['latency_p95'], 1e3),
+            _fmt(stat['latency_p99'], 1e3),
+            _fmt(stat['bytes_out'], 1e-6)))
+    return "\n".join(lines)
+
+
+class StatsLogger:
+    ''' Periodically print the statistics of an instrumented graph.
+
+        Runs in a daemon thread so it works whether or not an event loop is
+        running. Use ``stop()`` to end it.
+
+        Parameters
+        ----------
+        stream : Stream
+            the (source) node of the graph to report on
+        interval : float, optional
+            time between reports in seconds
+    '''
+    def __init__(self, stream, interval=60.):
+        self.stream = stream
+        self.interval = interval
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            print("Stream statistics ({})".format(time.ctime()))
+            print(format_stats(self.stream.stats()))
+
+    def stop(self):
+        self._stopped.set()
@@ -29,16 +29,26 @@
 
 from __future__ import absolute_import, division, print_function
 
+import asyncio
+import functools
+import inspect
+import threading
+import types
 from collections import deque
 from time import time
 
+import numpy as np
 import toolz
 from tornado import gen
+from tornado.concurrent import is_future
 from tornado.locks import Condition
 from tornado.ioloop import IOLoop
 from tornado.queues import Queue
 from collections import Iterable
 
+from .stats import _is_streamdoc, payload_nbytes
+from . import errors
+
 no_default = '--no-default--'
 
 
@@ -78,7 +88,18 @@ class Stream(object):
     >>> L  # and the actions happen at the sinks
     ['1', '2', '3', '4', '5']
     """
-    str_list = ['func', 'predicate', 'n', 'interval']
+    str_list = ['func', 'predicate', 'n', 'interval', 'priority']
+
+    # instrumentation, see ``Stream.instrument`` and ``Stream.trace``
+    _stats = None
+    _tracer = None
+
+    # demand, see ``Stream.prune``
+    _dormant = False
+    _connectors = ()
+
+    # nodes holding state define get_state/set_state, see ``Stream.checkpoint``
+    stateful = False
 
     def __init__(self, child=None, children=None, name=None, **kwargs):
         self.parents = []
@@ -93,6 +114,15 @@ class Stream(object):
                 child.parents.append(self)
         self.name = name
 
+        # attaching to a pruned graph
+        if any(child._dormant for child in self.children if child):
+            if self._creates_demand():
+                for child in self.children:
+                    if child:
+                        child._wake()
+            else:
+                self._dormant = True
+
     def __str__(self):
         s_list = []
         if self.name:
@@ -124,9 +154,16 @@ class Stream(object):
         This is typically done only at source Streams but can theortically be
         done at any point
         """
+        if self._stats is not None:
+            self._stats.emitted(x)
         result = []
         for parent in self.parents:
-            r = parent.update(x, who=self)
+            if parent._dormant:
+                continue
+            if parent._stats is None and parent._tracer is None:
+                r = parent.update(x, who=self)
+            else:
+                r = parent._instrumented_update(x, who=self)
             if type(r) is list:
                 result.extend(r)
             else:
@@ -136,6 +173,27 @@ class Stream(object):
     def update(self, x, who=None):
         self.emit(x)
 
+    def _instrumented_update(self, x, who=None):
+        ''' update, recording statistics and/or a trace span.'''
+        stats = self._stats
+        tracer = self._tracer
+        if tracer is not None:
+            from .tracing import get_data_uid
+            data_uid = get_data_uid(x)
+            if not tracer.sampled(data_uid):
+                tracer = None
+        if stats is not None:
+            stats.start(x)
+        if tracer is not None:
+            start = time()
+        try:
+            return self.update(x, who=who)
+        finally:
+            if tracer is not None:
+                tracer.record(self, data_uid, start, time())
+            if stats is not None:
+                stats.stop()
+
     def connect(self, parent):
         ''' Connect another child to stream.
             Note that parents go downstream and children go upstream.
@@ -150,6 +208,171 @@ class Stream(object):
         else:
             parent.children.append(self)
 
+        if self._dormant and not parent._dormant:
+            self._wake()
+
+    def downstream(self):
+        ''' Return a list of this node and all nodes downstream from it.
+
+            Nodes are returned in breadth first order, each only once.
+            Note that streams connected by emitting from a function (for ex.
+            ``s.map(sin.emit)``) are separate graphs and not included.
+        '''
+        nodes = [self]
+        seen = {id(self)}
+        i = 0
+        while i < len(nodes):
+            for parent in nodes[i].parents:
+                if parent is not None and id(parent) not in seen:
+                    seen.add(id(parent))
+                    nodes.append(parent)
+            i += 1
+        return nodes
+
+    def _connector_target(self):
+        ''' If this node emits into another graph (for ex.
+            ``s.map(sin.emit)``), return the source node of that graph.'''
+        func = getattr(self, 'func', None)
+        target = getattr(func, '__self__', None)
+        if isinstance(target, Stream) and \
+                getattr(func, '__name__', None) == 'emit':
+            return target
+        return None
+
+    def _creates_demand(self):
+        ''' True if this node needs data whether or not anything is
+            connected downstream.'''
+        target = self._connector_target()
+        if target is not None:
+            return not target._dormant
+        return isinstance(self, (Sink, sink_async))
+
+    def _wake(self):
+        ''' Re-enable this node and everything upstream of it.'''
+        if not self._dormant:
+            return
+        self._dormant = False
+        for child in self.children:
+            if child is not None:
+                child._wake()
+        for connector in self._connectors:
+            connector._wake()
+
+    def prune(self):
+        ''' Mark the nodes with no live sink downstream as dormant.
+
+            Dormant nodes are skipped when data is emitted, saving the cost
+            of branches whose results are never used.
+
+            A node is live if:
+                - it is a ``Sink`` (see ``Stream.sink``)
+                - it emits into another graph (``s.map(sin.emit)``) which
+                  is live
+                - any node downstream of it is live
+
+            Note that a map at the end of a branch is *not* a sink. Use
+            ``sink`` for functions called for their side effects
+            (saving files etc).
+
+            Attaching a sink to a dormant node later re-enables it and
+            everything upstream.
+
+            Returns
+            -------
+            dormant : list
+                the dormant nodes
+        '''
+        memo = dict()
+        _mark_live(self, memo)
+        dormant = list()
+        seen = set()
+        for node, live in memo.values():
+            if not live and id(node) not in seen:
+                seen.add(id(node))
+                dormant.append(node)
+        return dormant
+
+    def checkpoint(self, checkpointer, name):
+        ''' Register this (stateful) node with a Checkpointer, so its
+            state is saved periodically and restored on startup.
+
+            See ``SciStreams.interfaces.checkpoint``.
+        '''
+        checkpointer.register(name, self)
+        return self
+
+    def instrument(self, enable=True, recursive=True):
+        ''' Turn on (or off) instrumentation for this node.
+
+            Instrumented nodes record call counts, in/out rates, latency
+            percentiles and bytes of ndarray payload. See
+            ``SciStreams.interfaces.stats`` for details.
+
+            Parameters
+            ----------
+            enable : bool, optional
+                turn instrumentation on or off
+            recursive : bool, optional
+                also instrument all nodes downstream of this one
+        '''
+        from .stats import NodeStats
+        nodes = self.downstream() if recursive else [self]
+        for node in nodes:
+            if enable:
+                if node._stats is None:
+                    node._stats = NodeStats()
+            else:
+                node._stats = None
+        return self
+
+    def stats(self):
+        ''' Return a list of statistics of instrumented nodes downstream
+            of (and including) this node.
+
+            Each element is a dictionary with a 'node' entry (the string
+            representation of the node) and the entries of
+            ``NodeStats.summary``.
+        '''
+        result = list()
+        for node in self.downstream():
+            if node._stats is not None:
+                stat = dict(node=str(node))
+                stat.update(node._stats.summary())
+                result.append(stat)
+        return result
+
+    def trace(self, tracer=None, recursive=True, **kwargs):
+        ''' Record a span for every execution of this node.
+
+            Parameters
+            ----------
+            tracer : Tracer or None, optional
+                the tracer to record to. If None, a new one is created with
+                the remaining keyword arguments (size=, sample=).
+                If False, tracing is turned off.
+            recursive : bool, optional
+                also trace all nodes downstream of this one
+
+            Returns
+            -------
+            tracer : the Tracer, see ``SciStreams.interfaces.tracing``
+        '''
+        if tracer is None:
+            from .tracing import Tracer
+            tracer = Tracer(**kwargs)
+        nodes = self.downstream() if recursive else [self]
+        for node in nodes:
+            node._tracer = tracer if tracer is not False else None
+        return tracer
+
+    def log_stats(self, interval=60.):
+        ''' Periodically print the statistics of this graph.
+
+            Returns a ``StatsLogger``, call its ``stop`` method to end logging.
+        '''
+        from .stats import StatsLogger
+        return StatsLogger(self, interval=interval)
+
     @property
     def child(self):
         if len(self.children) != 1:
@@ -246,6 +469,130 @@ class Stream(object):
         """
         return sliding_window(n, self)
 
+    def partition_array(self, n, copy=True):
+        """ Partition a stream of arrays into stacks of n arrays
+
+        Frames are written into a preallocated ``(n, ...)`` buffer as they
+        arrive, so each batch is one contiguous array built without any
+        per-batch allocation (unlike ``partition`` followed by a stack).
+
+        Elements can be numpy arrays or StreamDocs. For StreamDocs, array
+        args and kwargs are stacked, other values are collected in lists and
+        the attributes are merged (like ``squash``).
+
+        Parameters
+        ----------
+        n : int
+            the number of frames per batch
+        copy : bool, optional
+            if True, emit a copy of the buffer (one copy per batch). If False,
+            emit a read only view of the buffer. It is only valid until the
+            next batch starts being written, so downstream nodes must not
+            keep it around.
+
+        Examples
+        --------
+        >>> source = Stream()
+        >>> source.partition_array(2).sink(print)
+        >>> for i in range(4):
+        ...     source.emit(np.ones(2)*i)
+        [[0. 0.]
+         [1. 1.]]
+        [[2. 2.]
+         [3. 3.]]
+        """
+        return partition_array(n, self, copy=copy)
+
+    def sliding_window_array(self, n, copy=True):
+        """ Produce overlapping stacks of the last n arrays
+
+        Like ``partition_array`` but emits a stack for every new frame once n
+        frames were received. Frames are written twice in a ring buffer of
+        ``2n`` frames, so the last n frames are always a contiguous view.
+
+        Parameters
+        ----------
+        n : int
+            the window size
+        copy : bool, optional
+            if False, emit a read only view of the ring buffer instead of a
+            copy. It is only valid until the next frame arrives.
+
+        See Also
+        --------
+        Stream.partition_array
+        """
+        return sliding_window_array(n, self, copy=copy)
+
+    def shed(self, monitor, policy='drop', n=2):
+        """ Shed load on this branch when the pipeline is backlogged
+
+        While ``monitor.backlogged()`` is True, elements are dropped
+        according to the policy. Otherwise everything passes through.
+
+        Parameters
+        ----------
+        monitor : object with a ``backlogged`` method
+            for example an ``IngestQueue``
+            (see SciStreams.interfaces.backpressure)
+        policy : str, optional
+            'drop' : drop all elements while backlogged
+            'decimate' : only let one in n elements through while
+                backlogged
+            'keep' : never drop (useful to switch policies from config)
+        n : int, optional
+            the decimation factor
+        """
+        return shed(self, monitor, policy=policy, n=n)
+
+    def schedule(self, scheduler, priority=0, coalesce=False):
+        """ Run everything downstream of this point on a Scheduler
+
+        Elements are handed to the scheduler which emits them from its
+        worker threads, highest priority first. See
+        ``SciStreams.interfaces.scheduler``.
+
+        Parameters
+        ----------
+        scheduler : Scheduler
+        priority : int or str, optional
+            lower numbers run first. Names are 'reduction', 'file', 'plot'
+            and 'ml'
+        coalesce : bool, optional
+            if True, a new element replaces the previous one if it has not
+            started running yet (only the latest element matters)
+        """
+        return schedule(self, scheduler, priority=priority,
+                        coalesce=coalesce)
+
+    def batch(self, max_items=None, max_bytes=None, max_latency=None,
+              loop=None):
+        """ Collect elements into tuples, flushing on the first limit hit
+
+        A batch is emitted as soon as it holds ``max_items`` elements, or
+        ``max_bytes`` bytes of array payload, or when its oldest element
+        has waited ``max_latency`` seconds. The latency limit is driven by
+        the stream's event loop, which therefore needs to be running
+        (otherwise it is only checked when a new element arrives).
+
+        Parameters
+        ----------
+        max_items : int, optional
+        max_bytes : int, optional
+            counted with ``stats.payload_nbytes``
+        max_latency : float, optional
+            in seconds
+        loop : IOLoop, optional
+            the loop running the latency timer
+
+        Examples
+        --------
+        >>> source = Stream()
+        >>> source.batch(max_items=100, max_latency=60.).map(squash)
+        """
+        return batch(self, max_items=max_items, max_bytes=max_bytes,
+                     max_latency=max_latency, loop=loop)
+
     def rate_limit(self, interval):
         """ Limit the flow of data
 
@@ -375,7 +722,7 @@ class Stream(object):
         """ Combine two streams together into a stream of tuples """
         return zip(self, *other)
 
-    def sink(self, func):
+    def sink(self, func, *args, **kwargs):
         """ Apply a function on every element
 
         Examples
@@ -395,7 +742,43 @@ class Stream(object):
         --------
         Stream.sink_to_list
         """
-        return Sink(func, self)
+        return Sink(func, self, args=args, **kwargs)
+
+    def map_async(self, func, *args, concurrency=1, **kwargs):
+        """ Apply a function on the stream's event loop
+
+        ``func`` can be an ``async def`` function, which is awaited, or a
+        regular (blocking) function, which runs in the loop's default thread
+        pool. At most ``concurrency`` calls of this node run at once, later
+        elements wait for a slot. Results are emitted in completion order.
+
+        The future returned by ``emit`` resolves once the element got a
+        slot, so sources awaiting it (see ``runner.Runner``) slow down when
+        the node is saturated. Errors are printed and counted in
+        ``nerrors``, since there is no caller to raise them to.
+
+        Examples
+        --------
+        >>> async def fetch(uid):
+        ...     ...
+        >>> source.map_async(fetch, concurrency=4).sink(print)
+        """
+        return map_async(func, self, args=args, concurrency=concurrency,
+                         **kwargs)
+
+    def sink_async(self, func, *args, concurrency=1, **kwargs):
+        """ Like ``sink``, but the function runs like in ``map_async``
+
+        Useful for blocking I/O (file writers, database inserts) so that
+        several elements are written concurrently without blocking the
+        graph.
+
+        Examples
+        --------
+        >>> sout.sink_async(store_results_xml, concurrency=2)
+        """
+        return sink_async(func, self, args=args, concurrency=concurrency,
+                          **kwargs)
 
     def sink_to_list(self):
         """ Append all elements of a stream to a list as they come in
@@ -421,14 +804,39 @@ class Stream(object):
         return self.scan(update_frequencies, start={})
 
 
+def _mark_live(node, memo):
+    ''' Recursively compute if node is live (see ``Stream.prune``),
+        updating the node's dormant state. memo holds (node, live) by id.'''
+    key = id(node)
+    if key in memo:
+        return memo[key][1]
+    # in case of a loop, be conservative
+    memo[key] = node, True
+    target = node._connector_target()
+    if target is not None:
+        live = _mark_live(target, memo)
+        if node not in target._connectors:
+            target._connectors = tuple(target._connectors) + (node,)
+    else:
+        # NOTE : evaluate all parents so they are all marked
+        parents_live = [_mark_live(parent, memo) for parent in node.parents
+                        if parent is not None]
+        live = isinstance(node, (Sink, sink_async)) or any(parents_live)
+    memo[key] = node, live
+    node._dormant = not live
+    return live
+
+
 class Sink(Stream):
-    def __init__(self, func, child):
+    def __init__(self, func, child, args=(), **kwargs):
         self.func = func
+        self.args = args
+        self.kwargs = kwargs
 
         Stream.__init__(self, child)
 
     def update(self, x, who=None):
-        result = self.func(x)
+        result = self.func(x, *self.args, **self.kwargs)
         if type(result) is gen.Future:
             return result
         else:
@@ -437,6 +845,15 @@ class Sink(Stream):
 
 class map(Stream):
     def __init__(self, func, child, args=(), **kwargs):
+        # functions can prepare their arguments once, when the graph is built
+        # (for ex. StreamDoc.select compiles its mapping). Only plain
+        # functions are looked at : other callables such as dask Delayed
+        # objects answer any attribute lookup
+        precompile = None
+        if isinstance(func, types.FunctionType):
+            precompile = getattr(func, 'precompile', None)
+        if precompile is not None:
+            func, args, kwargs = precompile(*args, **kwargs), (), {}
         self.func = func
         self.kwargs = kwargs
         self.args = args
@@ -445,9 +862,94 @@ class map(Stream):
 
     def update(self, x, who=None):
         result = self.func(x, *self.args, **self.kwargs)
+        if errors.skip_failed and errors.is_failed(result):
+            # the output of a failed call stops here (see ``errors``)
+            return []
+
+        if self._connector_target() is not None:
+            # emitting into another graph (s.map(sin.emit)) : pass the
+            # futures of its asynchronous nodes back, so the caller waits
+            # for them like for the ones of this graph
+            return [r for r in result if is_future(r)] + self.emit(result)
+        return self.emit(result)
+
+
+class map_async(Stream):
+    def __init__(self, func, child, args=(), concurrency=1, **kwargs):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.concurrency = concurrency
+        self.ninflight = 0
+        self.nerrors = 0
+        # created on the loop, when first needed
+        self._semaphore = None
+        self._tasks = set()
 
+        Stream.__init__(self, child)
+
+    def update(self, x, who=None):
+        asyncio_loop = self.loop.asyncio_loop
+        try:
+            running = asyncio.get_running_loop() is asyncio_loop
+        except RuntimeError:
+            running = False
+        if running:
+            return self._track(self._enter(x))
+        # called from another thread, nothing to wait on for the caller
+        asyncio.run_coroutine_threadsafe(self._track_and_enter(x),
+                                         asyncio_loop)
+        return []
+
+    def _track(self, coro):
+        task = asyncio.ensure_future(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def _track_and_enter(self, x):
+        await self._track(self._enter(x))
+
+    async def _enter(self, x):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        await self._semaphore.acquire()
+        self.ninflight += 1
+        self._track(self._call(x))
+
+    async def _call(self, x):
+        try:
+            if inspect.iscoroutinefunction(self.func):
+                result = await self.func(x, *self.args, **self.kwargs)
+            else:
+                func = functools.partial(self.func, x, *self.args,
+                                         **self.kwargs)
+                result = await self.loop.asyncio_loop.run_in_executor(None,
+                                                                      func)
+            # hold the slot until downstream async nodes accepted the result
+            futures = [r for r in self._emit_result(result) if is_future(r)]
+            if futures:
+                await gen.multi(futures)
+        except Exception as e:
+            self.nerrors += 1
+            print("{} : error in {} : {}".format(self, self.func, e))
+        finally:
+            self.ninflight -= 1
+            self._semaphore.release()
+
+    def _emit_result(self, result):
         return self.emit(result)
 
+    async def join(self):
+        ''' Wait until all the elements received so far were processed.'''
+        while self._tasks:
+            await asyncio.wait(list(self._tasks))
+
+
+class sink_async(map_async):
+    def _emit_result(self, result):
+        return []
+
 
 class filter(Stream):
     def __init__(self, predicate, child):
@@ -461,12 +963,20 @@ class filter(Stream):
 
 
 class scan(Stream):
+    stateful = True
+
     def __init__(self, func, child, start=no_default, returns_state=False):
         self.func = func
         self.state = start
         self.returns_state = returns_state
         Stream.__init__(self, child)
 
+    def get_state(self):
+        return self.state
+
+    def set_state(self, state):
+        self.state = state
+
     def update(self, x, who=None):
         if self.state is no_default:
             self.state = x
@@ -478,15 +988,25 @@ class scan(Stream):
             else:
                 state = result
             self.state = state
+            if errors.skip_failed and errors.is_failed(result):
+                return []
             return self.emit(result)
 
 
 class partition(Stream):
+    stateful = True
+
     def __init__(self, n, child):
         self.n = n
         self.buffer = []
         Stream.__init__(self, child)
 
+    def get_state(self):
+        return list(self.buffer)
+
+    def set_state(self, state):
+        self.buffer = list(state)
+
     def update(self, x, who=None):
         self.buffer.append(x)
         if len(self.buffer) == self.n:
@@ -497,11 +1017,19 @@ class partition(Stream):
 
 
 class sliding_window(Stream):
+    stateful = True
+
     def __init__(self, n, child):
         self.n = n
         self.buffer = deque(maxlen=n)
         Stream.__init__(self, child)
 
+    def get_state(self):
+        return list(self.buffer)
+
+    def set_state(self, state):
+        self.buffer = deque(state, maxlen=self.n)
+
     def update(self, x, who=None):
         self.buffer.append(x)
         if len(self.buffer) == self.n:
@@ -510,6 +1038,304 @@ class sliding_window(Stream):
             return []
 
 
+class _ArrayWindow(object):
+    ''' Preallocated buffers holding the last n frames of a stream of
+        arrays (or StreamDocs containing arrays).
+
+        If double is True, each frame is also written n slots further so
+        that the last n frames are always contiguous in the buffer.
+    '''
+    def __init__(self, n, double=False):
+        self.n = n
+        self.double = double
+        self.reset()
+
+    def reset(self):
+        self.layout = None
+        self.buffers = dict()
+        self.objects = dict()
+        self.attributes = deque(maxlen=self.n)
+        self.sdoc_type = None
+        self.count = 0
+
+    @property
+    def held(self):
+        ''' The number of frames currently held.'''
+        if self.double:
+            return min(self.count, self.n)
+        return self.count % self.n
+
+    def _slots(self, x):
+        if isinstance(x, np.ndarray):
+            return {None: x}, None
+        if _is_streamdoc(x):
+            slots = {('args', i): arg for i, arg in enumerate(x['args'])}
+            slots.update({('kwargs', key): val
+                          for key, val in x['kwargs'].items()})
+            return slots, x['attributes']
+        raise TypeError("Expected a numpy array or a StreamDoc, "
+                        "got {}".format(type(x)))
+
+    def write(self, x):
+        slots, attributes = self._slots(x)
+        layout = tuple(sorted(
+            ((repr(slot), val.shape, val.dtype.str)
+             if isinstance(val, np.ndarray) else (repr(slot),))
+            for slot, val in slots.items()))
+        if layout != self.layout:
+            if self.held > 0:
+                # the frames held can't be stacked with the new ones, start
+                # a new window
+                print("Array window : frame layout changed from {} to {}, "
+                      "dropping {} frame(s)".format(self.layout, layout,
+                                                    self.held))
+            self.reset()
+            self.layout = layout
+            nslots = 2*self.n if self.double else self.n
+            for slot, val in slots.items():
+                if isinstance(val, np.ndarray):
+                    self.buffers[slot] = np.empty((nslots,) + val.shape,
+                                                  dtype=val.dtype)
+                else:
+                    self.objects[slot] = deque(maxlen=self.n)
+            if attributes is not None:
+                self.sdoc_type = x.__class__
+
+        pos = self.count % self.n
+        for slot, buf in self.buffers.items():
+            buf[pos] = slots[slot]
+            if self.double:
+                buf[pos + self.n] = slots[slot]
+        for slot, objs in self.objects.items():
+            objs.append(slots[slot])
+        self.attributes.append(attributes)
+        self.count += 1
+
+    def _start(self):
+        return self.count % self.n if self.double else 0
+
+    def _assemble(self, arrays, objects, attributes):
+        if self.sdoc_type is None:
+            return arrays[None]
+        values = dict(arrays)
+        values.update(objects)
+        args = [values[slot] for slot in sorted(
+            (slot for slot in values if slot[0] == 'args'),
+            key=lambda slot: slot[1])]
+        kwargs = {slot[1]: val for slot, val in values.items()
+                  if slot[0] == 'kwargs'}
+        sdoc = self.sdoc_type()
+        for attr in attributes:
+            sdoc.add(attributes=attr)
+        sdoc.add(args=args, kwargs=kwargs)
+        return sdoc
+
+    def window(self, copy=True):
+        ''' The full window (must hold n frames).'''
+        start = self._start()
+        arrays = dict()
+        for slot, buf in self.buffers.items():
+            if copy:
+                arr = buf[start:start + self.n].copy()
+            else:
+                arr = buf[start:start + self.n]
+                arr.flags.writeable = False
+            arrays[slot] = arr
+        objects = {slot: list(objs) for slot, objs in self.objects.items()}
+        return self._assemble(arrays, objects, self.attributes)
+
+    def frames(self):
+        ''' The frames held, oldest first, as copies.'''
+        held = self.held
+        attributes = list(self.attributes)[len(self.attributes) - held:]
+        frames = list()
+        for i in range(held):
+            pos = (self.count - held + i) % self.n
+            arrays = {slot: buf[pos].copy()
+                      for slot, buf in self.buffers.items()}
+            objects = {slot: list(objs)[len(objs) - held + i]
+                       for slot, objs in self.objects.items()}
+            if self.sdoc_type is None:
+                frames.append(arrays[None])
+            else:
+                sdoc = self._assemble(arrays, objects, [attributes[i]])
+                frames.append(sdoc)
+        return frames
+
+
+class partition_array(Stream):
+    stateful = True
+
+    def __init__(self, n, child, copy=True):
+        self.n = n
+        self.copy = copy
+        self.window = _ArrayWindow(n)
+        Stream.__init__(self, child)
+
+    def get_state(self):
+        return self.window.frames()
+
+    def set_state(self, state):
+        self.window.reset()
+        for frame in state:
+            self.window.write(frame)
+
+    def update(self, x, who=None):
+        self.window.write(x)
+        if self.window.held == 0:
+            return self.emit(self.window.window(copy=self.copy))
+        else:
+            return []
+
+
+class sliding_window_array(Stream):
+    stateful = True
+
+    def __init__(self, n, child, copy=True):
+        self.n = n
+        self.copy = copy
+        self.window = _ArrayWindow(n, double=True)
+        Stream.__init__(self, child)
+
+    def get_state(self):
+        return self.window.frames()
+
+    def set_state(self, state):
+        self.window.reset()
+        for frame in state:
+            self.window.write(frame)
+
+    def update(self, x, who=None):
+        self.window.write(x)
+        if self.window.held == self.n:
+            return self.emit(self.window.window(copy=self.copy))
+        else:
+            return []
+
+
+class shed(Stream):
+    def __init__(self, child, monitor, policy='drop', n=2):
+        if policy not in ('drop', 'decimate', 'keep'):
+            raise ValueError("shed policy not understood : {}".format(policy))
+        self.monitor = monitor
+        self.policy = policy
+        self.n = n
+        self.count = 0
+        self.nshed = 0
+        Stream.__init__(self, child)
+
+    def update(self, x, who=None):
+        if self.policy == 'keep' or not self.monitor.backlogged():
+            return self.emit(x)
+        if self.policy == 'decimate':
+            self.count += 1
+            if self.count % self.n == 0:
+                return self.emit(x)
+        self.nshed += 1
+        return []
+
+
+class schedule(Stream):
+    def __init__(self, child, scheduler, priority=0, coalesce=False):
+        self.scheduler = scheduler
+        self.priority = priority
+        self.coalesce = coalesce
+        Stream.__init__(self, child)
+
+    def update(self, x, who=None):
+        self.scheduler.submit(self.emit, x, priority=self.priority,
+                              group=self, coalesce=self.coalesce)
+        return []
+
+
+class batch(Stream):
+    stateful = True
+
+    def __init__(self, child, max_items=None, max_bytes=None,
+                 max_latency=None, loop=None):
+        if max_items is None and max_bytes is None and max_latency is None:
+            raise ValueError("batch needs at least one of max_items, "
+                             "max_bytes or max_latency")
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.max_latency = max_latency
+        self.buffer = []
+        self.nbytes = 0
+        self.first_time = None
+        # incremented at each flush, so that stale timers do nothing
+        self.generation = 0
+        self.lock = threading.Lock()
+        self.nflushes = dict(items=0, bytes=0, latency=0, manual=0)
+        Stream.__init__(self, child, loop=loop)
+
+    def get_state(self):
+        return list(self.buffer)
+
+    def set_state(self, state):
+        with self.lock:
+            self._take('manual')
+            self.nflushes['manual'] -= 1
+        # NOTE : the latency of restored elements restarts from now
+        for x in state:
+            self.update(x)
+
+    def update(self, x, who=None):
+        with self.lock:
+            self.buffer.append(x)
+            if self.max_bytes is not None:
+                self.nbytes += payload_nbytes(x)
+            if len(self.buffer) == 1:
+                self.first_time = time()
+                if self.max_latency is not None:
+                    # add_callback is thread safe, call_later is not
+                    self.loop.add_callback(self._start_timer,
+                                           self.generation)
+            reason = None
+            if self.max_items is not None and \
+                    len(self.buffer) >= self.max_items:
+                reason = 'items'
+            elif self.max_bytes is not None and self.nbytes >= self.max_bytes:
+                reason = 'bytes'
+            elif self.max_latency is not None and \
+                    time() - self.first_time >= self.max_latency:
+                reason = 'latency'
+            if reason is None:
+                return []
+            L = self._take(reason)
+        return self.emit(L)
+
+    def _take(self, reason):
+        ''' Take the current batch. Must be called with the lock held.'''
+        L, self.buffer = tuple(self.buffer), []
+        self.nbytes = 0
+        self.first_time = None
+        self.generation += 1
+        self.nflushes[reason] += 1
+        return L
+
+    def _start_timer(self, generation):
+        with self.lock:
+            if generation != self.generation:
+                return
+            delay = self.first_time + self.max_latency - time()
+        self.loop.call_later(max(delay, 0), self._timeout, generation)
+
+    def _timeout(self, generation):
+        with self.lock:
+            if generation != self.generation or not self.buffer:
+                return
+            L = self._take('latency')
+        return self.emit(L)
+
+    def flush(self):
+        ''' Emit the current batch now, if not empty.'''
+        with self.lock:
+            if not self.buffer:
+                return []
+            L = self._take('manual')
+        return self.emit(L)
+
+
 class timed_window(Stream):
     def __init__(self, interval, child, loop=None):
         self.interval = interval
@@ -0,0 +1,115 @@
+''' Tracing of node executions in Stream graphs.
+
+    A ``Tracer`` records one span (start, end, thread, node name, data_uid)
+    per node execution and writes them as Chrome trace-event JSON, which can
+    be viewed in about:tracing or Perfetto (https://ui.perfetto.dev).
+
+    Since the graph is synchronous, the span of a node contains the spans of
+    everything downstream of it. In the trace viewer, one frame then appears
+    as a stack showing its path through the graph.
+
+    Spans are written into a fixed size ring buffer (the oldest spans are
+    overwritten) without locking, and documents can be sampled so tracing
+    can be left on in production.
+
+    Example
+    -------
+    >>> tracer = sin.trace(sample=.1)
+    >>> # ... run ...
+    >>> tracer.save("trace.json")
+'''
+import itertools
+import json
+import os
+import random
+import threading
+import zlib
+
+from .stats import _is_streamdoc
+
+
+class Tracer:
+    ''' Records spans of node executions.
+
+        Parameters
+        ----------
+        size : int, optional
+            the number of spans kept in the ring buffer
+        sample : float, optional
+            the fraction (0 to 1) of documents to trace. Sampling is done per
+            data_uid, so all spans of a sampled frame are kept.
+    '''
+    def __init__(self, size=65536, sample=1.):
+        self.size = size
+        self.sample = sample
+        self._buffer = [None] * size
+        # next() on itertools.count is atomic, no lock needed
+        self._counter = itertools.count()
+        self._pid = os.getpid()
+
+    def sampled(self, data_uid):
+        ''' Decide whether or not to trace a document.'''
+        if self.sample >= 1:
+            return True
+        if data_uid is None:
+            return random.random() < self.sample
+        # hash the uid so every node makes the same decision for a frame
+        key = zlib.crc32(str(data_uid).encode()) % 10000
+        return key < self.sample * 10000
+
+    def record(self, node, data_uid, start, end):
+        ''' Record a span. start and end are times in seconds.'''
+        seq = next(self._counter)
+        self._buffer[seq % self.size] = (seq, start, end,
+                                         threading.get_ident(), node,
+                                         data_uid)
+
+    def spans(self):
+        ''' Return the recorded spans, ordered by start time.
+
+            Each span is a dictionary with elements start, end, thread, node
+            and data_uid.
+        '''
+        entries = [entry for entry in list(self._buffer) if entry is not None]
+        entries.sort(key=lambda entry: (entry[1], entry[0]))
+        return [dict(start=start, end=end, thread=thread, node=str(node),
+                     data_uid=data_uid)
+                for seq, start, end, thread, node, data_uid in entries]
+
+    def clear(self):
+        self._buffer = [None] * self.size
+
+    def to_chrome_trace(self):
+        ''' Return the spans as a list of Chrome trace events.'''
+        events = list()
+        for span in self.spans():
+            events.append(dict(name=span['node'], cat="stream", ph="X",
+                               ts=span['start']*1e6,
+                               dur=(span['end'] - span['start'])*1e6,
+                               pid=self._pid, tid=span['thread'],
+                               args=dict(data_uid=span['data_uid'])))
+        return events
+
+    def save(self, filename):
+        ''' Write the spans to filename as Chrome trace JSON.'''
+        with open(filename, "w") as f:
+            json.dump(dict(traceEvents=self.to_chrome_trace(),
+                           displayTimeUnit="ms"), f)
+
+
+def get_data_uid(x):
+    ''' Get the data_uid of an element of a stream (or None).
+
+        Looks in the attributes of StreamDocs, and in the first StreamDoc of
+        a tuple (for ex. the output of zip).
+    '''
+    if isinstance(x, tuple):
+        for elem in x:
+            data_uid = get_data_uid(elem)
+            if data_uid is not None:
+                return data_uid
+        return None
+    if _is_streamdoc(x):
+        return x['attributes'].get('data_uid', None)
+    return None
+
@@ -1,6 +1,6 @@
 # test a XS run
+import functools
 import time
-from time import sleep
 import os
 import numpy as np
 import matplotlib
@@ -10,7 +10,7 @@ from collections import deque
 
 # SciStreams imports
 # this one does a bit of setup upon import, necessary
-from SciStreams.globals import client
+from SciStreams.globals import client, futures_manager
 import SciStreams.config as config
 
 # interfaces
@@ -26,6 +26,12 @@ from SciStreams.interfaces.StreamDoc import StreamDoc, Arguments
 from SciStreams.interfaces.StreamDoc import psdm, psda, squash
 
 from SciStreams.interfaces.streams import Stream
+from SciStreams.interfaces.backpressure import IngestQueue, Poller
+from SciStreams.interfaces.scheduler import Scheduler
+from SciStreams.interfaces.runner import Runner
+from SciStreams.interfaces.checkpoint import Checkpointer
+from SciStreams.interfaces.artifacts import publish
+from dask.base import tokenize
 # Analyses
 from SciStreams.analyses.XSAnalysis.Data import \
         MasterMask, MaskGenerator, Obstruction
@@ -110,15 +116,18 @@ mmg = MaskGenerator(master_mask, blemish)
 
 # TODO merge check with get stitch
 def check_stitchback(sdoc):
+    # copy first (cheap) so the input document is left untouched
+    sdoc = StreamDoc(sdoc)
     sdoc['attributes']['stitchback'] = True
     # if 'stitchback' not in sdoc['attributes']:
     # sdoc['attributes']['stitchback'] = False
-    return StreamDoc(sdoc)
+    return sdoc
 
 
 def set_detector_name(sdoc, detector_name='pilatus300'):
+    sdoc = StreamDoc(sdoc)
     sdoc['attributes']['detector_name'] = detector_name
-    return StreamDoc(sdoc)
+    return sdoc
 
 
 def safelog10(img):
@@ -160,12 +169,23 @@ def isSAXS(sdoc):
 
 globaldict = dict()
 
+# bounded queue of uids waiting to be processed. Low priority branches below
+# shed load when this is backlogged
+ingest = IngestQueue(**config.ingest)
+# plots run on this worker pool by priority (and coalesced when only the
+# latest one matters), so they don't delay the graph. The file writes are
+# plain blocking I/O and run as sink_async nodes on the runner's loop
+scheduler = Scheduler(**config.scheduler)
+
 # Stream setup, datbroker data comes here (a string uid)
 sin = Stream()
 # TODO : run asynchronously?
 
+# images are only read when a function needs them
 s_event = sin\
-        .map(source_databroker.pullfromuid, dbname='cms:data')
+        .map(source_databroker.pullfromuid, dbname='cms:data', lazy=True)
+# keep a handle on the input documents, for recording/replaying sessions
+s_input = s_event
 
 s_event = s_event.map(check_stitchback)
 
@@ -197,9 +217,19 @@ def blemish_mask(mask):
     mask[248, 56] = 0
     return mask
 
+
+def generate_mask(origin):
+    return blemish_mask(mmg.generate(origin))
+
+
+def _publish_mask(origin):
+    # the mask is built once per origin (and kept in the 'masks' category of
+    # the result cache), the stream carries a reference to it
+    return publish(generate_mask, origin, client=client,
+                   token=tokenize('generate_mask', origin))
+
 # generate a mask
-mskstr = origin.map(psdm(mmg.generate))
-mskstr = mskstr.map(psdm(blemish_mask))
+mskstr = origin.map(psdm(_publish_mask))
 
 mask_stream = mskstr.map(select, (0, 'mask'))
 
@@ -244,9 +274,14 @@ img_mask_origin.map(sin_imgstitch.emit)
 sin_thumb, sout_thumb = ThumbStream(blur=1, resize=2)
 image.map(sin_thumb.emit)
 images = list()
-
-sout_img_partitioned = sout_thumb.map(select, ('thumb', None))\
-        .partition(100)\
+# only keep one in 10 thumbnails when backlogged
+sout_thumb_shed = sout_thumb.shed(ingest, policy='decimate', n=10)
+
+# batches of up to 100 thumbnails, but don't wait more than 10 min for them.
+# The stacking and the PCA run on the scheduler, not in the ingestion
+sout_img_partitioned = sout_thumb_shed.map(select, ('thumb', None))\
+        .batch(max_items=100, max_latency=600.)\
+        .schedule(scheduler, 'ml')\
         .map(squash)
 
 sout_img_pca = sout_img_partitioned\
@@ -262,57 +297,71 @@ image.zip(mask_stream, origin.map(select, (0, 'origin'))).map(merge)\
         .map(sqphi_in.emit)
 
 
+def store(sdoc, writer, *args, **kwargs):
+    ''' Write sdoc with writer, computing its result on the client.
+
+        The future is tracked with the other futures of the same data uid,
+        so they are all released together once the frame is written.
+    '''
+    frame = sdoc['attributes'].get('data_uid', None)
+    future = client.compute(writer(sdoc, *args, **kwargs))
+    futures_manager.add(future, frame=frame)
+
+
 # save to plots
-resultsqueue = deque(maxlen=1000)
-sout_circavg.map((source_plotting.store_results),
-                 lines=[('sqx', 'sqy')],
-                 scale='loglog', xlabel="$q\,(\mathrm{\AA}^{-1})$",
-                 ylabel="I(q)")\
-        .map(client.compute).map(resultsqueue.append)
-sout_imgstitch\
-        .map((source_plotting.store_results),
-             images=['image'], hideaxes=True)\
-        .map(client.compute).map(resultsqueue.append)
+sout_circavg.schedule(scheduler, 'plot')\
+        .sink(store, source_plotting.store_results,
+              lines=[('sqx', 'sqy')],
+              scale='loglog', xlabel="$q\,(\mathrm{\AA}^{-1})$",
+              ylabel="I(q)")
+sout_imgstitch.schedule(scheduler, 'plot')\
+        .sink(store, source_plotting.store_results,
+              images=['image'], hideaxes=True)
 
 sout_imgstitch_log\
-        .map((source_plotting.store_results), images=['image'],
-             hideaxes=True)\
-        .map(client.compute)\
-        .map(resultsqueue.append)
-sout_thumb\
-        .map((source_plotting.store_results), images=['thumb'],
-             hideaxes=True)\
-        .map(client.compute)\
-        .map(resultsqueue.append)
-sout_thumb.map(select, ('thumb', None)).map(psdm(safelog10)).map(select, (0, 'thumb'))\
+        .shed(ingest, policy='drop')\
+        .schedule(scheduler, 'plot', coalesce=True)\
+        .sink(store, source_plotting.store_results, images=['image'],
+              hideaxes=True)
+sout_thumb_shed.schedule(scheduler, 'plot', coalesce=True)\
+        .sink(store, source_plotting.store_results, images=['thumb'],
+              hideaxes=True)
+sout_thumb.shed(ingest, policy='drop')\
+        .schedule(scheduler, 'plot', coalesce=True)\
+        .map(select, ('thumb', None)).map(psdm(safelog10)).map(select, (0, 'thumb'))\
         .map(add_attributes, stream_name="ThumbLog")\
-        .map(source_plotting.store_results, images=['thumb'],
-             hideaxes=True)\
-        .map(client.compute).map(resultsqueue.append)
+        .sink(store, source_plotting.store_results, images=['thumb'],
+              hideaxes=True)
 
-sqphi_out.map(source_plotting.store_results,
+sqphi_out.schedule(scheduler, 'plot', coalesce=True)\
+        .sink(store, source_plotting.store_results,
               images=['sqphi'], xlabel="$\phi$",
-              ylabel="$q$", vmin=0, vmax=100)\
-        .map(resultsqueue.append)
-sout_img_pca\
-        .map(source_plotting.store_results,
-             images=['components'])\
-        .map(client.compute)\
-        .map(resultsqueue.append)
-
-# save to file system
-sout_thumb\
-        .map((source_file.store_results_file),
-             {'writer': 'npy', 'keys': ['thumb']})\
-        .map(client.compute).map(resultsqueue.append)
-sout_circavg\
-        .map((source_file.store_results_file),
-             {'writer': 'npy', 'keys': ['sqx', 'sqy']})\
-        .map(client.compute).map(resultsqueue.append)
+              ylabel="$q$", vmin=0, vmax=100)
+# (already on the scheduler)
+sout_img_pca.sink(store, source_plotting.store_results,
+                  images=['components'])
+
+# save to file system (awaited by the runner, through the map(sin.emit)
+# connectors, so the source slows down when the writes fall behind)
+io_sinks = list()
+io_sinks.append(sout_thumb_shed
+        .sink_async(store, source_file.store_results_file,
+                    {'writer': 'npy', 'keys': ['thumb']}, concurrency=2))
+io_sinks.append(sout_circavg
+        .sink_async(store, source_file.store_results_file,
+                    {'writer': 'npy', 'keys': ['sqx', 'sqy']},
+                    concurrency=2))
 
 # save to xml
-sout_circavg.map((source_xml.store_results_xml), outputs=None)\
-        .map(client.compute).map(resultsqueue.append)
+io_sinks.append(sout_circavg
+        .sink_async(store, source_xml.store_results_xml, outputs=None,
+                    concurrency=2))
+
+
+async def join_io_sinks():
+    ''' Wait for the file writes in progress to be done.'''
+    for node in io_sinks:
+        await node.join()
 
 # TODO : make databroker not save numpy arrays by default i flonger than a
 # certain size
@@ -322,6 +371,18 @@ sout_circavg.map((source_xml.store_results_xml), outputs=None)\
 # 'sqxerr' : 'npy', 'sqyerr' : 'npy'}, raw=True)
 
 
+# skip the branches that don't end in a sink
+sin.prune()
+
+# save the state of the stitching, windows and partitions
+if config.checkpointdir is not None:
+    checkpointer = Checkpointer(config.checkpointdir,
+                                interval=config.checkpoint_interval)
+    # (with the graphs it emits into : thumbnails, stitching etc)
+    checkpointer.register_graph("main", sin)
+else:
+    checkpointer = None
+
 # Now prepare data for the stream
 # parameters
 
@@ -331,32 +392,76 @@ sout_circavg.map((source_xml.store_results_xml), outputs=None)\
 # Emitting data
 
 def start_run(start_time, dbname="cms:data",
-              noqbins=None):
-    ''' Start a live run of pipeline.'''
+              noqbins=None, record_dir=None):
+    ''' Start a live run of pipeline.
+
+        New uids are polled from the database in a separate thread and put
+        in the bounded ``ingest`` queue, from which they are emitted as fast
+        as the graph can process them.
+
+        record_dir : if not None, record the input StreamDocs to this
+            directory (see SciStreams.interfaces.replay)
+
+        If a checkpoint directory is configured, the state of the graph is
+        restored from the last checkpoint and the run resumes after the last
+        uid processed (start_time is then ignored).
+    '''
+    if record_dir is not None:
+        from SciStreams.interfaces.replay import Recorder
+        recorder = Recorder(record_dir)
+        s_input.sink(recorder.record)
 
-    last_uid = None
     cddb = databases[dbname]
-    while True:
-        hdrs = cddb(start_time=start_time)
+    state = dict(start_time=start_time, last_uid=None)
+
+    if checkpointer is not None:
+        metadata = checkpointer.restore()
+        if metadata is not None:
+            print("Resuming from checkpoint after uid {}"
+                  .format(metadata['last_uid']))
+            state['last_uid'] = metadata['last_uid']
+            t1 = time.localtime(metadata['last_time'])
+            state['start_time'] = time.strftime("%Y-%m-%d %H:%M:%S", t1)
+
+    def poll():
+        ''' Get the (uid, time) of the headers since the last poll.'''
+        hdrs = cddb(start_time=state['start_time'])
         # need to reverse the headers in the correct order
         hdrs = list(hdrs)
         hdrs.reverse()
-
-        for hdr in hdrs:
-            uid = hdr['start']['uid']
-
-            # always skip the last uid
-            if uid == last_uid:
+        # always skip the last uid
+        uids = [(hdr['start']['uid'], hdr['start']['time']) for hdr in hdrs
+                if hdr['start']['uid'] != state['last_uid']]
+        if len(hdrs) > 0:
+            # get the latest time (will get the last uid again next time)
+            state['last_uid'] = hdrs[-1]['start']['uid']
+            t1 = time.localtime(hdrs[-1]['start']['time'])
+            state['start_time'] = time.strftime("%Y-%m-%d %H:%M:%S", t1)
+        if len(uids) == 0:
+            print("Reached end, waiting 1 sec for more data...")
+        return uids
+
+    poller = Poller(poll, ingest, interval=1.)
+    # the graph, its timers (batch etc) and async sinks run on this loop
+    runner = Runner()
+
+    async def consume():
+        asyncio_loop = runner.loop.asyncio_loop
+        while True:
+            try:
+                uid, uid_time = await asyncio_loop.run_in_executor(
+                    None, ingest.get, 1.)
+            except TimeoutError:
                 continue
-
-            print("Loading task for uid : {}".format(uid))
+            print("Loading task for uid : {} (queue : {}/{})"
+                  .format(uid, ingest.depth, ingest.maxsize))
 
             try:
-                sin.emit(uid)
-                sleep(.1)
+                await runner.emit(sin, uid)
             except KeyError as e:
                 errormsg = "Got a keyerror (no image likely), ignoring\n"
                 errormsg += "{}".format(e)
+                print(errormsg)
             except ValueError as e:
                 print("got ValueError: {}".format(e))
             except FileNotFoundError:
@@ -364,15 +469,43 @@ def start_run(start_time, dbname="cms:data",
             except AttributeError:
                 print("Attribute Error (probably the " +
                       "metadata is slightly different)")
+            finally:
+                ingest.task_done()
+
+            if checkpointer is not None:
+                checkpointer.frame_done(dict(last_uid=uid,
+                                             last_time=uid_time))
+
+    try:
+        runner.run(consume())
+    finally:
+        poller.stop()
+        runner.run(join_io_sinks())
+        print("Ingest queue : {}".format(ingest.metrics()))
+        print("Scheduler : {}".format(scheduler.metrics()))
+
+
+def replay_run(record_dir, speed=1.):
+    ''' Replay a session recorded with start_run(record_dir=...) through
+        the pipeline, without a databroker.
+
+        speed : 1 for the original pace, N for N times faster, None for as
+            fast as possible
+    '''
+    from SciStreams.interfaces.replay import Replayer
+    replayer = Replayer(record_dir)
+    # the replay emits from a thread, the file sinks run on the loop
+    runner = Runner()
+
+    async def replay():
+        result = await runner.loop.asyncio_loop.run_in_executor(
+            None, functools.partial(replayer.run, s_input, speed=speed,
+                                    verbose=True))
+        await join_io_sinks()
+        return result
+
+    return runner.run(replay())
 
-        # get the latest time, add 1 second to not overlap it
-        last_uid = hdr['start']['uid']
-        last_time = hdr['start']['time']
-        t1 = time.localtime(last_time)
-        start_time = time.strftime("%Y-%m-%d %H:%M:%S", t1)
-        # at the end, update time stamp for latest time
-        print("Reached end, waiting 1 sec for more data...")
-        sleep(1)
 
 if __name__ == "__main__":
     start_time = time.time()-24*3600
@@ -26,6 +26,8 @@ from SciStreams.interfaces.StreamDoc import StreamDoc, Arguments
 from SciStreams.interfaces.StreamDoc import psdm, psda, squash
 
 from SciStreams.interfaces.streams import Stream
+from SciStreams.interfaces.artifacts import publish
+from dask.base import tokenize
 # Analyses
 from SciStreams.analyses.XSAnalysis.Data import \
         MasterMask, MaskGenerator, Obstruction
@@ -114,15 +116,18 @@ mmg = MaskGenerator(master_mask, blemish)
 
 # TODO merge check with get stitch
 def check_stitchback(sdoc):
+    # copy first (cheap) so the input document is left untouched
+    sdoc = StreamDoc(sdoc)
     sdoc['attributes']['stitchback'] = True
     # if 'stitchback' not in sdoc['attributes']:
     # sdoc['attributes']['stitchback'] = False
-    return StreamDoc(sdoc)
+    return sdoc
 
 
 def set_detector_name(sdoc, detector_name='pilatus300'):
+    sdoc = StreamDoc(sdoc)
     sdoc['attributes']['detector_name'] = detector_name
-    return StreamDoc(sdoc)
+    return sdoc
 
 
 def safelog10(img):
@@ -201,9 +206,19 @@ def blemish_mask(mask):
     mask[248, 56] = 0
     return mask
 
+
+def generate_mask(origin):
+    return blemish_mask(mmg.generate(origin))
+
+
+def _publish_mask(origin):
+    # the mask is built once per origin (and kept in the 'masks' category of
+    # the result cache), the stream carries a reference to it
+    return publish(generate_mask, origin, client=client,
+                   token=tokenize('generate_mask', origin))
+
 # generate a mask
-mskstr = origin.map(psdm(mmg.generate))
-mskstr = mskstr.map(psdm(blemish_mask))
+mskstr = origin.map(psdm(_publish_mask))
 
 mask_stream = mskstr.map(select, (0, 'mask'))
 
@@ -267,56 +282,44 @@ image.zip(mask_stream, origin.map(select, (0, 'origin'))).map(merge)\
 
 
 # save to plots
-resultsqueue = deque(maxlen=1000)
-sout_circavg.map((iplotting.store_results),
-                 lines=[('sqx', 'sqy')],
-                 scale='loglog', xlabel="$q\,(\mathrm{\AA}^{-1})$",
-                 ylabel="I(q)")\
-        #.map(client.compute).map(resultsqueue.append)
+# NOTE : these are sinks, so the branches feeding them are kept when the
+# graph is pruned below. Comment out a sink to skip its whole branch.
+sout_circavg.sink((iplotting.store_results),
+                  lines=[('sqx', 'sqy')],
+                  scale='loglog', xlabel="$q\,(\mathrm{\AA}^{-1})$",
+                  ylabel="I(q)")
 sout_imgstitch\
-        .map((iplotting.store_results),
-             images=['image'], hideaxes=True)\
-        #.map(client.compute).map(resultsqueue.append)
+        .sink((iplotting.store_results),
+              images=['image'], hideaxes=True)
 
 sout_imgstitch_log\
-        .map((iplotting.store_results), images=['image'],
-             hideaxes=True)\
-        #.map(client.compute)\
-        #.map(resultsqueue.append)
+        .sink((iplotting.store_results), images=['image'],
+              hideaxes=True)
 sout_thumb\
-        .map((iplotting.store_results), images=['thumb'],
-             hideaxes=True)\
-        #.map(client.compute)\
-        #.map(resultsqueue.append)
+        .sink((iplotting.store_results), images=['thumb'],
+              hideaxes=True)
 sout_thumb.map(select, ('thumb', None)).map(psdm(safelog10)).map(select, (0, 'thumb'))\
         .map(add_attributes, stream_name="ThumbLog")\
-        .map(iplotting.store_results, images=['thumb'],
-             hideaxes=True)\
-        #.map(client.compute).map(resultsqueue.append)
-
-sqphi_out.map(iplotting.store_results,
-              images=['sqphi'], xlabel="$\phi$",
-              ylabel="$q$", vmin=0, vmax=100)\
-        #.map(resultsqueue.append)
+        .sink(iplotting.store_results, images=['thumb'],
+              hideaxes=True)
+
+sqphi_out.sink(iplotting.store_results,
+               images=['sqphi'], xlabel="$\phi$",
+               ylabel="$q$", vmin=0, vmax=100)
 sout_img_pca\
-        .map(iplotting.store_results,
-             images=['components'])\
-        #.map(client.compute)\
-        #.map(resultsqueue.append)
+        .sink(iplotting.store_results,
+              images=['components'])
 
 # save to file system
 sout_thumb\
-        .map((ifile.store_results_file),
-             {'writer': 'npy', 'keys': ['thumb']})\
-        #.map(client.compute).map(resultsqueue.append)
+        .sink((ifile.store_results_file),
+              {'writer': 'npy', 'keys': ['thumb']})
 sout_circavg\
-        .map((ifile.store_results_file),
-             {'writer': 'npy', 'keys': ['sqx', 'sqy']})\
-        #.map(client.compute).map(resultsqueue.append)
+        .sink((ifile.store_results_file),
+              {'writer': 'npy', 'keys': ['sqx', 'sqy']})
 
 # save to xml
-sout_circavg.map((ixml.store_results_xml), outputs=None)\
-        #.map(client.compute).map(resultsqueue.append)
+sout_circavg.sink((ixml.store_results_xml), outputs=None)
 
 # TODO : make databroker not save numpy arrays by default i flonger than a
 # certain size
@@ -326,6 +329,9 @@ sout_circavg.map((ixml.store_results_xml), outputs=None)\
 # 'sqxerr' : 'npy', 'sqyerr' : 'npy'}, raw=True)
 
 
+# skip the branches that don't end in a sink
+sin.prune()
+
 # Now prepare data for the stream
 # parameters
 
@@ -72,3 +72,294 @@ def test_merge():
     assert result_kwargs['b'] == 2
     assert result_kwargs['c'] == 4
     assert result_args == [1,2,3,4]
+
+
+def test_streamdoc_compat():
+    ''' StreamDocs are not dicts anymore, but behave like them.'''
+    import pickle
+    from dask.base import tokenize
+
+    sdoc = StreamDoc(args=[1], kwargs=dict(a=2), attributes=dict(name="a"))
+    assert sdoc['args'] is sdoc.args
+    assert 'kwargs' in sdoc and '_StreamDoc' in sdoc
+    sdoc['args'] = [3]
+    assert sdoc.args == [3]
+
+    # uids are only made when needed, and stay the same
+    assert sdoc._uid is None
+    uid = sdoc['uid']
+    assert sdoc.uid == uid
+
+    sdoc2 = pickle.loads(pickle.dumps(sdoc))
+    assert sdoc2.args == [3] and sdoc2.uid == uid
+    assert sdoc2.attributes == dict(name="a")
+
+    # copies don't share their components
+    sdoc3 = StreamDoc(sdoc)
+    sdoc3.add(attributes=dict(name="b"))
+    assert sdoc.attributes['name'] == "a"
+    assert tokenize(sdoc) == tokenize(sdoc3)
+
+
+def test_streamdoc_copies():
+    ''' derived StreamDocs never share their attributes.'''
+    from SciStreams.interfaces.StreamDoc import add_attributes
+
+    sdoc = StreamDoc(args=[1], kwargs=dict(b=2), attributes=dict(a=1, b=2))
+    sdoc2 = add_attributes(sdoc, b=20)
+    sdoc3 = sdoc.select((0, 'a'), 'b')
+    sdoc.attributes['a'] = 10
+    assert sdoc2.attributes == dict(a=1, b=20)
+    assert sdoc3.attributes == dict(a=1, b=2)
+    assert sdoc3.kwargs == dict(a=1, b=2) and sdoc3.args == []
+
+    merged = sdoc2.merge(sdoc3)
+    assert merged.attributes == dict(a=1, b=2)
+
+
+def test_parse_streamdoc_leaves_input():
+    ''' the function_list is not added to the input attributes.'''
+    def f(x, **kwargs):
+        return x
+
+    sdoc = StreamDoc(args=[1], kwargs=dict(a=1), attributes=dict(name="a"))
+    res = psdm(f)(sdoc, b=2)
+    assert res['attributes']['function_list'] == ['f']
+    assert 'function_list' not in sdoc['attributes']
+    assert sdoc['kwargs'] == dict(a=1)
+
+
+def test_select_compiled():
+    from nose.tools import assert_raises
+    from SciStreams.interfaces.StreamDoc import select, Selector
+
+    s = Stream()
+    # bad mappings are caught when building the graph
+    assert_raises(ValueError, s.map, select, (1, 2))
+    smap = s.map(select, (0, 'a'), ('b', None), 'c')
+    assert isinstance(smap.func, Selector)
+    L = smap.sink_to_list()
+
+    s.emit(StreamDoc(args=[1], kwargs=dict(b=2, c=3), attributes=dict(d=4)))
+    assert L[0]['args'] == [2]
+    assert L[0]['kwargs'] == dict(a=1, c=3)
+    assert L[0]['attributes'] == dict(d=4)
+
+    # missing data is still only found at run time
+    assert_raises(KeyError, s.emit, StreamDoc(args=[1]))
+    assert_raises(KeyError, StreamDoc(args=[1]).select, (1, None))
+
+
+def test_lazy_array():
+    import pickle
+    import numpy as np
+    from SciStreams.interfaces.lazy import LazyArray
+    from SciStreams.interfaces.StreamDoc import select
+
+    lazy = LazyArray(lambda: np.ones(3), key=('uid', 'image'))
+    s = Stream()
+    # attribute only branch
+    Lattr = s.map(lambda x: x['attributes']['name']).sink_to_list()
+    simg = s.map(select, ('image', None))
+    Lsum = simg.map(psdm(np.sum)).sink_to_list()
+    Lmax = simg.map(psdm(np.max)).sink_to_list()
+
+    s.emit(StreamDoc(kwargs=dict(image=lazy), attributes=dict(name="a")))
+    assert Lattr == ["a"]
+    assert Lsum[0]['args'] == [3] and Lmax[0]['args'] == [1]
+    # read once, for both branches
+    assert lazy.nloads == 1
+
+    assert isinstance(pickle.loads(pickle.dumps(lazy)), np.ndarray)
+
+    uncached = LazyArray(lambda: np.ones(3), cache=False)
+    np.asarray(uncached)
+    np.asarray(uncached)
+    assert uncached.nloads == 2 and not uncached.loaded
+
+
+def test_streamdoc_out_of_band():
+    ''' large arrays are pickled as out of band buffers, without copies.'''
+    import pickle
+    import numpy as np
+    from numpy.testing import assert_array_equal
+    from SciStreams.interfaces.StreamDoc import dumps_streamdoc, \
+        loads_streamdoc
+
+    img = np.arange(100000.)
+    small = np.ones(3)
+    sdoc = StreamDoc(args=[img, small], kwargs=dict(mask=img[::2]),
+                     attributes=dict(name="a", shape=[2, 3]))
+    uid = sdoc.uid
+
+    frames = dumps_streamdoc(sdoc)
+    # the header, img and the (made contiguous) mask, small stays in band
+    assert len(frames) == 3
+    assert np.shares_memory(np.frombuffer(frames[1]), img)
+    sdoc2 = loads_streamdoc(frames)
+    assert np.shares_memory(sdoc2.args[0], img)
+    assert_array_equal(sdoc2.args[1], small)
+    assert_array_equal(sdoc2.kwargs['mask'], img[::2])
+    assert sdoc2.attributes == sdoc.attributes and sdoc2.uid == uid
+
+    # plain pickle still works, in band
+    sdoc3 = pickle.loads(pickle.dumps(sdoc, protocol=5))
+    assert_array_equal(sdoc3.args[0], img)
+    sdoc4 = pickle.loads(pickle.dumps(sdoc, protocol=2))
+    assert_array_equal(sdoc4.args[0], img)
+    assert sdoc4.uid == uid
+
+
+def test_fingerprint():
+    ''' arrays are hashed once, and not at all if their source is known.'''
+    import numpy as np
+    from dask.base import tokenize
+    from SciStreams.interfaces import fingerprint
+
+    img = np.arange(1000.)
+    sdoc = StreamDoc(args=[img], attributes=dict(name="a"))
+    nhashed = fingerprint.stats['hashed']
+    token = tokenize(sdoc)
+    assert tokenize(sdoc.select((0, 'image'))) != token
+    assert tokenize(StreamDoc(args=[img])) == token
+    assert fingerprint.stats['hashed'] == nhashed + 1
+    # same content, other array
+    assert tokenize(StreamDoc(args=[img.copy()])) == token
+    assert tokenize(StreamDoc(args=[img[::-1]])) != token
+
+    fingerprint.set_sample_size(800)
+    try:
+        big = np.zeros(1000)
+        token = tokenize(StreamDoc(args=[big]))
+        big2 = np.zeros(1000)
+        big2[0] = 1
+        assert tokenize(StreamDoc(args=[big2])) != token
+        assert fingerprint.stats['sampled'] >= 2
+    finally:
+        fingerprint.set_sample_size(None)
+
+    src = np.ones(10)
+    fingerprint.set_provenance(src, ('uid1', 'pilatus300_image'))
+    nhashed = fingerprint.stats['hashed']
+    tokenize(StreamDoc(args=[src]))
+    assert fingerprint.stats['hashed'] == nhashed
+
+
+def test_debug_capture():
+    ''' calls are only captured when enabled, and as summaries.'''
+    import os
+    import tempfile
+    from nose.tools import assert_raises
+    import numpy as np
+    from SciStreams.interfaces import debug
+
+    def fails(img):
+        raise ValueError("bad image")
+
+    img = np.arange(10.)
+    sdoc = StreamDoc(args=[img], attributes=dict(data_uid="abc"))
+    ncaptures = len(debug.captures)
+    psdm(np.sum)(sdoc)
+    assert len(debug.captures) == ncaptures
+
+    dumpdir = tempfile.mkdtemp()
+    debug.enable(functions=['sum'], dumpdir=dumpdir)
+    try:
+        psdm(np.sum)(sdoc)
+        psdm(np.max)(sdoc)
+        psdm(fails)(sdoc)
+    finally:
+        debug.disable()
+        debug.set_dumpdir(None)
+    assert len(debug.captures) == ncaptures + 1
+    capture = debug.captures[-1]
+    assert capture['funcname'] == 'sum' and capture['data_uid'] == "abc"
+    assert capture['args'][0]['shape'] == (10,)
+    assert capture['args'][0]['max'] == 9.
+
+    filename, = os.listdir(dumpdir)
+    record = debug.load_failure(os.path.join(dumpdir, filename))
+    assert record['funcname'] == 'fails' and 'bad image' in record['traceback']
+    assert_raises(ValueError, debug.replay, os.path.join(dumpdir, filename),
+                  fails)
+
+
+def test_error_accounting():
+    ''' failures are counted, and optionally skipped downstream.'''
+    import numpy as np
+    from SciStreams.interfaces import errors
+
+    def fails(img):
+        raise ValueError("bad image")
+
+    errors.reset()
+    sdoc = StreamDoc(args=[np.ones(3)], attributes=dict(data_uid="abc"))
+    for i in range(3):
+        res = psdm(fails)(sdoc)
+    assert errors.is_failed(res) and not errors.is_failed(sdoc)
+    assert res.statistics['error_type'] == "ValueError"
+    rec, = errors.errors()
+    assert rec['funcname'] == 'fails' and rec['count'] == 3
+    assert rec['data_uids'] == ["abc"]*3
+    assert 'fails' in errors.format_errors()
+
+    # signature mismatches are reported as such
+    psdm(fails)(StreamDoc(args=[1, 2]))
+    assert errors.table[('fails', 'TypeError')].count == 1
+
+    calls = list()
+
+    def count(img):
+        calls.append(img)
+        return img
+
+    errors.skip_failed = True
+    try:
+        assert psdm(count)(res) is res
+        assert psda(count)(sdoc, res) is sdoc
+        assert calls == []
+        # failed docs are not emitted by the nodes
+        from SciStreams.interfaces.StreamDoc import select
+
+        def fails_acc(prev, img):
+            raise ValueError("bad image")
+
+        s = Stream()
+        L = s.map(psdm(fails)).map(select, (0, 'img')).sink_to_list()
+        Lacc = s.accumulate(psda(fails_acc)).sink_to_list()
+        s.emit(sdoc)
+        s.emit(sdoc)
+        assert L == []
+        assert Lacc == [sdoc]
+    finally:
+        errors.skip_failed = False
+    assert not errors.is_failed(psdm(count)(res))
+    errors.reset()
+
+
+def test_squash():
+    import numpy as np
+    from numpy.testing import assert_array_equal
+    from SciStreams.interfaces.StreamDoc import squash
+
+    sdocs = [StreamDoc(args=[np.ones((2, 2), dtype=np.uint16)*i, i, [i]],
+                       kwargs=dict(name="a{}".format(i),
+                                   q=np.arange(i+1)),
+                       attributes=dict(sample=i, user="x"))
+             for i in range(3)]
+    res = squash(sdocs)
+    img, nums, lists = res.args
+    assert img.shape == (3, 2, 2) and img.dtype == np.uint16
+    assert_array_equal(img[:, 0, 0], [0, 1, 2])
+    assert_array_equal(nums, [0, 1, 2])
+    assert lists == [[0], [1], [2]]
+    assert res.kwargs['name'] == ["a0", "a1", "a2"]
+    # differing shapes are kept in a list
+    assert len(res.kwargs['q']) == 3
+    assert res.attributes == dict(sample=2, user="x")
+
+    buf = np.zeros((3, 2, 2), dtype=np.float32)
+    res = squash(sdocs, out={0: buf})
+    assert res.args[0] is buf and buf[2, 0, 0] == 2
+
+    assert squash([]).args == []
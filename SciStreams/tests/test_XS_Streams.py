@@ -1,5 +1,6 @@
 # test the XSAnalysis Streams, make sure they're working properly
 from SciStreams.interfaces.StreamDoc import StreamDoc
+from SciStreams.interfaces.lazy import materialize
 from SciStreams.analyses.XSAnalysis.Streams import ImageStitchingStream,\
         CalibrationStream, CircularAverageStream, QPHIMapStream,\
         ThumbStream
@@ -37,7 +38,8 @@ def test_CalibrationStream_pilatus():
     sin.emit(sdoc)
 
     # now get the calibration object
-    calib = L[0]['args'][0]
+    # (the stream carries a reference to the calibration with its maps)
+    calib = materialize(L[0]['args'][0])
     qmap = calib.q_map
     # assert detector shape is correct
     # should be (619, 487) but here it's detector independent
@@ -0,0 +1,78 @@
+# test the worker resident artifacts
+import pickle
+
+import numpy as np
+
+from SciStreams.interfaces import artifacts
+from SciStreams.interfaces.artifacts import publish, ArtifactRef
+from SciStreams.interfaces.StreamDoc import StreamDoc, psdm
+
+
+def _build(n):
+    return np.ones((n, n))
+
+
+class _Client:
+    ''' runs functions here, as if on its single worker.'''
+    def __init__(self):
+        self.nruns = 0
+
+    def run(self, func, *args):
+        self.nruns += 1
+        return func(*args)
+
+
+def test_artifacts_rebuilt():
+    artifacts.clear()
+    ref = publish(_build, 100, broadcast=False)
+    assert isinstance(ref, ArtifactRef)
+    # only the reference is pickled
+    data = pickle.dumps(ref)
+    assert len(data) < 1000
+    ref2 = pickle.loads(data)
+    assert ref2.key == ref.key
+
+    res = psdm(np.sum)(StreamDoc(args=[ref2]))
+    assert res.args == [10000]
+    assert ref2.nloads == 1
+    # from the store now
+    psdm(np.sum)(StreamDoc(args=[ref]))
+    assert ref.nloads == 0
+
+    artifacts.clear()
+    missing = ArtifactRef(ref.key)
+    try:
+        missing.load()
+    except KeyError:
+        pass
+    else:
+        raise AssertionError("expected a KeyError")
+
+
+def test_artifacts_broadcast():
+    artifacts.clear()
+    client = _Client()
+    ref = publish(_build, 10, client=client, broadcast=True)
+    publish(_build, 10, client=client, broadcast=True)
+    # sent once
+    assert client.nruns == 1
+    assert artifacts.get_artifact(ref.key).shape == (10, 10)
+    artifacts.clear()
+
+    # a failed broadcast is retried
+    class _FailingClient(_Client):
+        def run(self, func, *args):
+            self.nruns += 1
+            raise OSError("worker unreachable")
+
+    failing = _FailingClient()
+    try:
+        publish(_build, 20, client=failing, broadcast=True)
+    except OSError:
+        pass
+    else:
+        raise AssertionError("expected an OSError")
+    client = _Client()
+    publish(_build, 20, client=client, broadcast=True)
+    assert client.nruns == 1
+    artifacts.clear()
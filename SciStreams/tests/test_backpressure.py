@@ -0,0 +1,75 @@
+# test the ingest queue and load shedding
+import threading
+
+from SciStreams.interfaces.streams import Stream
+from SciStreams.interfaces.backpressure import IngestQueue
+
+
+def test_ingest_queue_overflow():
+    ingest = IngestQueue(maxsize=3, overflow='drop_oldest')
+    for i in range(5):
+        ingest.put(i)
+    assert ingest.depth == 3
+    assert ingest.ndropped == 2
+    assert ingest.get() == 2
+
+    ingest = IngestQueue(maxsize=3, overflow='drop_newest')
+    res = [ingest.put(i) for i in range(5)]
+    assert res == [True, True, True, False, False]
+    assert ingest.get() == 0
+
+
+def test_ingest_queue_inflight():
+    ingest = IngestQueue(maxsize=10, max_inflight=1)
+    ingest.put(1)
+    ingest.put(2)
+    assert ingest.get() == 1
+    # second get must wait for the first to be done
+    try:
+        ingest.get(timeout=.01)
+        assert False
+    except TimeoutError:
+        pass
+    ingest.task_done()
+    assert ingest.get() == 2
+
+
+def test_ingest_queue_run():
+    ingest = IngestQueue(maxsize=10)
+    sin = Stream()
+    L = sin.sink_to_list()
+    sin.sink(lambda x: ingest.stop() if x == 4 else None)
+
+    thread = threading.Thread(target=ingest.run, args=(sin,),
+                              kwargs=dict(poll_interval=.01))
+    thread.start()
+    for i in range(5):
+        ingest.put(i)
+    thread.join(timeout=5)
+    assert L == [0, 1, 2, 3, 4]
+    assert ingest.metrics()['ndone'] == 5
+
+
+def test_shed():
+    class Monitor:
+        backlog = False
+
+        def backlogged(self):
+            return self.backlog
+
+    monitor = Monitor()
+    sin = Stream()
+    Lkeep = sin.sink_to_list()
+    Ldrop = sin.shed(monitor, policy='drop').sink_to_list()
+    Ldecimate = sin.shed(monitor, policy='decimate', n=2).sink_to_list()
+
+    sin.emit(0)
+    monitor.backlog = True
+    for i in range(1, 5):
+        sin.emit(i)
+    monitor.backlog = False
+    sin.emit(5)
+
+    assert Lkeep == [0, 1, 2, 3, 4, 5]
+    assert Ldrop == [0, 5]
+    assert Ldecimate == [0, 2, 4, 5]
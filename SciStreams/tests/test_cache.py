@@ -0,0 +1,112 @@
+# test the result cache
+import time
+
+import numpy as np
+from dask import delayed
+
+from SciStreams.interfaces.cache import TypedCache, format_cache_stats
+
+
+def make_maps(n):
+    return np.ones((n, n))
+
+
+def per_frame(x):
+    return x + 1
+
+
+def test_typed_cache():
+    cache = TypedCache({'geometry': dict(budget=1e6, pin=True,
+                                         functions=['make_maps']),
+                        'frame': dict(budget=1e3, ttl=60.)},
+                       default='frame')
+    calls = list()
+
+    def count(x):
+        calls.append(x)
+        return x
+
+    with cache:
+        for i in range(3):
+            delayed(make_maps, pure=True)(100).compute(scheduler='sync')
+        delayed(per_frame, pure=True)(1).compute(scheduler='sync')
+        delayed(per_frame, pure=True)(1).compute(scheduler='sync')
+        # too large for the frame budget, not cached
+        delayed(count, pure=True)(np.ones(1000)).compute(scheduler='sync')
+        delayed(count, pure=True)(np.ones(1000)).compute(scheduler='sync')
+
+    stats = {stat['category']: stat for stat in cache.stats()}
+    assert stats['geometry']['hits'] == 2
+    assert stats['geometry']['misses'] == 1
+    assert stats['geometry']['bytes'] >= 80000
+    assert stats['frame']['hits'] == 1
+    assert len(calls) == 2
+    assert 'geometry' in format_cache_stats(cache.stats())
+
+    # per frame results expire, geometry is pinned
+    cache.categories['frame'].ttl = 0.
+    time.sleep(.01)
+    cache.expire()
+    stats = {stat['category']: stat for stat in cache.stats()}
+    assert stats['frame']['entries'] == 0
+    assert stats['geometry']['entries'] == 1
+
+
+def test_typed_cache_budget():
+    cache = TypedCache({'frame': dict(budget=2500)}, default='frame')
+    with cache:
+        for i in range(5):
+            delayed(make_maps, pure=True)(10 + i).compute(scheduler='sync')
+    stat, = cache.stats()
+    assert stat['bytes'] <= 2500 and stat['evictions'] > 0
+
+
+def test_typed_cache_artifacts():
+    ''' artifacts are built as tasks named after their builder.'''
+    from SciStreams.interfaces import artifacts
+    from SciStreams.interfaces.artifacts import publish
+
+    cache = TypedCache({'geometry': dict(budget=1e6, pin=True,
+                                         functions=['make_maps'])})
+    artifacts.clear()
+    with cache:
+        ref = publish(make_maps, 50, broadcast=False)
+        ref.load()
+        # a process without the artifact in its store
+        artifacts.clear()
+        ref.load()
+    stat, = cache.stats()
+    assert stat['misses'] == 1 and stat['hits'] == 1
+    assert stat['entries'] == 1
+
+
+def test_cache_calibration_maps():
+    ''' the q maps of the calibration stream are cached as geometry.'''
+    from SciStreams.globals import cache
+    from SciStreams.interfaces import artifacts
+    from SciStreams.interfaces.lazy import materialize
+    from SciStreams.interfaces.StreamDoc import StreamDoc
+    from SciStreams.analyses.XSAnalysis.Streams import CalibrationStream
+
+    sin, sout = CalibrationStream(keymap_name='cms', detector='pilatus300')
+    L = sout.sink_to_list()
+    data = dict(
+        calibration_wavelength_A=1.0,
+        detector_SAXS_x0_pix=5.0,
+        detector_SAXS_y0_pix=5.0,
+        detector_SAXS_distance_m=5.0,
+    )
+    cache.clear()
+    artifacts.clear()
+    before = {stat['category']: stat for stat in cache.stats()}
+    sin.emit(StreamDoc(args=data))
+    calib = materialize(L[0]['args'][0])
+    assert calib.q_map is not None
+    # a new worker gets the maps from the cache instead of building them
+    artifacts.clear()
+    materialize(L[0]['args'][0])
+
+    after = {stat['category']: stat for stat in cache.stats()}
+    assert after['geometry']['entries'] == 1
+    assert after['geometry']['misses'] - before['geometry']['misses'] == 1
+    assert after['geometry']['hits'] - before['geometry']['hits'] == 1
@@ -0,0 +1,83 @@
+# test checkpointing the state of stream nodes
+import tempfile
+
+import numpy as np
+from numpy.testing import assert_array_equal
+
+from SciStreams.interfaces.streams import Stream
+from SciStreams.interfaces.StreamDoc import StreamDoc, psda
+from SciStreams.interfaces.checkpoint import Checkpointer
+
+
+def make_graph():
+    def acc(prev, new):
+        return prev + new
+
+    sin = Stream()
+    sacc = sin.accumulate(psda(acc))
+    L = sacc.map(lambda x: x['args'][0]).sliding_window(2).sink_to_list()
+    P = sin.partition(3).sink_to_list()
+    return sin, L, P
+
+
+def test_checkpoint_restore():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        sin, L, P = make_graph()
+        checkpointer = Checkpointer(tmpdir, interval=1e9, every=1)
+        checkpointer.register_graph("main", sin)
+        assert checkpointer.restore() is None
+
+        for i in range(4):
+            sin.emit(StreamDoc(args=[np.ones(3)*i],
+                               attributes=dict(data_uid=str(i))))
+            checkpointer.frame_done(dict(last_uid=str(i)))
+
+        # a fresh graph, as after a restart
+        sin2, L2, P2 = make_graph()
+        checkpointer2 = Checkpointer(tmpdir, every=1)
+        checkpointer2.register_graph("main", sin2)
+        metadata = checkpointer2.restore()
+        assert metadata == dict(last_uid='3')
+
+        for i in range(4, 6):
+            sin.emit(StreamDoc(args=[np.ones(3)*i]))
+            sin2.emit(StreamDoc(args=[np.ones(3)*i]))
+
+        # restarted graph gives the same results as the uninterrupted one
+        assert len(L2) == 2
+        for res, res2 in zip(L[-2:], L2):
+            assert isinstance(res2, tuple)
+            assert_array_equal(res[0], res2[0])
+            assert_array_equal(res[1], res2[1])
+        assert len(P2) == 1
+        assert_array_equal(P[-1][0]['args'][0], P2[0][0]['args'][0])
+        assert P2[0][0]['attributes']['data_uid'] == '3'
+
+
+def test_checkpoint_connected_graphs():
+    ''' the graphs emitted into with s.map(sin.emit) are registered too.'''
+    def make_connected():
+        sub = Stream()
+        P = sub.partition(3).sink_to_list()
+        sin = Stream()
+        sin.map(sub.emit)
+        return sin, sub, P
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        sin, sub, P = make_connected()
+        checkpointer = Checkpointer(tmpdir, interval=1e9, every=1)
+        checkpointer.register_graph("main", sin)
+        # registering the sub graph again does not duplicate it
+        checkpointer.register_graph("sub", sub)
+        assert list(checkpointer.nodes) == ["main/1/1/partition"]
+
+        for i in range(2):
+            sin.emit(i)
+            checkpointer.frame_done(dict(last_uid=str(i)))
+
+        sin2, sub2, P2 = make_connected()
+        checkpointer2 = Checkpointer(tmpdir, every=1)
+        checkpointer2.register_graph("main", sin2)
+        checkpointer2.restore()
+        sin2.emit(2)
+        assert P2 == [(0, 1, 2)]
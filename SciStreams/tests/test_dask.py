@@ -6,6 +6,8 @@ from dask.base import normalize_token
 
 from SciStreams.interfaces.streams import Stream
 from SciStreams.interfaces.StreamDoc import StreamDoc, psdm
+# registers the result cache
+import SciStreams.globals  # noqa
 
 
 def test_object_hash():
@@ -39,3 +41,15 @@ def test_object_hash():
     s2.emit(StreamDoc(args=myobj))
     s2.emit(StreamDoc(args=myobj))
     assert global_list == [1,1,1]
+
+
+def test_map_delayed_callable():
+    ''' delayed callables are mapped as they are (Delayed objects answer any
+        attribute lookup, so must not be taken for precompiled functions).'''
+    def inc(x):
+        return x + 1
+
+    s = Stream()
+    L = s.map(delayed(inc)).map(compute).sink_to_list()
+    s.emit(1)
+    assert L == [(2,)]
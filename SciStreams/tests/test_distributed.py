@@ -106,3 +106,92 @@ def test_sync():
             sync(loop, f)
 
             assert L == list(map(inc, range(10)))
+
+
+@gen_cluster(client=True)
+def test_scan_pinned(c, s, a, b):
+    from SciStreams.interfaces.dask import scatter as sscatter
+
+    source = Stream()
+    node = sscatter(source).scan(add, pin=True, emit_state=False)
+    futures_L = node.sink_to_list()
+    L = node.gather().sink_to_list()
+
+    for i in range(5):
+        yield source.emit(i)
+
+    # nothing emitted until asked for
+    assert futures_L == []
+
+    yield node.snapshot()
+    assert L == [10]
+    # the state stayed on the pinned worker
+    assert node.worker in (a.address, b.address)
+    who_has = yield c.who_has(node.state)
+    assert set(who_has[node.state.key]) == {node.worker}
+
+
+@gen_cluster(client=True)
+def test_gather_as_completed(c, s, a, b):
+    import time
+    from SciStreams.interfaces.streams import Stream as SStream
+    from SciStreams.interfaces.dask import scatter as sscatter
+
+    def slow(x):
+        time.sleep(.5 if x == 0 else .01)
+        return x
+
+    for ordered in (False, True):
+        source = SStream()
+        L = sscatter(source).map(slow).gather(ordered=ordered)\
+            .sink_to_list()
+        emitted = [source.emit(i) for i in range(4)]
+        yield emitted
+        assert sorted(L) == [0, 1, 2, 3]
+        if ordered:
+            assert L == [0, 1, 2, 3]
+        else:
+            # the slow first element did not hold back the others
+            assert L[-1] == 0
+
+
+def test_gather_max_inflight():
+    ''' off the client's loop, emit blocks at max_inflight elements.'''
+    import threading
+    import time
+    from SciStreams.interfaces.streams import Stream as SStream
+    from SciStreams.interfaces.dask import gather as sgather
+
+    release = threading.Event()
+
+    def wait(x):
+        release.wait(10)
+        return x
+
+    with cluster() as (s, [a, b]):
+        with Client(s['address']) as c:  # flake8: noqa
+            # futures submitted from this thread
+            source = SStream()
+            L = sgather(source.map(lambda x: c.submit(wait, x, pure=False)),
+                        max_inflight=2).sink_to_list()
+
+            emitted = list()
+
+            def emit_all():
+                for i in range(5):
+                    source.emit(i)
+                    emitted.append(i)
+
+            thread = threading.Thread(target=emit_all, daemon=True)
+            thread.start()
+            thread.join(timeout=1)
+            # blocked on the third element
+            assert thread.is_alive()
+            assert emitted == [0, 1]
+
+            release.set()
+            thread.join(timeout=10)
+            start = time.time()
+            while len(L) < 5 and time.time() - start < 10:
+                time.sleep(.05)
+            assert sorted(L) == [0, 1, 2, 3, 4]
@@ -0,0 +1,43 @@
+# test the tracking of futures
+from concurrent.futures import Future
+import gc
+import weakref
+
+import numpy as np
+
+from SciStreams.interfaces import errors
+from SciStreams.interfaces.futures import FuturesManager
+
+
+def test_futures_manager_frames():
+    manager = FuturesManager()
+    f1, f2 = Future(), Future()
+    manager.add(f1, frame="uid1")
+    manager.add(f2, frame="uid1")
+    manager.add(3)
+    assert manager.stats()['pending'] == 2
+
+    f1.set_result(np.ones(1000))
+    stats = manager.stats()
+    # held until the frame is done
+    assert stats['frames'] == 1 and stats['bytes'] >= 8000
+
+    ref = weakref.ref(f1)
+    del f1
+    f2.set_result(None)
+    gc.collect()
+    assert ref() is None
+    assert manager.stats() == dict(frames=0, pending=0, done=2, errors=0,
+                                   bytes=0)
+    assert manager.wait(timeout=0)
+
+
+def test_futures_manager_errors():
+    errors.reset()
+    manager = FuturesManager()
+    future = Future()
+    manager.add(future)
+    future.set_exception(ValueError("bad"))
+    assert manager.stats()['errors'] == 1
+    assert errors.table[("future", "ValueError")].count == 1
+    errors.reset()
@@ -0,0 +1,66 @@
+# test the local executor backed client
+import threading
+import time
+
+from dask import delayed
+from nose.tools import assert_raises
+
+from SciStreams.interfaces.local_client import LocalClient
+
+
+def test_local_client_submit():
+    client = LocalClient(nworkers=2)
+    threads = set()
+
+    def inc(x):
+        threads.add(threading.get_ident())
+        time.sleep(.01)
+        return x + 1
+
+    futures = [client.submit(inc, i) for i in range(4)]
+    assert client.gather(futures) == [1, 2, 3, 4]
+    assert threading.get_ident() not in threads
+
+    # futures as arguments are waited for
+    future = client.submit(inc, client.submit(inc, 1))
+    assert client.gather(future) == 3
+    assert client.gather(5) == 5
+
+    assert client.gather(client.compute(delayed(inc)(1))) == 2
+    assert client.compute([delayed(inc)(1)])[0].result() == 2
+    client.close()
+
+
+def test_local_client_bounded():
+    client = LocalClient(nworkers=1, max_pending=2)
+    event = threading.Event()
+    client.submit(event.wait)
+    client.submit(event.wait)
+    assert client.npending == 2
+
+    submitted = list()
+    thread = threading.Thread(
+        target=lambda: submitted.append(client.submit(lambda: 1)))
+    thread.start()
+    time.sleep(.05)
+    # blocked until a task is done
+    assert submitted == []
+    event.set()
+    thread.join(1.)
+    assert client.gather(submitted[0]) == 1
+    client.close()
+
+
+def test_local_client_errors():
+    client = LocalClient(nworkers=1)
+
+    def fails(x):
+        raise ValueError("bad")
+
+    future = client.submit(fails, 1)
+    assert_raises(ValueError, client.gather, future)
+    # failures propagate to dependent tasks
+    assert_raises(ValueError, client.gather,
+                  client.submit(lambda x: x, future))
+    assert client.nerrors == 2
+    client.close()
@@ -0,0 +1,47 @@
+# test recording and replaying a session
+import tempfile
+
+import numpy as np
+from numpy.testing import assert_array_equal
+
+from SciStreams.interfaces.streams import Stream
+from SciStreams.interfaces.StreamDoc import StreamDoc
+from SciStreams.interfaces.replay import Recorder, Replayer
+
+
+def test_record_replay():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        sin = Stream()
+        recorder = Recorder(tmpdir)
+        sin.sink(recorder.record)
+
+        for i in range(3):
+            img = np.ones((4, 5), dtype=np.int32)*i
+            sin.emit(StreamDoc(args=[img], kwargs=dict(a=i, b=np.arange(i)),
+                               attributes=dict(data_uid=str(i),
+                                               exposure=np.float64(.1))))
+        recorder.close()
+
+        replayer = Replayer(tmpdir)
+        assert len(replayer) == 3
+
+        sout = Stream()
+        L = sout.sink_to_list()
+        result = replayer.run(sout, speed=None)
+
+        assert result['nframes'] == 3
+        assert len(L) == 3
+        img = L[2]['args'][0]
+        assert img.dtype == np.int32
+        assert_array_equal(img, np.ones((4, 5))*2)
+        assert_array_equal(L[2]['kwargs']['b'], np.arange(2))
+        assert len(L[0]['kwargs']['b']) == 0
+        assert L[1]['attributes']['data_uid'] == '1'
+        assert L[1]['attributes']['exposure'] == .1
+
+        # modifying replayed data does not modify the recording
+        img[:] = 10
+        L2 = list()
+        for t, sdoc in replayer.docs():
+            L2.append(sdoc)
+        assert L2[2]['args'][0][0, 0] == 2
@@ -0,0 +1,104 @@
+# test the asyncio runner and the async nodes
+import asyncio
+import threading
+import time
+
+from tornado.ioloop import IOLoop
+
+from SciStreams.interfaces.streams import Stream
+from SciStreams.interfaces.runner import Runner
+
+
+def test_runner_map_async():
+    loop = IOLoop()
+    running = list()
+    maxrunning = list()
+
+    async def slow(x):
+        running.append(x)
+        maxrunning.append(len(running))
+        await asyncio.sleep(.01)
+        running.remove(x)
+        return x*2
+
+    s = Stream(loop=loop)
+    L = s.map_async(slow, concurrency=2).map(lambda x: x + 1)\
+        .sink_to_list()
+
+    runner = Runner(loop=loop)
+    runner.run(runner.feed(s, range(6)))
+    assert sorted(L) == [1, 3, 5, 7, 9, 11]
+    assert max(maxrunning) == 2
+
+
+def test_runner_sink_async_blocking():
+    loop = IOLoop()
+    threads = set()
+    L = list()
+
+    def save(x, factor=1):
+        # blocking function, runs in a thread
+        threads.add(threading.get_ident())
+        time.sleep(.01)
+        L.append(x*factor)
+
+    def fail(x):
+        raise ValueError("bad")
+
+    s = Stream(loop=loop)
+    s.sink_async(save, factor=10, concurrency=3)
+    sfail = s.sink_async(fail)
+
+    runner = Runner(loop=loop)
+    runner.run(runner.feed(s, range(5)))
+    assert sorted(L) == [0, 10, 20, 30, 40]
+    assert threading.get_ident() not in threads
+    assert sfail.nerrors == 5
+
+
+def test_runner_poll():
+    loop = IOLoop()
+    batches = [[1, 2], [], [3]]
+    s = Stream(loop=loop)
+    L = s.sink_to_list()
+    runner = Runner(loop=loop)
+
+    def poll():
+        if not batches:
+            runner.stop()
+            return []
+        return batches.pop(0)
+
+    runner.run(runner.poll(s, poll, interval=.01), timeout=5)
+    assert L == [1, 2, 3]
+    assert runner.nemitted == 3
+
+
+def test_runner_connected_graphs():
+    ''' the async nodes of a graph emitted into with s.map(sin.emit) are
+        awaited too.'''
+    loop = IOLoop()
+    L = list()
+
+    async def slow(x):
+        await asyncio.sleep(.05)
+        L.append(x)
+
+    sub = Stream(loop=loop)
+    node = sub.sink_async(slow, concurrency=1)
+    main = Stream(loop=loop)
+    main.map(sub.emit)
+
+    runner = Runner(loop=loop)
+    pending = list()
+
+    async def feed():
+        for i in range(5):
+            await runner.emit(main, i)
+            pending.append(len(node._tasks))
+        await node.join()
+
+    runner.run(feed())
+    assert sorted(L) == list(range(5))
+    # the source waited for a slot instead of queuing all the elements
+    assert max(pending) <= 2
@@ -70,3 +70,284 @@ def test_stream_accumulate():
 
     # should emit on first
     assert L2 == [2, 3, 7]
+
+
+def test_stream_instrument():
+    ''' test the opt-in instrumentation of stream nodes.'''
+    import numpy as np
+    from SciStreams.interfaces.stats import LatencyHistogram
+
+    s = Stream()
+    sout = s.map(lambda x: x*2).filter(lambda x: x.sum() > 0)
+    L = sout.sink_to_list()
+    s.instrument()
+
+    for i in range(3):
+        s.emit(np.ones(10)*(i-1))
+
+    assert len(L) == 1
+    stats = s.stats()
+    # source, map, filter, sink
+    assert len(stats) == 4
+    mapstats, filterstats = stats[1], stats[2]
+    assert mapstats['count_in'] == 3
+    assert mapstats['count_out'] == 3
+    assert mapstats['bytes_in'] == 3*80
+    assert filterstats['count_out'] == 1
+    assert mapstats['latency_p50'] is not None
+
+    s.instrument(enable=False)
+    assert s.stats() == []
+
+    hist = LatencyHistogram()
+    for i in range(1, 1001):
+        hist.record(i*1e-3)
+    assert abs(hist.percentile(50) - .5) < .5*.05
+    assert abs(hist.percentile(99) - .99) < .99*.05
+
+
+def test_stream_trace():
+    ''' test that tracing records spans and writes chrome trace json.'''
+    import json
+    import tempfile
+    from SciStreams.interfaces.StreamDoc import StreamDoc, psdm
+
+    s = Stream()
+    sout = s.map(psdm(lambda x: x + 1))
+    sout.sink_to_list()
+    tracer = s.trace(size=4)
+
+    for i in range(3):
+        s.emit(StreamDoc(args=[i], attributes=dict(data_uid=str(i))))
+
+    # map and sink for each element
+    spans = tracer.spans()
+    assert len(spans) == 4
+    assert spans[-1]['data_uid'] == '2'
+    # nested : the map span contains the sink span
+    assert spans[-2]['start'] <= spans[-1]['start']
+    assert spans[-2]['end'] >= spans[-1]['end']
+
+    with tempfile.NamedTemporaryFile(suffix=".json") as f:
+        tracer.save(f.name)
+        res = json.load(open(f.name))
+    assert len(res['traceEvents']) == 4
+    assert res['traceEvents'][0]['ph'] == 'X'
+
+    # turning off tracing
+    s.trace(False)
+    s.emit(StreamDoc(args=[1]))
+    assert tracer.spans()[-1]['data_uid'] == '2'
+
+
+def test_stream_schedule():
+    ''' test running branches on the priority scheduler.'''
+    from SciStreams.interfaces.scheduler import Scheduler
+
+    # no workers : tasks run on run_pending
+    scheduler = Scheduler(nworkers=0)
+    s = Stream()
+    order = list()
+    s.schedule(scheduler, 'plot', coalesce=True)\
+        .sink(lambda x: order.append(('plot', x)))
+    s.schedule(scheduler, 'file').sink(lambda x: order.append(('file', x)))
+    s.sink(lambda x: order.append(('inline', x)))
+
+    s.emit(1)
+    s.emit(2)
+    assert order == [('inline', 1), ('inline', 2)]
+
+    scheduler.run_pending()
+    # files before plots, and plots coalesced to the latest
+    assert order[2:] == [('file', 1), ('file', 2), ('plot', 2)]
+    assert scheduler.metrics()['ncoalesced'] == 1
+
+    # with workers, elements of a branch still run in order
+    scheduler = Scheduler(nworkers=4)
+    s = Stream()
+    L = s.schedule(scheduler, 'file').map(lambda x: x + 1).sink_to_list()
+    for i in range(100):
+        s.emit(i)
+    assert scheduler.join(timeout=10)
+    assert L == list(range(1, 101))
+    scheduler.stop()
+
+
+def test_stream_schedule_max_queued():
+    ''' a full branch blocks its source until the workers catch up.'''
+    import threading
+    from SciStreams.interfaces.scheduler import Scheduler
+
+    scheduler = Scheduler(nworkers=1, max_queued=2)
+    release = threading.Event()
+    s = Stream()
+    L = s.schedule(scheduler, 'file').map(lambda x: release.wait(10) and x)\
+        .sink_to_list()
+
+    emitted = list()
+
+    def source():
+        for i in range(10):
+            s.emit(i)
+            emitted.append(i)
+
+    thread = threading.Thread(target=source, daemon=True)
+    thread.start()
+    thread.join(timeout=.5)
+    # one running and two queued, the source waits on the fourth
+    assert thread.is_alive()
+    assert len(emitted) == 3
+    assert scheduler.metrics()['nblocked'] >= 1
+
+    release.set()
+    thread.join(timeout=10)
+    assert scheduler.join(timeout=10)
+    assert L == list(range(10))
+    scheduler.stop()
+
+
+def test_stream_prune():
+    ''' test that branches with no sink are skipped after pruning.'''
+    calls = list()
+
+    def f(x):
+        calls.append(x)
+        return x
+
+    s = Stream()
+    # a branch with a sink
+    L = s.map(lambda x: x + 1).sink_to_list()
+    # a dead branch (no sink at the end)
+    dead = s.map(f).map(lambda x: x*2)
+
+    # a branch emitting into another graph, with a sink
+    s2 = Stream()
+    L2 = s2.sink_to_list()
+    s.map(s2.emit)
+    # a branch emitting into another graph, without a sink
+    s3 = Stream()
+    s3.map(f)
+    s.map(f).map(s3.emit)
+
+    dormant = s.prune()
+    assert dead in dormant
+    assert s2 not in dormant
+    assert s3 in dormant
+
+    s.emit(1)
+    assert L == [2]
+    assert L2 == [1]
+    assert calls == []
+
+    # attaching a sink at runtime wakes the branch up
+    L3 = dead.sink_to_list()
+    s.emit(2)
+    assert calls == [2]
+    assert L3 == [4]
+
+    # attaching a sink to the other graph wakes up the connector
+    L4 = s3.sink_to_list()
+    s.emit(3)
+    assert L4 == [3]
+
+
+def test_stream_partition_array():
+    import numpy as np
+    from SciStreams.interfaces.StreamDoc import StreamDoc
+
+    s = Stream()
+    L = s.partition_array(2).sink_to_list()
+    Lview = s.partition_array(2, copy=False).sink_to_list()
+    for i in range(5):
+        s.emit(np.ones((2, 3))*i)
+    assert len(L) == 2
+    assert L[0].shape == (2, 2, 3)
+    assert np.all(L[1][:, 0, 0] == [2, 3])
+    # views are read only and share the buffer
+    assert not Lview[0].flags.writeable
+    assert Lview[0].base is Lview[1].base
+
+    # a shape change drops the partial window and starts a new one
+    s.emit(np.ones((4, 4)))
+    s.emit(np.ones((4, 4)))
+    assert len(L) == 3
+    assert L[2].shape == (2, 4, 4)
+
+    # StreamDocs : arrays are stacked, the rest collected
+    s = Stream()
+    L = s.partition_array(2).sink_to_list()
+    for i in range(2):
+        s.emit(StreamDoc(args=[np.ones(3)*i, i], kwargs=dict(a=np.ones(2)),
+                         attributes=dict(i=i)))
+    sdoc = L[0]
+    assert sdoc['args'][0].shape == (2, 3)
+    assert sdoc['args'][1] == [0, 1]
+    assert sdoc['kwargs']['a'].shape == (2, 2)
+    assert sdoc['attributes']['i'] == 1
+
+
+def test_stream_sliding_window_array():
+    import numpy as np
+
+    s = Stream()
+    win = s.sliding_window_array(3, copy=False)
+    L = win.map(lambda x: x[:, 0].tolist()).sink_to_list()
+    for i in range(6):
+        s.emit(np.ones(2)*i)
+    assert L == [[0, 1, 2], [1, 2, 3], [2, 3, 4], [3, 4, 5]]
+
+    # the state holds the last frames, in order
+    state = win.get_state()
+    assert [frame[0] for frame in state] == [3, 4, 5]
+    s2 = Stream()
+    win2 = s2.sliding_window_array(3)
+    win2.set_state(state)
+    L2 = win2.map(lambda x: x[:, 0].tolist()).sink_to_list()
+    s2.emit(np.ones(2)*6)
+    assert L2 == [[4, 5, 6]]
+
+    # a shape change restarts the window with the new shape
+    L3 = win2.sink_to_list()
+    for i in range(3):
+        s2.emit(np.ones(3)*i)
+    assert len(L3) == 1
+    assert L3[0].shape == (3, 3)
+    assert L3[0][:, 0].tolist() == [0, 1, 2]
+
+
+def test_stream_batch():
+    import threading
+    import time
+    import numpy as np
+    from tornado.ioloop import IOLoop
+
+    s = Stream()
+    L = s.batch(max_items=3).sink_to_list()
+    for i in range(7):
+        s.emit(i)
+    assert L == [(0, 1, 2), (3, 4, 5)]
+
+    s = Stream()
+    L = s.batch(max_bytes=16).sink_to_list()
+    for i in range(5):
+        s.emit(np.ones(1))
+    assert [len(elem) for elem in L] == [2, 2]
+
+    # the latency limit is driven by the loop
+    loop = IOLoop()
+    thread = threading.Thread(target=loop.start, daemon=True)
+    thread.start()
+    try:
+        s = Stream()
+        sbatch = s.batch(max_items=100, max_latency=.05, loop=loop)
+        L = sbatch.sink_to_list()
+        s.emit(1)
+        s.emit(2)
+        time.sleep(.5)
+        assert L == [(1, 2)]
+        assert sbatch.nflushes['latency'] == 1
+    finally:
+        loop.add_callback(loop.stop)
+        thread.join(1)
+
+    assert_raises(ValueError, Stream().batch)
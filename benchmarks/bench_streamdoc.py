@@ -0,0 +1,67 @@
+''' Benchmark the number of StreamDocs per second through a 20 node graph.
+
+    The documents carry ~70 attributes, like the headers from the beamline,
+    and small arrays, so the time is dominated by the StreamDoc handling
+    (construction, select, merge, add_attributes) rather than the
+    computations.
+
+    Usage:
+        python benchmarks/bench_streamdoc.py [ndocs]
+'''
+import sys
+import time
+
+import numpy as np
+
+from SciStreams.interfaces.streams import Stream
+from SciStreams.interfaces.StreamDoc import StreamDoc, psdm, select, merge,\
+    add_attributes
+
+
+def double(x):
+    return 2*x
+
+
+def addone(x):
+    return x + 1
+
+
+def make_graph():
+    ''' A 20 node graph: a chain of maps and selects, a zip and a sink.'''
+    sin = Stream()
+    s = sin.map(select, ('image', None))
+    for i in range(4):
+        s = s.map(psdm(double))
+        s = s.map(psdm(addone))
+        s = s.map(add_attributes, step=i)
+    s2 = sin.map(select, ('mask', None))
+    sout = s.zip(s2).map(merge).map(select, (0, 'image'))\
+        .map(add_attributes, stream_name="bench")
+    L = sout.sink_to_list()
+    return sin, L
+
+
+def make_doc(i):
+    attributes = {"key{}".format(j): j for j in range(70)}
+    attributes['data_uid'] = str(i)
+    return StreamDoc(kwargs=dict(image=np.ones((8, 8)), mask=np.ones((8, 8))),
+                     attributes=attributes)
+
+
+def run(ndocs=10000):
+    sin, L = make_graph()
+    nnodes = len(sin.downstream())
+    docs = [make_doc(i) for i in range(ndocs)]
+    t0 = time.time()
+    for doc in docs:
+        sin.emit(doc)
+    elapsed = time.time() - t0
+    assert len(L) == ndocs
+    print("{} docs through {} nodes in {:.3g} s : {:.0f} docs/s"
+          .format(ndocs, nnodes, elapsed, ndocs/elapsed))
+    return ndocs/elapsed
+
+
+if __name__ == '__main__':
+    ndocs = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    run(ndocs)